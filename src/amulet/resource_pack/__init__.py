@@ -45,6 +45,9 @@ from amulet.resource_pack.abc import (
     BaseResourcePackManager,
 )
 
+from .block_mesh_cache import BlockMeshCache
+from .atlas import AtlasRect, TextureAtlas
+from .resource_file import open_resource
 from .unknown_resource_pack import UnknownResourcePack
 
 from amulet.resource_pack.java import (
@@ -58,3 +61,4 @@ from amulet.resource_pack.java import (
 # )
 
 from ._load import load_resource_pack, load_resource_pack_manager
+from .watcher import ResourcePackWatcher
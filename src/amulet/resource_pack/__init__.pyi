@@ -3,35 +3,52 @@ from __future__ import annotations
 from amulet.resource_pack._load import load_resource_pack, load_resource_pack_manager
 from amulet.resource_pack.abc.resource_pack import BaseResourcePack
 from amulet.resource_pack.abc.resource_pack_manager import BaseResourcePackManager
+from amulet.resource_pack.atlas import AtlasRect, TextureAtlas
+from amulet.resource_pack.block_mesh_cache import BlockMeshCache
+from amulet.resource_pack.resource_file import open_resource
 from amulet.resource_pack.java.resource_pack import JavaResourcePack
 from amulet.resource_pack.java.resource_pack_manager import JavaResourcePackManager
 from amulet.resource_pack.unknown_resource_pack import UnknownResourcePack
+from amulet.resource_pack.watcher import ResourcePackWatcher
 
 from . import (
     _amulet_resource_pack,
     _load,
     _version,
     abc,
+    atlas,
+    block_mesh_cache,
     image,
     java,
     mesh,
+    resource_file,
     unknown_resource_pack,
+    watcher,
 )
 
 __all__ = [
+    "AtlasRect",
     "BaseResourcePack",
     "BaseResourcePackManager",
+    "BlockMeshCache",
     "JavaResourcePack",
     "JavaResourcePackManager",
+    "ResourcePackWatcher",
+    "TextureAtlas",
     "UnknownResourcePack",
     "abc",
+    "atlas",
+    "block_mesh_cache",
     "compiler_config",
     "image",
     "java",
     "load_resource_pack",
     "load_resource_pack_manager",
     "mesh",
+    "open_resource",
+    "resource_file",
     "unknown_resource_pack",
+    "watcher",
 ]
 
 def _init() -> None: ...
@@ -1,4 +1,4 @@
-from typing import Iterable, Union
+from typing import Iterable, Union, Literal
 
 from .abc import BaseResourcePack, BaseResourcePackManager
 from .java import JavaResourcePack, JavaResourcePackManager
@@ -15,7 +15,8 @@ def load_resource_pack(resource_pack_path: str) -> BaseResourcePack:
 
 
 def load_resource_pack_manager(
-    resource_packs: Iterable[Union[str, BaseResourcePack]], load: bool = True
+    resource_packs: Iterable[Union[str, BaseResourcePack]],
+    load: Union[bool, Literal["lazy"]] = True,
 ) -> BaseResourcePackManager:
     resource_packs_out: list[BaseResourcePack] = []
     for resource_pack in resource_packs:
@@ -1,2 +1,6 @@
 from .resource_pack import BaseResourcePack
-from .resource_pack_manager import BaseResourcePackManager
+from .resource_pack_manager import (
+    BaseResourcePackManager,
+    ReloadStage,
+    ResourcePackReload,
+)
@@ -1,13 +1,19 @@
 from __future__ import annotations
 
 from amulet.resource_pack.abc.resource_pack import BaseResourcePack
-from amulet.resource_pack.abc.resource_pack_manager import BaseResourcePackManager
+from amulet.resource_pack.abc.resource_pack_manager import (
+    BaseResourcePackManager,
+    ReloadStage,
+    ResourcePackReload,
+)
 
 from . import resource_pack, resource_pack_manager
 
 __all__ = [
     "BaseResourcePack",
     "BaseResourcePackManager",
+    "ReloadStage",
+    "ResourcePackReload",
     "resource_pack",
     "resource_pack_manager",
 ]
@@ -1,5 +1,9 @@
-from typing import Optional, Iterator, TypeVar, Generic
-import json
+from __future__ import annotations
+
+from typing import Callable, Optional, Iterator, Iterable, TypeVar, Generic
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from enum import IntEnum
+import threading
 
 from amulet.core.block import Block, BlockStack
 from amulet.resource_pack.mesh.block import (
@@ -8,36 +12,112 @@ from amulet.resource_pack.mesh.block import (
     get_unit_cube,
 )
 from amulet.resource_pack.abc.resource_pack import BaseResourcePack
+from amulet.resource_pack.block_mesh_cache import BlockMeshCache
+from amulet.resource_pack.atlas import (
+    TextureAtlas,
+    build_texture_atlas,
+    get_texture_atlas,
+)
 from amulet.utils.image import missing_no_icon_path
 from amulet.utils.task_manager import AbstractProgressManager, VoidProgressManager
 
 PackT = TypeVar("PackT", bound=BaseResourcePack)
 
 
+class ReloadStage(IntEnum):
+    """The stages of a reload in the order they complete."""
+
+    # The texture, blockstate and model paths are known.
+    PathsIndexed = 0
+    # The transparency of every texture is known.
+    TexturesClassified = 1
+    # The blockstate and model files have been parsed.
+    JsonParsed = 2
+
+
+class ResourcePackReload(Future[None]):
+    """The future returned by :meth:`BaseResourcePackManager.reload_async`.
+
+    The result is set once the new resources have been swapped in.
+    If a newer reload is started before this one finishes this reload is cancelled.
+
+    Each stage has its own future. When a stage completes all earlier stages are also complete.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._stages: tuple[Future[None], ...] = tuple(Future() for _ in ReloadStage)
+
+    def stage(self, stage: ReloadStage) -> Future[None]:
+        """Get the future for a stage of the reload."""
+        return self._stages[stage]
+
+    @property
+    def paths_indexed(self) -> Future[None]:
+        """Completes when the texture, blockstate and model paths are known."""
+        return self._stages[ReloadStage.PathsIndexed]
+
+    @property
+    def textures_classified(self) -> Future[None]:
+        """Completes when the transparency of every texture is known."""
+        return self._stages[ReloadStage.TexturesClassified]
+
+    @property
+    def json_parsed(self) -> Future[None]:
+        """Completes when the blockstate and model files have been parsed."""
+        return self._stages[ReloadStage.JsonParsed]
+
+    def _finish_stage(self, stage: ReloadStage) -> None:
+        """Mark a stage and all earlier stages as complete."""
+        for stage_future in self._stages[: stage + 1]:
+            if not stage_future.done():
+                stage_future.set_result(None)
+
+    def _fail(self, exception: BaseException) -> None:
+        for stage_future in self._stages:
+            if not stage_future.done():
+                stage_future.set_exception(exception)
+        if not self.done():
+            self.set_exception(exception)
+
+    def _supersede(self) -> None:
+        for stage_future in self._stages:
+            stage_future.cancel()
+        self.cancel()
+
+
 class BaseResourcePackManager(Generic[PackT]):
     """The base class that all resource pack managers must inherit from. Defines the base api."""
 
     def __init__(self) -> None:
         self._packs: list[PackT] = []
         self._missing_block: Optional[BlockMesh] = None
-        self._texture_is_transparent: dict[str, tuple[float, bool]] = {}
-        self._cached_models: dict[BlockStack, BlockMesh] = {}
+        self._texture_is_transparent: dict[str, tuple[int, bool]] = {}
+        self._cached_models = BlockMeshCache()
+        # Guards swapping the resources and adding to the block mesh cache.
+        self._state_lock = threading.Lock()
+        # Have any resources been loaded.
+        self._loaded = False
+        # Incremented each time the resources change.
+        # Meshes created from an older generation are not cached.
+        self._generation = 0
+        # The newest reload and the manager it is loading into.
+        # A failed reload stays pending until another reload is started.
+        self._pending_reload: Optional[
+            tuple[ResourcePackReload, BaseResourcePackManager[PackT]]
+        ] = None
+        # The reload to notify of stage progress if this manager is being loaded by a background reload.
+        self._reload: Optional[ResourcePackReload] = None
 
     @property
     def pack_paths(self) -> list[str]:
         return [pack.root_dir for pack in self._packs]
 
-    def _unload(self) -> None:
-        """Clear all loaded resources."""
-        self._texture_is_transparent.clear()
-        self._cached_models.clear()
-
-    def _load_transparency_cache(self, path: str) -> None:
-        try:
-            with open(path) as f:
-                self._texture_is_transparent = json.load(f)
-        except:
-            pass
+    @property
+    def block_mesh_cache(self) -> BlockMeshCache:
+        """The cache of block meshes returned by :meth:`get_block_model`.
+        The bounds can be configured to limit the memory used."""
+        return self._cached_models
 
     def _load(self, progress_manager: AbstractProgressManager) -> None:
         """Load resources."""
@@ -46,9 +126,155 @@ class BaseResourcePackManager(Generic[PackT]):
     def reload(
         self, progress_manager: AbstractProgressManager = VoidProgressManager()
     ) -> None:
-        """Unload and reload resources"""
-        self._unload()
-        self._load(progress_manager)
+        """Reload resources on the calling thread.
+
+        The current resources keep serving lookups until the new resources are swapped in.
+
+        :param progress_manager: The progress manager to notify of progress.
+        """
+        reload, run = self._start_reload(progress_manager)
+        run()
+        if not reload.cancelled():
+            # Raise the exception if the reload failed.
+            reload.result()
+
+    def incremental_reload(
+        self,
+        resource_packs: Optional[Iterable[PackT]] = None,
+        progress_manager: AbstractProgressManager = VoidProgressManager(),
+    ) -> tuple[set[BlockStack], Optional[set[str]]]:
+        """Reload only the resources that have changed since they were loaded.
+
+        Subclasses re-process only the changed packs and files and keep the cached meshes that do not depend on them.
+        The base implementation reloads everything and swaps the new resources in once they are loaded.
+
+        :param resource_packs: The new resource packs. If None the current packs are checked for changes.
+        :param progress_manager: The progress manager to notify of progress.
+        :return: The block stacks whose cached meshes were removed and should be re-meshed
+            and the paths of the textures that were added, removed or modified.
+            The texture paths are None if every texture may have changed.
+        """
+        affected = set(self._cached_models.keys())
+        if resource_packs is not None:
+            self._packs = list(resource_packs)
+        reload = self.reload_async(progress_manager)
+        try:
+            reload.result()
+        except CancelledError:
+            # A newer reload superseded this one and will swap in its resources.
+            pass
+        return affected, None
+
+    def _new_unloaded(self) -> BaseResourcePackManager[PackT]:
+        """Create a manager with the same packs and settings that has not loaded any resources."""
+        raise NotImplementedError
+
+    def reload_async(
+        self, progress_manager: AbstractProgressManager = VoidProgressManager()
+    ) -> ResourcePackReload:
+        """Reload resources on a background thread.
+
+        The current resources keep serving lookups until the new resources are swapped in.
+        If no resources have been loaded, lookups wait for the stage of the reload they need.
+
+        :param progress_manager: The progress manager to notify of progress.
+        :return: A future that completes when the new resources have been swapped in.
+        """
+        reload, run = self._start_reload(progress_manager)
+        threading.Thread(target=run, name="ResourcePackReload", daemon=True).start()
+        return reload
+
+    def _start_reload(
+        self, progress_manager: AbstractProgressManager
+    ) -> tuple[ResourcePackReload, Callable[[], None]]:
+        """Supersede the previous reload and create a new one.
+
+        :param progress_manager: The progress manager to notify of progress.
+        :return: The reload and a function that loads the resources and swaps them in.
+        """
+        reload = ResourcePackReload()
+        manager = self._new_unloaded()
+        manager._reload = reload
+        pending = (reload, manager)
+        with self._state_lock:
+            previous = self._pending_reload
+            self._pending_reload = pending
+        if previous is not None:
+            previous[0]._supersede()
+
+        def run() -> None:
+            try:
+                manager._load(progress_manager)
+            except BaseException as e:
+                reload._fail(e)
+                return
+            manager._loaded = True
+            manager._reload = None
+            reload._finish_stage(ReloadStage.JsonParsed)
+            with self._state_lock:
+                is_newest = self._pending_reload is pending
+                if is_newest:
+                    self._pending_reload = None
+                    self._swap(manager)
+            if is_newest:
+                reload.set_result(None)
+            else:
+                reload._supersede()
+
+        return reload, run
+
+    def _swap(self, manager: BaseResourcePackManager[PackT]) -> None:
+        """Replace the loaded resources with those loaded into another manager.
+        The caller must hold the state lock.
+
+        Subclasses must extend this to assign their own resources and then call this method.
+        Data must be assigned before the caches built from it,
+        so a lookup that sees a new cache also sees the data it is built from.
+        Settings such as the packs are not replaced.
+        """
+        self._texture_is_transparent = manager._texture_is_transparent
+        self._loaded = True
+        self._generation += 1
+        self._cached_models.clear()
+
+    def _finish_reload_stage(self, stage: ReloadStage) -> None:
+        """Notify the background reload loading this manager that a stage has completed."""
+        if self._reload is not None:
+            self._reload._finish_stage(stage)
+
+    def _get_reload_target(
+        self, stage: ReloadStage
+    ) -> Optional[BaseResourcePackManager[PackT]]:
+        """If no resources are loaded and a background reload is running,
+        wait for a stage of the reload and get the manager it is loading into.
+
+        :param stage: The stage the lookup needs.
+        :return: The manager being loaded or None if this manager should be used.
+        :raises Exception: The exception the reload failed with.
+        """
+        while not self._loaded:
+            pending = self._pending_reload
+            if pending is None:
+                return None
+            reload, manager = pending
+            try:
+                reload.stage(stage).result()
+            except CancelledError:
+                # A newer reload was started.
+                continue
+            if reload.done() and not reload.cancelled():
+                # Raise the exception if the reload failed after this stage.
+                reload.result()
+            return manager
+        return None
+
+    def _cache_block_model(
+        self, generation: int, block_stack: BlockStack, block_mesh: BlockMesh
+    ) -> None:
+        """Add a mesh to the cache if the resources have not changed since it was created."""
+        with self._state_lock:
+            if generation == self._generation:
+                self._cached_models.put(block_stack, block_mesh)
 
     @property
     def missing_no(self) -> str:
@@ -78,23 +304,100 @@ class BaseResourcePackManager(Generic[PackT]):
         """Get the absolute texture path from the namespace and relative path pair"""
         raise NotImplementedError
 
+    def build_texture_atlas(
+        self,
+        max_size: int = 4096,
+        padding: int = 0,
+        progress_manager: AbstractProgressManager = VoidProgressManager(),
+        max_workers: Optional[int] = None,
+        use_cache: bool = True,
+    ) -> TextureAtlas:
+        """Pack all the textures in the resource packs into a texture atlas.
+
+        :param max_size: The maximum width and height of a page. Must be a power of two.
+        :param padding: The number of pixels to extend the edge of each texture by to prevent bleeding.
+        :param progress_manager: The progress manager to notify of progress.
+        :param max_workers: The number of threads used to decode textures.
+        :param use_cache: If True the atlas is loaded from or stored in the on-disk cache.
+            Cached pages are memory mapped read-only.
+        :return: The texture atlas.
+        """
+        if use_cache:
+            return get_texture_atlas(
+                self.textures,
+                self.pack_paths,
+                max_size,
+                padding,
+                progress_manager,
+                max_workers,
+            )
+        return build_texture_atlas(
+            self.textures, max_size, padding, progress_manager, max_workers
+        )
+
     def get_block_model(self, block_stack: BlockStack) -> BlockMesh:
         """Get a model for a block state.
         The block should already be in the resource pack format"""
-        if block_stack not in self._cached_models:
-            if len(block_stack) == 1:
-                self._cached_models[block_stack] = self._get_model(
-                    block_stack.base_block
-                )
+        target = self._get_reload_target(ReloadStage.JsonParsed)
+        if target is not None:
+            return target.get_block_model(block_stack)
+        generation = self._generation
+        block_mesh = self._cached_models.get(block_stack)
+        if block_mesh is None:
+            block_mesh = self._create_block_model(block_stack)
+            self._cache_block_model(generation, block_stack, block_mesh)
+
+        return block_mesh
+
+    def get_block_models(
+        self, block_stacks: Iterable[BlockStack], max_workers: Optional[int] = 1
+    ) -> list[BlockMesh]:
+        """Get the models for a sequence of block states such as a chunk palette.
+        The blocks should already be in the resource pack format.
+
+        :param block_stacks: The block states to get models for. Duplicates are only looked up once.
+        :param max_workers: The number of threads used to create models that are not cached.
+            If 1 the models are created on the calling thread. If None the ThreadPoolExecutor default is used.
+        :return: The models in the same order as block_stacks.
+        """
+        target = self._get_reload_target(ReloadStage.JsonParsed)
+        if target is not None:
+            return target.get_block_models(block_stacks, max_workers)
+        generation = self._generation
+        block_stacks = list(block_stacks)
+        block_meshes: dict[BlockStack, BlockMesh] = {}
+        missing: list[BlockStack] = []
+        for block_stack in dict.fromkeys(block_stacks):
+            block_mesh = self._cached_models.get(block_stack)
+            if block_mesh is None:
+                missing.append(block_stack)
             else:
-                self._cached_models[block_stack] = merge_block_meshes(
-                    (self._get_model(block_stack.base_block),)
-                    + tuple(
-                        self._get_model(block_) for block_ in block_stack.extra_blocks
+                block_meshes[block_stack] = block_mesh
+
+        if missing:
+            created_meshes: Iterable[BlockMesh]
+            if max_workers == 1 or len(missing) == 1:
+                created_meshes = map(self._create_block_model, missing)
+            else:
+                with ThreadPoolExecutor(max_workers) as executor:
+                    created_meshes = list(
+                        executor.map(self._create_block_model, missing)
                     )
-                )
+            for block_stack, block_mesh in zip(missing, created_meshes):
+                self._cache_block_model(generation, block_stack, block_mesh)
+                block_meshes[block_stack] = block_mesh
+
+        return [block_meshes[block_stack] for block_stack in block_stacks]
 
-        return self._cached_models[block_stack]
+    def _create_block_model(self, block_stack: BlockStack) -> BlockMesh:
+        """Create the model for a block state. This does not use the cache."""
+        if len(block_stack) == 1:
+            return self._get_model(block_stack.base_block)
+        else:
+            return merge_block_meshes(
+                (self._get_model(block_stack.base_block),)
+                + tuple(self._get_model(block_) for block_ in block_stack.extra_blocks)
+            )
 
     def _get_model(self, block: Block) -> BlockMesh:
         raise NotImplementedError
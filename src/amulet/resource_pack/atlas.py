@@ -0,0 +1,573 @@
+"""Pack textures into texture atlas pages so that renderers can upload them once.
+
+Textures are packed into power-of-two pages with a skyline bottom-left packer.
+Animated textures only contribute their first frame.
+The UVs of a :class:`BlockMesh` can be remapped from texture space into atlas space.
+
+Atlases can be cached under CACHE_DIR keyed by the resource packs and the state of the texture files.
+The pages are stored as raw RGBA so that a cached atlas is memory mapped rather than decoded.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import marshal
+import shutil
+import hashlib
+import logging
+import tempfile
+from collections.abc import Iterable, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+import numpy
+from PIL import Image
+
+from amulet.resource_pack.mesh.block import BlockMesh, BlockMeshPart
+from amulet.utils.task_manager import AbstractProgressManager, VoidProgressManager
+from amulet.resource_pack.resource_file import (
+    open_resource,
+    stat_resource,
+    is_resource_file,
+)
+
+log = logging.getLogger(__name__)
+
+_Magic = b"AMULET_TEXTURE_ATLAS"
+# Increment this if the format of the stored data or the packing changes.
+_FormatVersion = 1
+# The number of cached atlases to keep.
+_MaxCachedAtlases = 8
+# The age in seconds after which an unfinished temporary directory is assumed abandoned.
+_AbandonedTempAge = 24 * 60 * 60
+
+
+class AtlasRect:
+    """The location of a texture in a texture atlas."""
+
+    def __init__(
+        self,
+        page: int,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        page_width: int,
+        page_height: int,
+    ) -> None:
+        #: The index of the page the texture is on.
+        self.page = page
+        #: The pixel location of the texture on the page excluding any padding.
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        #: The size of the page in pixels.
+        self.page_width = page_width
+        self.page_height = page_height
+
+    def __repr__(self) -> str:
+        return (
+            f"AtlasRect(page={self.page}, x={self.x}, y={self.y}, "
+            f"width={self.width}, height={self.height})"
+        )
+
+    @property
+    def uv(self) -> tuple[float, float, float, float]:
+        """The texture bounds in page space (u1, v1, u2, v2) where 0 and 1 are the page edges."""
+        return (
+            self.x / self.page_width,
+            self.y / self.page_height,
+            (self.x + self.width) / self.page_width,
+            (self.y + self.height) / self.page_height,
+        )
+
+
+class TextureAtlas:
+    """Textures packed into one or more atlas pages."""
+
+    def __init__(self, pages: list[numpy.ndarray], rects: dict[str, AtlasRect]):
+        """
+        :param pages: The RGBA page images as (height, width, 4) uint8 arrays.
+        :param rects: The location of each texture path in the pages.
+        """
+        self._pages = pages
+        self._rects = rects
+
+    @property
+    def pages(self) -> list[numpy.ndarray]:
+        """The RGBA page images as (height, width, 4) uint8 arrays."""
+        return self._pages
+
+    @property
+    def rects(self) -> Mapping[str, AtlasRect]:
+        """The location of each texture path in the pages."""
+        return self._rects
+
+    def get_page_image(self, page: int) -> Image.Image:
+        """Get a page as a PIL image."""
+        return Image.fromarray(self._pages[page], "RGBA")
+
+    def remap_block_mesh(self, mesh: BlockMesh) -> BlockMesh:
+        """Convert the texture coordinates of a block mesh into atlas page space.
+
+        The page that each triangle uses is the page of the texture at its texture index.
+        Vertices shared by triangles with different textures are duplicated.
+
+        :param mesh: The block mesh with texture coordinates in texture space.
+        :return: A new block mesh with texture coordinates in page space.
+        :raises KeyError: If a texture used by the mesh is not in the atlas.
+        """
+        # The (u1, v1, u2, v2) bounds of each texture in the mesh.
+        bounds = numpy.array(
+            [self._rects[texture].uv for texture in mesh.textures], numpy.float32
+        ).reshape(-1, 4)
+        return BlockMesh(
+            mesh.transparency,
+            mesh.textures,
+            (
+                self._remap_part(mesh.parts[0], bounds),
+                self._remap_part(mesh.parts[1], bounds),
+                self._remap_part(mesh.parts[2], bounds),
+                self._remap_part(mesh.parts[3], bounds),
+                self._remap_part(mesh.parts[4], bounds),
+                self._remap_part(mesh.parts[5], bounds),
+                self._remap_part(mesh.parts[6], bounds),
+            ),
+        )
+
+    @staticmethod
+    def _remap_part(
+        part: Optional[BlockMeshPart], bounds: numpy.ndarray
+    ) -> Optional[BlockMeshPart]:
+        if part is None:
+            return None
+        verts = part.vertex_array.copy()
+        triangles = part.triangle_array.astype(numpy.uint32)
+        corners = triangles[:, :3]
+        texture_indexes = triangles[:, 3]
+
+        # Find the texture used by each vertex.
+        vertex_textures = numpy.zeros(len(verts), numpy.uint32)
+        vertex_textures[corners] = texture_indexes.reshape(-1, 1)
+        if numpy.any(vertex_textures[corners] != texture_indexes.reshape(-1, 1)):
+            # A vertex is shared by triangles with different textures. Give each triangle its own vertices.
+            verts = verts[corners.reshape(-1)]
+            vertex_textures = numpy.repeat(texture_indexes, 3)
+            corners = numpy.arange(len(verts), dtype=numpy.uint32).reshape(-1, 3)
+            triangles = numpy.concatenate(
+                [corners, texture_indexes.reshape(-1, 1)], axis=1
+            )
+
+        used = numpy.zeros(len(verts), bool)
+        used[corners] = True
+        vertex_bounds = bounds[vertex_textures[used]]
+        uv = verts[used, 3:5]
+        verts[used, 3:5] = vertex_bounds[:, 0:2] + uv * (
+            vertex_bounds[:, 2:4] - vertex_bounds[:, 0:2]
+        )
+        return BlockMeshPart(verts, triangles)
+
+
+class _SkylinePacker:
+    """Pack rectangles into a fixed size area using the skyline bottom-left heuristic."""
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        # The (x, y, width) segments that make up the top edge of the packed area.
+        self._skyline: list[list[int]] = [[0, 0, width]]
+        # The maximum extent of the placed rectangles.
+        self.used_width = 0
+        self.used_height = 0
+
+    def _fit(self, index: int, width: int, height: int) -> Optional[int]:
+        """Get the y position a rectangle would be placed at if its left edge is at the given segment."""
+        x = self._skyline[index][0]
+        if x + width > self.width:
+            return None
+        y = 0
+        remaining = width
+        while remaining > 0:
+            _, segment_y, segment_width = self._skyline[index]
+            y = max(y, segment_y)
+            if y + height > self.height:
+                return None
+            remaining -= segment_width
+            index += 1
+        return y
+
+    def insert(self, width: int, height: int) -> Optional[tuple[int, int]]:
+        """Place a rectangle.
+
+        :return: The (x, y) position of the rectangle or None if it does not fit.
+        """
+        best: Optional[tuple[int, int, int]] = None  # y, x, index
+        for index in range(len(self._skyline)):
+            y = self._fit(index, width, height)
+            if y is not None:
+                candidate = (y, self._skyline[index][0], index)
+                if best is None or candidate < best:
+                    best = candidate
+        if best is None:
+            return None
+        y, x, index = best
+
+        # Replace the covered segments with the new segment.
+        skyline = self._skyline
+        skyline.insert(index, [x, y + height, width])
+        right = x + width
+        i = index + 1
+        while i < len(skyline) and skyline[i][0] < right:
+            segment = skyline[i]
+            segment_right = segment[0] + segment[2]
+            if segment_right <= right:
+                del skyline[i]
+            else:
+                segment[2] = segment_right - right
+                segment[0] = right
+                break
+        # Merge neighbouring segments with the same height.
+        i = 0
+        while i < len(skyline) - 1:
+            if skyline[i][1] == skyline[i + 1][1]:
+                skyline[i][2] += skyline[i + 1][2]
+                del skyline[i + 1]
+            else:
+                i += 1
+
+        self.used_width = max(self.used_width, right)
+        self.used_height = max(self.used_height, y + height)
+        return x, y
+
+
+def _next_power_of_two(value: int) -> int:
+    return 1 << max(0, value - 1).bit_length()
+
+
+def load_texture(texture_path: str) -> numpy.ndarray:
+    """Load a texture as a (height, width, 4) uint8 RGBA array.
+
+    If the texture has a .mcmeta file with an animation section only the first frame is returned.
+    """
+    with open_resource(texture_path) as f, Image.open(f) as im:
+        data = numpy.asarray(im.convert("RGBA"))
+
+    mcmeta_path = f"{texture_path}.mcmeta"
+    if is_resource_file(mcmeta_path):
+        try:
+            with open_resource(mcmeta_path) as f:
+                animation = json.load(f).get("animation")
+        except Exception:
+            log.warning(f"Failed to parse {mcmeta_path}", exc_info=True)
+            animation = None
+        if isinstance(animation, dict):
+            height, width = data.shape[:2]
+            # Frames are square by default.
+            frame_width = int(animation.get("width", min(width, height)))
+            frame_height = int(animation.get("height", min(width, height)))
+            frame_index = 0
+            frames = animation.get("frames")
+            if isinstance(frames, list) and frames:
+                frame = frames[0]
+                frame_index = int(
+                    frame.get("index", 0) if isinstance(frame, dict) else frame
+                )
+            columns = max(1, width // frame_width)
+            x = (frame_index % columns) * frame_width
+            y = (frame_index // columns) * frame_height
+            if 0 < frame_width and 0 < frame_height and y + frame_height <= height:
+                data = data[y : y + frame_height, x : x + frame_width]
+    return data
+
+
+def _load_textures(
+    texture_paths: list[str], max_workers: Optional[int]
+) -> Iterator[Optional[numpy.ndarray]]:
+    def load(texture_path: str) -> Optional[numpy.ndarray]:
+        try:
+            return load_texture(texture_path)
+        except Exception:
+            log.warning(f"Failed to load texture {texture_path}", exc_info=True)
+            return None
+
+    if max_workers == 1 or len(texture_paths) <= 1:
+        yield from map(load, texture_paths)
+    else:
+        with ThreadPoolExecutor(max_workers) as executor:
+            yield from executor.map(load, texture_paths)
+
+
+def _validate_options(max_size: int, padding: int) -> None:
+    if max_size <= 0 or max_size & (max_size - 1):
+        raise ValueError("max_size must be a power of two.")
+    if padding < 0:
+        raise ValueError("padding must not be negative.")
+    if max_size <= 2 * padding:
+        raise ValueError("padding must be less than half of max_size.")
+
+
+def build_texture_atlas(
+    texture_paths: Iterable[str],
+    max_size: int = 4096,
+    padding: int = 0,
+    progress_manager: AbstractProgressManager = VoidProgressManager(),
+    max_workers: Optional[int] = None,
+) -> TextureAtlas:
+    """Pack textures into a texture atlas.
+
+    :param texture_paths: The paths of the textures to pack. Duplicates are only packed once.
+    :param max_size: The maximum width and height of a page. Must be a power of two.
+        Textures larger than this are downscaled to fit.
+    :param padding: The number of pixels to extend the edge of each texture by to prevent bleeding.
+    :param progress_manager: The progress manager to notify of progress.
+    :param max_workers: The number of threads used to decode textures. If 1 textures are decoded on the calling thread.
+    :return: The texture atlas. Textures that could not be loaded are not included.
+    :raises ValueError: If max_size is not a power of two or padding is negative or not less than half of max_size.
+    """
+    _validate_options(max_size, padding)
+
+    paths = list(dict.fromkeys(texture_paths))
+    path_count = len(paths)
+    load_progress_manager = progress_manager.get_child(0.0, 0.5)
+    textures: dict[str, numpy.ndarray] = {}
+    max_texture_size = max_size - 2 * padding
+    for path_index, (path, texture) in enumerate(
+        zip(paths, _load_textures(paths, max_workers))
+    ):
+        if texture is not None:
+            height, width = texture.shape[:2]
+            if max_texture_size < width or max_texture_size < height:
+                log.warning(
+                    f"Texture {path} is larger than the atlas page. It will be downscaled."
+                )
+                scale = max_texture_size / max(width, height)
+                texture = numpy.asarray(
+                    Image.fromarray(texture, "RGBA").resize(
+                        (max(1, int(width * scale)), max(1, int(height * scale)))
+                    )
+                )
+            textures[path] = texture
+        if not path_index % 100:
+            load_progress_manager.update_progress(path_index / path_count)
+
+    # Place the tallest textures first.
+    order = sorted(
+        textures, key=lambda p: (-textures[p].shape[0], -textures[p].shape[1], p)
+    )
+    packers: list[_SkylinePacker] = []
+    positions: dict[str, tuple[int, int, int]] = {}  # page, x, y
+    for path in order:
+        height, width = textures[path].shape[:2]
+        for page, packer in enumerate(packers):
+            position = packer.insert(width + 2 * padding, height + 2 * padding)
+            if position is not None:
+                break
+        else:
+            page = len(packers)
+            packer = _SkylinePacker(max_size, max_size)
+            packers.append(packer)
+            position = packer.insert(width + 2 * padding, height + 2 * padding)
+            if position is None:
+                raise RuntimeError(
+                    f"Texture {path} ({width}x{height} with {padding} padding) "
+                    f"does not fit in an empty {max_size}x{max_size} atlas page."
+                )
+        positions[path] = (page, position[0] + padding, position[1] + padding)
+
+    # Shrink each page to the smallest power of two that contains its textures.
+    pages = [
+        numpy.zeros(
+            (
+                _next_power_of_two(packer.used_height),
+                _next_power_of_two(packer.used_width),
+                4,
+            ),
+            numpy.uint8,
+        )
+        for packer in packers
+    ]
+    rects: dict[str, AtlasRect] = {}
+    copy_progress_manager = progress_manager.get_child(0.5, 1.0)
+    for path_index, path in enumerate(paths):
+        if path not in positions:
+            continue
+        texture = textures[path]
+        page, x, y = positions[path]
+        height, width = texture.shape[:2]
+        page_data = pages[page]
+        if padding:
+            page_data[
+                y - padding : y + height + padding, x - padding : x + width + padding
+            ] = numpy.pad(
+                texture, ((padding, padding), (padding, padding), (0, 0)), "edge"
+            )
+        else:
+            page_data[y : y + height, x : x + width] = texture
+        rects[path] = AtlasRect(
+            page, x, y, width, height, page_data.shape[1], page_data.shape[0]
+        )
+        if not path_index % 100:
+            copy_progress_manager.update_progress(path_index / path_count)
+
+    return TextureAtlas(pages, rects)
+
+
+def _get_cache_key(
+    texture_paths: list[str],
+    pack_paths: Iterable[str],
+    max_size: int,
+    padding: int,
+) -> str:
+    """Get the hash of everything that affects the atlas."""
+    key = hashlib.sha256()
+    key.update(_Magic + bytes([_FormatVersion]))
+    key.update(repr((list(pack_paths), max_size, padding)).encode("utf-8"))
+    for texture_path in texture_paths:
+        stats = [
+            stat_resource(path) for path in (texture_path, f"{texture_path}.mcmeta")
+        ]
+        key.update(repr((texture_path, stats)).encode("utf-8"))
+    return key.hexdigest()
+
+
+def _get_cache_dir() -> str:
+    return os.path.join(os.environ["CACHE_DIR"], "resource_packs", "atlas")
+
+
+def _read_atlas(path: str) -> Optional[TextureAtlas]:
+    try:
+        with open(os.path.join(path, "atlas.bin"), "rb") as f:
+            header = _Magic + bytes([_FormatVersion, marshal.version])
+            if f.read(len(header)) != header:
+                return None
+            page_shapes, rects = marshal.load(f)
+        pages: list[numpy.ndarray] = [
+            numpy.memmap(
+                os.path.join(path, f"page_{page}.rgba"),
+                numpy.uint8,
+                "r",
+                shape=(height, width, 4),
+            )
+            for page, (height, width) in enumerate(page_shapes)
+        ]
+    except FileNotFoundError:
+        return None
+    except Exception:
+        log.warning(f"Failed to read texture atlas cache {path}", exc_info=True)
+        return None
+    # Mark the atlas as recently used.
+    os.utime(path)
+    return TextureAtlas(
+        pages,
+        {
+            texture_path: AtlasRect(page, x, y, width, height, *page_shapes[page][::-1])
+            for texture_path, (page, x, y, width, height) in rects.items()
+        },
+    )
+
+
+def _write_atlas(path: str, atlas: TextureAtlas) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A unique directory so concurrent writers in any process or thread do not collide.
+        temp_path = tempfile.mkdtemp(suffix=".tmp", dir=os.path.dirname(path))
+    except OSError:
+        log.warning(f"Failed to write texture atlas cache {path}", exc_info=True)
+        return
+    try:
+        for page, data in enumerate(atlas.pages):
+            numpy.ascontiguousarray(data).tofile(
+                os.path.join(temp_path, f"page_{page}.rgba")
+            )
+        with open(os.path.join(temp_path, "atlas.bin"), "wb") as f:
+            f.write(_Magic)
+            f.write(bytes([_FormatVersion, marshal.version]))
+            marshal.dump(
+                (
+                    [data.shape[:2] for data in atlas.pages],
+                    {
+                        texture_path: (
+                            rect.page,
+                            rect.x,
+                            rect.y,
+                            rect.width,
+                            rect.height,
+                        )
+                        for texture_path, rect in atlas.rects.items()
+                    },
+                ),
+                f,
+            )
+        try:
+            os.rename(temp_path, path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+            # Another writer stored the same atlas first.
+            shutil.rmtree(temp_path, ignore_errors=True)
+    except Exception:
+        log.warning(f"Failed to write texture atlas cache {path}", exc_info=True)
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+
+def _prune_cache(cache_dir: str) -> None:
+    """Remove all but the most recently used cached atlases.
+
+    Temporary directories are left for their writer unless they were abandoned a day ago.
+    """
+    try:
+        entries = []
+        for entry in os.scandir(cache_dir):
+            if not entry.is_dir():
+                continue
+            if entry.name.endswith(".tmp"):
+                if time.time() - entry.stat().st_mtime > _AbandonedTempAge:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                continue
+            entries.append(entry)
+        entries.sort(key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+    except OSError:
+        return
+    for entry in entries[_MaxCachedAtlases:]:
+        # This may fail if another process has the pages mapped.
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def get_texture_atlas(
+    texture_paths: Iterable[str],
+    pack_paths: Iterable[str] = (),
+    max_size: int = 4096,
+    padding: int = 0,
+    progress_manager: AbstractProgressManager = VoidProgressManager(),
+    max_workers: Optional[int] = None,
+) -> TextureAtlas:
+    """Get a texture atlas from the cache or build it and store it in the cache.
+
+    The cache key is derived from the ordered pack paths, the atlas options
+    and the path, modification time and size of each texture and its .mcmeta file.
+    Cached pages are memory mapped read-only.
+
+    :param texture_paths: The paths of the textures to pack. Duplicates are only packed once.
+    :param pack_paths: The ordered resource pack paths the textures were found in.
+    :param max_size: The maximum width and height of a page. Must be a power of two.
+    :param padding: The number of pixels to extend the edge of each texture by to prevent bleeding.
+    :param progress_manager: The progress manager to notify of progress.
+    :param max_workers: The number of threads used to decode textures.
+    :return: The texture atlas.
+    :raises ValueError: If max_size is not a power of two or padding is negative or not less than half of max_size.
+    """
+    _validate_options(max_size, padding)
+    paths = list(dict.fromkeys(texture_paths))
+    cache_dir = _get_cache_dir()
+    path = os.path.join(cache_dir, _get_cache_key(paths, pack_paths, max_size, padding))
+    atlas = _read_atlas(path)
+    if atlas is None:
+        atlas = build_texture_atlas(
+            paths, max_size, padding, progress_manager, max_workers
+        )
+        _write_atlas(path, atlas)
+        _prune_cache(cache_dir)
+    return atlas
@@ -0,0 +1,166 @@
+"""A bounded cache of the block meshes created by a resource pack manager.
+
+The memory used by each mesh is measured with :meth:`BlockMesh.memory_usage`.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+from collections import OrderedDict
+from threading import Lock
+
+from amulet.core.block import BlockStack
+from amulet.resource_pack.mesh.block import BlockMesh
+
+
+class BlockMeshCache:
+    """A least recently used cache of block meshes.
+
+    The cache can be bounded by the number of entries, the estimated memory usage or both.
+    When a bound is exceeded the least recently used entries are evicted until it is met.
+    If both bounds are None the cache is unbounded.
+    A mesh object stored for several block stacks, such as the missing block mesh, is only counted in the memory once.
+    """
+
+    def __init__(
+        self, max_entries: Optional[int] = None, max_memory: Optional[int] = None
+    ) -> None:
+        """
+        :param max_entries: The maximum number of meshes to store.
+        :param max_memory: The maximum estimated number of bytes to store.
+        """
+        self._lock = Lock()
+        # The meshes and their estimated size in least recently used order.
+        self._meshes: OrderedDict[BlockStack, tuple[BlockMesh, int]] = OrderedDict()
+        # The number of entries that store each mesh object. Keyed by the id of the mesh.
+        self._mesh_counts: dict[int, int] = {}
+        self._memory = 0
+        self._max_entries = max_entries
+        self._max_memory = max_memory
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._meshes)
+
+    def __contains__(self, block_stack: BlockStack) -> bool:
+        return block_stack in self._meshes
+
+    @property
+    def max_entries(self) -> Optional[int]:
+        """The maximum number of meshes to store. None if the number of entries is not bounded."""
+        return self._max_entries
+
+    @max_entries.setter
+    def max_entries(self, max_entries: Optional[int]) -> None:
+        with self._lock:
+            self._max_entries = max_entries
+            self._evict()
+
+    @property
+    def max_memory(self) -> Optional[int]:
+        """The maximum estimated number of bytes to store. None if the memory is not bounded."""
+        return self._max_memory
+
+    @max_memory.setter
+    def max_memory(self, max_memory: Optional[int]) -> None:
+        with self._lock:
+            self._max_memory = max_memory
+            self._evict()
+
+    @property
+    def memory(self) -> int:
+        """The estimated number of bytes used by the stored meshes."""
+        return self._memory
+
+    @property
+    def hits(self) -> int:
+        """The number of lookups that found a mesh."""
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """The number of lookups that did not find a mesh."""
+        return self._misses
+
+    @property
+    def evictions(self) -> int:
+        """The number of meshes removed to stay within the bounds."""
+        return self._evictions
+
+    def reset_stats(self) -> None:
+        """Reset the hit, miss and eviction counters."""
+        with self._lock:
+            self._hits = self._misses = self._evictions = 0
+
+    def keys(self) -> list[BlockStack]:
+        """Get the block stacks that have a stored mesh in least recently used order."""
+        with self._lock:
+            return list(self._meshes)
+
+    def get(self, block_stack: BlockStack) -> Optional[BlockMesh]:
+        """Get the mesh for a block stack and mark it as recently used.
+
+        :param block_stack: The block stack to look up.
+        :return: The mesh or None if it is not stored.
+        """
+        with self._lock:
+            entry = self._meshes.get(block_stack)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._meshes.move_to_end(block_stack)
+            return entry[0]
+
+    def put(self, block_stack: BlockStack, mesh: BlockMesh) -> None:
+        """Store the mesh for a block stack and evict old entries if a bound is exceeded."""
+        size = mesh.memory_usage()
+        with self._lock:
+            old_entry = self._meshes.pop(block_stack, None)
+            if old_entry is not None:
+                self._release(old_entry)
+            self._meshes[block_stack] = (mesh, size)
+            mesh_id = id(mesh)
+            count = self._mesh_counts.get(mesh_id, 0)
+            if not count:
+                self._memory += size
+            self._mesh_counts[mesh_id] = count + 1
+            self._evict()
+
+    def discard(self, block_stack: BlockStack) -> None:
+        """Remove the mesh for a block stack if it is stored."""
+        with self._lock:
+            entry = self._meshes.pop(block_stack, None)
+            if entry is not None:
+                self._release(entry)
+
+    def clear(self) -> None:
+        """Remove all stored meshes."""
+        with self._lock:
+            self._meshes.clear()
+            self._mesh_counts.clear()
+            self._memory = 0
+
+    def _release(self, entry: tuple[BlockMesh, int]) -> None:
+        """Update the memory for an entry that was removed."""
+        mesh, size = entry
+        mesh_id = id(mesh)
+        count = self._mesh_counts[mesh_id] - 1
+        if count:
+            self._mesh_counts[mesh_id] = count
+        else:
+            del self._mesh_counts[mesh_id]
+            self._memory -= size
+
+    def _evict(self) -> None:
+        max_entries = self._max_entries
+        max_memory = self._max_memory
+        while self._meshes and (
+            (max_entries is not None and len(self._meshes) > max_entries)
+            or (max_memory is not None and self._memory > max_memory)
+        ):
+            _, entry = self._meshes.popitem(last=False)
+            self._release(entry)
+            self._evictions += 1
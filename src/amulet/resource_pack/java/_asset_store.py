@@ -0,0 +1,272 @@
+"""A content addressed store for the files of the vanilla resource packs.
+
+Each file is stored once under the hash of its contents and shared between all versions that contain it.
+Each version has a manifest mapping its relative file paths to hashes.
+The version is made loadable by hard linking the stored files into a resource pack directory.
+
+Objects that no manifest uses are removed by :meth:`AssetStore.prune`.
+A writer registers itself while it adds objects and stores their manifest so that a concurrent prune
+in any thread or process does not remove objects before the manifest that uses them exists.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import contextlib
+from typing import IO, Iterator, Optional
+
+log = logging.getLogger(__name__)
+
+FileHashT = str  # The hex sha256 of the file contents.
+
+# The number of seconds after which the lock of a prune that did not finish is ignored.
+_StalePruneAge = 10 * 60
+# The number of seconds after which the registration of a writer that did not finish is ignored.
+_StaleWriterAge = 24 * 60 * 60
+
+
+def _is_stale(path: str, max_age: float) -> bool:
+    """Is a lock path older than the maximum age. A path that does not exist is stale."""
+    try:
+        return time.time() - os.stat(path).st_mtime > max_age
+    except FileNotFoundError:
+        return True
+
+
+def hash_file(f: IO[bytes], chunk_size: int = 1024 * 1024) -> FileHashT:
+    """Hash the remaining contents of a binary file object."""
+    file_hash = hashlib.sha256()
+    while chunk := f.read(chunk_size):
+        file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+class AssetStore:
+    """Files stored by content hash with a manifest for each version.
+
+    The store is safe to use from multiple threads and processes.
+    Objects, manifests and linked directories are written to a uniquely named temporary path and renamed into place.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        :param path: The directory to store the data in.
+        """
+        self._path = path
+        self._objects_path = os.path.join(path, "objects")
+        self._manifests_path = os.path.join(path, "manifests")
+        self._temp_path = os.path.join(path, "temp")
+        self._writers_path = os.path.join(path, "writers")
+        self._prune_lock_path = os.path.join(path, "prune.lock")
+
+    def object_path(self, file_hash: FileHashT) -> str:
+        """Get the path of a stored object."""
+        return os.path.join(self._objects_path, file_hash[:2], file_hash)
+
+    def has_object(self, file_hash: FileHashT) -> bool:
+        """Is an object with this hash stored."""
+        return os.path.isfile(self.object_path(file_hash))
+
+    def add_object(
+        self, file_hash: FileHashT, src: IO[bytes], chunk_size: int = 1024 * 1024
+    ) -> None:
+        """Store the contents of a file under its hash.
+
+        :param file_hash: The hash of the contents.
+        :param src: The file object to read the contents from.
+        :param chunk_size: The number of bytes to copy at a time.
+        """
+        path = self.object_path(file_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.makedirs(self._temp_path, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self._temp_path)
+        try:
+            with os.fdopen(fd, "wb") as dst:
+                shutil.copyfileobj(src, dst, chunk_size)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+
+    def _manifest_path(self, version: str) -> str:
+        return os.path.join(self._manifests_path, f"{version}.json")
+
+    def get_manifest(self, version: str) -> Optional[dict[str, FileHashT]]:
+        """Get the relative path to hash map of a version or None if it is not stored."""
+        try:
+            with open(self._manifest_path(version)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError):
+            log.warning(f"Failed to read the manifest for {version}", exc_info=True)
+            return None
+        if not isinstance(manifest, dict):
+            return None
+        return manifest
+
+    def set_manifest(self, version: str, files: dict[str, FileHashT]) -> None:
+        """Store the manifest of a version. All of its objects must already be stored."""
+        path = self._manifest_path(version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(files, f)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+
+    def remove_manifest(self, version: str) -> None:
+        """Remove the manifest of a version. The objects are kept until :meth:`prune` is called."""
+        try:
+            os.remove(self._manifest_path(version))
+        except FileNotFoundError:
+            pass
+
+    @property
+    def versions(self) -> list[str]:
+        """The versions that have a manifest."""
+        try:
+            file_names = os.listdir(self._manifests_path)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            file_name[:-5] for file_name in file_names if file_name.endswith(".json")
+        )
+
+    @contextlib.contextmanager
+    def writing(self) -> Iterator[None]:
+        """Register a writer until the block exits.
+
+        Objects that are added or found to exist are not removed by :meth:`prune` until the block exits.
+        The manifest that uses them must be stored before the block exits.
+        Any number of threads and processes can write at the same time.
+        """
+        os.makedirs(self._writers_path, exist_ok=True)
+        fd, writer_path = tempfile.mkstemp(suffix=".writer", dir=self._writers_path)
+        os.close(fd)
+        try:
+            # Wait for a prune that started before this writer was registered.
+            # A prune that starts later sees the registration and does nothing.
+            while os.path.isdir(self._prune_lock_path) and not _is_stale(
+                self._prune_lock_path, _StalePruneAge
+            ):
+                time.sleep(0.05)
+            yield
+        finally:
+            os.remove(writer_path)
+
+    def _has_writers(self) -> bool:
+        try:
+            entries = list(os.scandir(self._writers_path))
+        except FileNotFoundError:
+            return False
+        return any(
+            not _is_stale(entry.path, _StaleWriterAge)
+            for entry in entries
+            if entry.name.endswith(".writer")
+        )
+
+    def prune(self) -> int:
+        """Remove the objects that are not used by any manifest.
+
+        Nothing is removed while a writer is registered with :meth:`writing`.
+
+        :return: The number of objects removed.
+        """
+        os.makedirs(self._path, exist_ok=True)
+        try:
+            os.mkdir(self._prune_lock_path)
+        except FileExistsError:
+            if not _is_stale(self._prune_lock_path, _StalePruneAge):
+                # Another thread or process is pruning.
+                return 0
+            # The last prune did not finish. Take over its lock.
+            try:
+                os.utime(self._prune_lock_path)
+            except FileNotFoundError:
+                return 0
+        try:
+            if self._has_writers():
+                log.info("Not pruning the asset store while it is being written to.")
+                return 0
+            used: set[FileHashT] = set()
+            for version in self.versions:
+                manifest = self.get_manifest(version)
+                if manifest is None:
+                    # Do not remove objects that an unreadable manifest may use.
+                    return 0
+                used.update(manifest.values())
+            removed = 0
+            for dir_path, _, file_names in os.walk(self._objects_path):
+                for file_name in file_names:
+                    if file_name not in used:
+                        with contextlib.suppress(FileNotFoundError):
+                            os.remove(os.path.join(dir_path, file_name))
+                            removed += 1
+            return removed
+        finally:
+            with contextlib.suppress(OSError):
+                os.rmdir(self._prune_lock_path)
+
+    @staticmethod
+    def is_linked(files: dict[str, FileHashT], path: str) -> bool:
+        """Does a directory created by :meth:`link` contain every file of a manifest.
+
+        This costs one stat call for each file.
+
+        :param files: The relative path to hash map.
+        :param path: The directory to check.
+        """
+        return all(os.path.isfile(os.path.join(path, rel_path)) for rel_path in files)
+
+    def link(self, files: dict[str, FileHashT], path: str) -> None:
+        """Create a directory containing the files of a manifest.
+
+        Files are hard linked to the stored objects so no data is copied.
+        If hard links are not supported the files are copied.
+        The stored objects are shared so the linked files must not be modified.
+
+        :param files: The relative path to hash map.
+        :param path: The directory to create. It is replaced if it exists.
+        """
+        parent_path, name = os.path.split(path)
+        os.makedirs(parent_path, exist_ok=True)
+        temp_path = tempfile.mkdtemp(prefix=f"{name}.", suffix=".tmp", dir=parent_path)
+        try:
+            for dir_path in sorted(
+                {
+                    os.path.dirname(os.path.join(temp_path, rel_path))
+                    for rel_path in files
+                }
+            ):
+                os.makedirs(dir_path, exist_ok=True)
+            can_link = True
+            for rel_path, file_hash in files.items():
+                src = self.object_path(file_hash)
+                dst = os.path.join(temp_path, rel_path)
+                if can_link:
+                    try:
+                        os.link(src, dst)
+                        continue
+                    except OSError:
+                        can_link = False
+                shutil.copyfile(src, dst)
+            # Another thread or process may be replacing the directory at the same time.
+            shutil.rmtree(path, ignore_errors=True)
+            try:
+                os.replace(temp_path, path)
+            except OSError:
+                if not self.is_linked(files, path):
+                    raise
+                # Another thread or process linked the directory first.
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
@@ -0,0 +1,190 @@
+"""Java blockstate files compiled into a form that is fast to match against a block."""
+
+from __future__ import annotations
+
+import re
+import logging
+from collections.abc import Mapping
+from typing import Any, Optional, TypeAlias, Union
+
+from amulet.nbt import StringTag
+from amulet.core.block import Block
+
+log = logging.getLogger(__name__)
+
+_PropertiesPattern = re.compile(r"(?P<name>[a-zA-Z0-9_]+)=(?P<value>[a-zA-Z0-9_]+),?")
+
+PropertyKeyT: TypeAlias = tuple[str | bytes | int | None, ...]
+# The (property index, accepted values) pairs that must all match.
+ConditionT: TypeAlias = tuple[tuple[int, frozenset[str]], ...]
+
+
+def get_py_data(obj: Block.PropertyValue) -> str | bytes | int:
+    if isinstance(obj, StringTag):
+        return obj.py_str_or_bytes
+    else:
+        return obj.py_int
+
+
+def parse_state_values(val: Union[str, bool]) -> frozenset[str]:
+    """Convert the json block state value format into the set of accepted values."""
+    if isinstance(val, str):
+        return frozenset(val.split("|"))
+    elif isinstance(val, bool):
+        return frozenset(("true" if val else "false",))
+    else:
+        raise Exception(f"Could not parse state val {val}")
+
+
+class CompiledBlockstate:
+    """The base class for compiled blockstates.
+
+    Matching a block is a dictionary lookup keyed by the values of the properties used in the file.
+    The first lookup of each key computes the result and stores it.
+    """
+
+    def __init__(self, property_names: tuple[str, ...]) -> None:
+        # The property names that this blockstate depends on.
+        self._property_names = property_names
+        # Map from property values to the matched values in file order.
+        self._lookup: dict[PropertyKeyT, tuple[Any, ...]] = {}
+
+    def _get_key(self, properties: Mapping[str, Block.PropertyValue]) -> PropertyKeyT:
+        return tuple(
+            None if value is None else get_py_data(value)
+            for value in map(properties.get, self._property_names)
+        )
+
+    def _match(self, key: PropertyKeyT) -> tuple[Any, ...]:
+        raise NotImplementedError
+
+    def match(self, properties: Mapping[str, Block.PropertyValue]) -> tuple[Any, ...]:
+        """Get the values that match the block properties in the order they are defined."""
+        key = self._get_key(properties)
+        values = self._lookup.get(key)
+        if values is None:
+            values = self._lookup[key] = self._match(key)
+        return values
+
+
+class VariantBlockstate(CompiledBlockstate):
+    """A compiled "variants" blockstate.
+
+    Each variant string is parsed once into (property index, value) pairs.
+    When every variant defines every property the lookup table is populated up front.
+    Properties that the block does not define match any value.
+    """
+
+    def __init__(self, variants: dict[str, Any]) -> None:
+        parsed_variants = [
+            (
+                {
+                    match.group("name"): match.group("value")
+                    for match in _PropertiesPattern.finditer(f",{variant}")
+                },
+                value,
+            )
+            for variant, value in variants.items()
+        ]
+        property_names = sorted(
+            {name for properties, _ in parsed_variants for name in properties}
+        )
+        super().__init__(tuple(property_names))
+        name_index = {name: index for index, name in enumerate(property_names)}
+
+        # The (property index, value) pairs that must match for each variant in file order.
+        self._predicates: tuple[tuple[tuple[tuple[int, str], ...], Any], ...] = tuple(
+            (
+                tuple((name_index[name], value) for name, value in properties.items()),
+                variant_value,
+            )
+            for properties, variant_value in parsed_variants
+        )
+
+        if all(
+            len(predicate) == len(property_names) for predicate, _ in self._predicates
+        ):
+            # Each key only matches the variants with exactly its values so the table can be built now.
+            for predicate, variant_value in self._predicates:
+                key = tuple(value for _, value in sorted(predicate))
+                self._lookup[key] = self._lookup.get(key, ()) + (variant_value,)
+
+    def _match(self, key: PropertyKeyT) -> tuple[Any, ...]:
+        return tuple(
+            variant_value
+            for predicate, variant_value in self._predicates
+            if all(
+                key[index] is None or key[index] == value for index, value in predicate
+            )
+        )
+
+
+class MultipartBlockstate(CompiledBlockstate):
+    """A compiled "multipart" blockstate.
+
+    Each "when" clause is compiled once into alternative conditions.
+    Each condition is a tuple of (property index, frozenset of accepted values) pairs.
+    Matching returns the "apply" values of the cases whose conditions are met.
+    """
+
+    def __init__(self, multipart: list[dict]) -> None:
+        property_names: dict[str, int] = {}
+
+        def compile_condition(when: dict[str, Union[str, bool]]) -> ConditionT:
+            return tuple(
+                (
+                    property_names.setdefault(prop, len(property_names)),
+                    parse_state_values(val),
+                )
+                for prop, val in when.items()
+            )
+
+        cases: list[tuple[Optional[tuple[ConditionT, ...]], Any]] = []
+        for case in multipart:
+            try:
+                if "apply" not in case:
+                    continue
+                if "when" in case:
+                    when = case["when"]
+                    if "OR" in when:
+                        conditions = tuple(map(compile_condition, when["OR"]))
+                    elif "AND" in when:
+                        conditions = (
+                            sum(map(compile_condition, when["AND"]), start=()),
+                        )
+                    else:
+                        conditions = (compile_condition(when),)
+                    cases.append((conditions, case["apply"]))
+                else:
+                    cases.append((None, case["apply"]))
+            except Exception as e:
+                log.exception(f"Failed to parse multipart case {case}\n{e}")
+
+        super().__init__(tuple(property_names))
+        # The alternative conditions for each case and the value to apply.
+        # At least one condition must be met. If None the case is always applied.
+        self._cases = tuple(cases)
+
+    def _match(self, key: PropertyKeyT) -> tuple[Any, ...]:
+        return tuple(
+            apply
+            for conditions, apply in self._cases
+            if conditions is None
+            or any(
+                all(key[index] in values for index, values in condition)
+                for condition in conditions
+            )
+        )
+
+
+def compile_blockstate(blockstate: dict) -> Optional[CompiledBlockstate]:
+    """Compile the data from a blockstate file.
+
+    :param blockstate: The parsed json from the blockstate file.
+    :return: The compiled blockstate or None if the format is not known.
+    """
+    if "variants" in blockstate:
+        return VariantBlockstate(blockstate["variants"])
+    elif "multipart" in blockstate:
+        return MultipartBlockstate(blockstate["multipart"])
+    return None
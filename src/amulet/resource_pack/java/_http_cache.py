@@ -0,0 +1,265 @@
+"""An on-disk cache for small HTTP resources such as the launcher and version manifests.
+
+Responses are stored with their ETag and Last-Modified headers and revalidated with conditional requests.
+Each response is stored in a single file, a line of json metadata followed by the body,
+which is replaced atomically so the metadata always matches the body.
+A cached response younger than its time to live is used without contacting the server.
+An older cached response is returned straight away and revalidated in the background,
+so a slow or missing network only delays callers that have nothing cached.
+
+Requests reuse pooled keep-alive connections rather than opening a new connection each time.
+Proxies are configured the same way as for urllib, through the http_proxy, https_proxy and no_proxy
+environment variables or the system settings.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import base64
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Optional
+from email.message import Message
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from urllib.parse import urljoin, urlsplit, urlunsplit, unquote, SplitResult
+from urllib.request import getproxies, proxy_bypass
+
+log = logging.getLogger(__name__)
+
+_MaxRedirects = 5
+
+# scheme, netloc, proxy URL
+_PoolKeyT = tuple[str, str, Optional[str]]
+
+
+def _get_proxy(scheme: str, netloc: str) -> Optional[SplitResult]:
+    """Get the proxy to send a request through. None to connect directly."""
+    proxy = getproxies().get(scheme)
+    if not proxy or proxy_bypass(netloc):
+        return None
+    if "://" not in proxy:
+        proxy = f"http://{proxy}"
+    return urlsplit(proxy)
+
+
+def _get_proxy_headers(proxy: SplitResult) -> dict[str, str]:
+    """Get the headers that authenticate with the proxy."""
+    if proxy.username is None:
+        return {}
+    credentials = f"{unquote(proxy.username)}:{unquote(proxy.password or '')}"
+    return {
+        "Proxy-Authorization": f"Basic {base64.b64encode(credentials.encode()).decode()}"
+    }
+
+
+class _ConnectionPool:
+    """Idle keep-alive connections for each host."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._idle: dict[_PoolKeyT, list[HTTPConnection]] = {}
+
+    def _get_connection(
+        self, key: _PoolKeyT, proxy: Optional[SplitResult], timeout: float
+    ) -> tuple[HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                connection = idle.pop()
+                connection.timeout = timeout
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout)
+                return connection, True
+        scheme, netloc, _ = key
+        if scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme {scheme}")
+        if proxy is None:
+            if scheme == "https":
+                return HTTPSConnection(netloc, timeout=timeout), False
+            return HTTPConnection(netloc, timeout=timeout), False
+        if proxy.hostname is None:
+            raise ValueError(f"Invalid proxy {proxy.geturl()}")
+        if scheme == "https":
+            # Tunnel through the proxy with CONNECT. TLS is negotiated with the server.
+            tunnel = HTTPSConnection(proxy.hostname, proxy.port, timeout=timeout)
+            tunnel.set_tunnel(netloc, headers=_get_proxy_headers(proxy))
+            return tunnel, False
+        # Plain HTTP requests are sent to the proxy with the full URL.
+        return HTTPConnection(proxy.hostname, proxy.port, timeout=timeout), False
+
+    def _put_connection(self, key: _PoolKeyT, connection: HTTPConnection) -> None:
+        with self._lock:
+            self._idle.setdefault(key, []).append(connection)
+
+    def request(
+        self, url: str, headers: dict[str, str], timeout: float
+    ) -> tuple[int, Message, bytes]:
+        """Make a GET request following redirects.
+
+        :param url: The URL to request.
+        :param headers: Extra request headers.
+        :param timeout: The socket timeout in seconds.
+        :return: The status, response headers and body.
+        """
+        for _ in range(_MaxRedirects + 1):
+            parts = urlsplit(url)
+            proxy = _get_proxy(parts.scheme, parts.netloc)
+            key = (
+                parts.scheme,
+                parts.netloc,
+                None if proxy is None else proxy.geturl(),
+            )
+            request_headers = headers
+            if proxy is not None and parts.scheme == "http":
+                path = urlunsplit(parts._replace(path=parts.path or "/", fragment=""))
+                request_headers = {**headers, **_get_proxy_headers(proxy)}
+            else:
+                path = parts.path or "/"
+                if parts.query:
+                    path = f"{path}?{parts.query}"
+            while True:
+                connection, is_reused = self._get_connection(key, proxy, timeout)
+                try:
+                    connection.request("GET", path, headers=request_headers)
+                    response = connection.getresponse()
+                    body = response.read()
+                except (OSError, HTTPException):
+                    connection.close()
+                    if is_reused:
+                        # The server may have closed the idle connection. Retry with a new one.
+                        continue
+                    raise
+                break
+            if response.will_close:
+                connection.close()
+            else:
+                self._put_connection(key, connection)
+            location = response.headers.get("Location")
+            if response.status in (301, 302, 303, 307, 308) and location:
+                url = urljoin(url, location)
+                continue
+            return response.status, response.headers, body
+        raise HTTPException(f"Too many redirects for {url}")
+
+
+_pool = _ConnectionPool()
+# The URLs currently being revalidated in the background.
+_revalidating: set[str] = set()
+_revalidating_lock = threading.Lock()
+
+
+class HTTPCache:
+    """Cache GET responses on disk."""
+
+    def __init__(self, path: str, timeout: float = 20, offline: bool = False) -> None:
+        """
+        :param path: The directory to store the responses in.
+        :param timeout: The socket timeout in seconds.
+        :param offline: If True only cached responses are used and the network is never accessed.
+        """
+        self._path = path
+        self._timeout = timeout
+        self._offline = offline
+
+    def _get_path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self._path, f"{key}.cache")
+
+    def _read(self, url: str) -> Optional[tuple[dict, bytes]]:
+        try:
+            with open(self._get_path(url), "rb") as f:
+                meta = json.loads(f.readline())
+                data = f.read()
+        except (OSError, ValueError):
+            return None
+        if not isinstance(meta, dict) or meta.get("url") != url:
+            return None
+        return meta, data
+
+    def _write(self, url: str, meta: dict, data: bytes) -> None:
+        path = self._get_path(url)
+        os.makedirs(self._path, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self._path)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                # json.dumps escapes newlines so the metadata is a single line.
+                f.write(json.dumps(meta).encode())
+                f.write(b"\n")
+                f.write(data)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+
+    def _fetch(self, url: str, cached: Optional[tuple[dict, bytes]]) -> bytes:
+        """Request the URL, revalidating the cached response if there is one."""
+        headers = {}
+        if cached is not None:
+            if cached[0].get("etag"):
+                headers["If-None-Match"] = cached[0]["etag"]
+            if cached[0].get("last_modified"):
+                headers["If-Modified-Since"] = cached[0]["last_modified"]
+        status, response_headers, body = _pool.request(url, headers, self._timeout)
+        if status == 304 and cached is not None:
+            meta = dict(cached[0], checked=time.time())
+            self._write(url, meta, cached[1])
+            return cached[1]
+        if status != 200:
+            raise HTTPException(f"Request for {url} failed with status {status}")
+        meta = {
+            "url": url,
+            "etag": response_headers.get("ETag"),
+            "last_modified": response_headers.get("Last-Modified"),
+            "checked": time.time(),
+        }
+        self._write(url, meta, body)
+        return body
+
+    def _revalidate(self, url: str, cached: tuple[dict, bytes]) -> None:
+        with _revalidating_lock:
+            if url in _revalidating:
+                return
+            _revalidating.add(url)
+
+        def revalidate() -> None:
+            try:
+                self._fetch(url, cached)
+            except Exception as e:
+                log.info(f"Could not revalidate {url}. {e}")
+            finally:
+                with _revalidating_lock:
+                    _revalidating.discard(url)
+
+        threading.Thread(target=revalidate, name="HTTPCache", daemon=True).start()
+
+    def get(self, url: str, ttl: Optional[float]) -> bytes:
+        """Get the body of a URL.
+
+        :param url: The URL to get.
+        :param ttl: The number of seconds a cached response is used without revalidation.
+            If None the cached response is never revalidated.
+        :return: The response body.
+        :raises ConnectionError: If the response is not cached and the cache is offline.
+        """
+        cached = self._read(url)
+        if cached is not None:
+            checked = cached[0].get("checked")
+            if (
+                self._offline
+                or ttl is None
+                or (
+                    isinstance(checked, (int, float))
+                    and 0 <= time.time() - checked < ttl
+                )
+            ):
+                return cached[1]
+            # Use the stale response now and update it for next time.
+            self._revalidate(url, cached)
+            return cached[1]
+        if self._offline:
+            raise ConnectionError(f"{url} is not cached and offline mode is enabled.")
+        return self._fetch(url, None)
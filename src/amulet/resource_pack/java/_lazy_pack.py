@@ -0,0 +1,157 @@
+"""Resolve the files in a stack of Java resource packs on demand.
+
+Rather than walking the whole pack up front, each lookup lists only the directories on the path to the file.
+Directory listings, file data and texture transparency are cached so each is only read once.
+Zip packs are looked up in the central directory of the zip file.
+"""
+
+from __future__ import annotations
+
+import os
+import logging
+from typing import Optional
+from zipfile import ZipFile
+
+from amulet.resource_pack.java._pack_index import (
+    UselessImageGroups,
+    is_texture_transparent,
+    load_json_file,
+)
+from amulet.resource_pack.resource_file import get_zip_file
+
+log = logging.getLogger(__name__)
+
+
+class LazyPackFiles:
+    """Find textures, blockstates and models in a stack of resource packs when they are first requested."""
+
+    def __init__(self, root_dirs: list[str]) -> None:
+        """
+        :param root_dirs: The root directories or zip files of the resource packs. Later packs overwrite earlier packs.
+        """
+        self._root_dirs = root_dirs
+        # The open zip file for each pack. None if the pack is a directory.
+        self._zip_files: list[Optional[ZipFile]] = [
+            get_zip_file(root_dir) if os.path.isfile(root_dir) else None
+            for root_dir in root_dirs
+        ]
+        # Directory path to the names of the files and directories in it. None if it does not exist.
+        self._listings: dict[str, Optional[tuple[frozenset[str], frozenset[str]]]] = {}
+        self._textures: dict[tuple[str, str], Optional[str]] = {}
+        self._texture_is_transparent: dict[str, bool] = {}
+        self._blockstate_files: dict[tuple[str, str], Optional[dict]] = {}
+        self._model_files: dict[tuple[str, str], Optional[dict]] = {}
+
+    def _list_dir(self, path: str) -> Optional[tuple[frozenset[str], frozenset[str]]]:
+        """Get the file and directory names in a directory."""
+        if path in self._listings:
+            return self._listings[path]
+        listing: Optional[tuple[frozenset[str], frozenset[str]]]
+        try:
+            files = []
+            directories = []
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        directories.append(entry.name)
+                    else:
+                        files.append(entry.name)
+        except OSError:
+            listing = None
+        else:
+            listing = (frozenset(files), frozenset(directories))
+        self._listings[path] = listing
+        return listing
+
+    def _find(self, *parts: str) -> Optional[str]:
+        """Find the path of a file in the highest priority pack that contains it.
+
+        :param parts: The path components relative to the pack root. The last component is the file name.
+        :return: The absolute file path or None if no pack contains it.
+        """
+        *dir_parts, file_name = parts
+        for root_dir, zip_file in zip(
+            reversed(self._root_dirs), reversed(self._zip_files)
+        ):
+            if zip_file is not None:
+                try:
+                    zip_file.getinfo("/".join(parts))
+                except KeyError:
+                    continue
+                return os.path.join(root_dir, *parts)
+            path = root_dir
+            for part in dir_parts:
+                listing = self._list_dir(path)
+                if listing is None or part not in listing[1]:
+                    break
+                path = os.path.join(path, part)
+            else:
+                listing = self._list_dir(path)
+                if listing is not None and file_name in listing[0]:
+                    return os.path.join(path, file_name)
+        return None
+
+    def get_texture(self, namespace: str, relative_path: str) -> Optional[str]:
+        """Get the absolute path of a texture or None if it does not exist."""
+        key = (namespace, relative_path)
+        if key in self._textures:
+            return self._textures[key]
+        parts = relative_path.split("/")
+        if parts[0] in UselessImageGroups:
+            texture_path = None
+        else:
+            parts[-1] += ".png"
+            texture_path = self._find("assets", namespace, "textures", *parts)
+        self._textures[key] = texture_path
+        return texture_path
+
+    def is_texture_transparent(self, texture_path: str) -> bool:
+        """Check if a texture contains any pixels that are not fully opaque."""
+        is_transparent = self._texture_is_transparent.get(texture_path)
+        if is_transparent is None:
+            try:
+                is_transparent = is_texture_transparent(texture_path)
+            except Exception:
+                log.warning(f"Failed to read texture {texture_path}", exc_info=True)
+                is_transparent = True
+            self._texture_is_transparent[texture_path] = is_transparent
+        return is_transparent
+
+    def _get_json(
+        self,
+        cache: dict[tuple[str, str], Optional[dict]],
+        namespace: str,
+        category: str,
+        relative_path: str,
+        file_type: str,
+    ) -> Optional[dict]:
+        key = (namespace, relative_path)
+        if key in cache:
+            return cache[key]
+        parts = relative_path.split("/")
+        parts[-1] += ".json"
+        path = self._find("assets", namespace, category, *parts)
+        data = None
+        if path is not None:
+            try:
+                data = load_json_file(path, file_type)
+            except OSError:
+                log.warning(f"Failed to read {file_type} file {path}", exc_info=True)
+        cache[key] = data
+        return data
+
+    def get_blockstate_file(self, namespace: str, relative_path: str) -> Optional[dict]:
+        """Get the parsed data from a blockstate file or None if it does not exist or is invalid."""
+        return self._get_json(
+            self._blockstate_files,
+            namespace,
+            "blockstates",
+            relative_path,
+            "blockstate",
+        )
+
+    def get_model_file(self, namespace: str, relative_path: str) -> Optional[dict]:
+        """Get the parsed data from a model file or None if it does not exist or is invalid."""
+        return self._get_json(
+            self._model_files, namespace, "models", relative_path, "model"
+        )
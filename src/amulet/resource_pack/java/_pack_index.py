@@ -0,0 +1,470 @@
+"""A persistent index of the files in a single Java resource pack.
+
+The index is stored in a compact binary file under CACHE_DIR with one file per pack.
+It contains the texture, blockstate and model path tables, the texture transparency and the parsed json data.
+It also records the modification time of every indexed file and directory.
+If none of these have changed the cached index is used as is, skipping the directory walk and json parsing.
+Zip packs are indexed from the central directory and are current if the zip file has not changed.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import marshal
+import mmap
+import hashlib
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, Optional
+
+from PIL import Image
+import numpy
+
+from amulet.utils.task_manager import AbstractProgressManager, VoidProgressManager
+from amulet.resource_pack.resource_file import get_zip_file, open_resource
+
+log = logging.getLogger(__name__)
+
+UselessImageGroups = {
+    "colormap",
+    "effect",
+    "environment",
+    "font",
+    "gui",
+    "map",
+    "mob_effect",
+    "particle",
+}
+
+_Magic = b"AMULET_JAVA_PACK_INDEX"
+# Increment this if the format of the stored data changes.
+_FormatVersion = 2
+
+FileStatT = tuple[int, int]  # st_mtime_ns, st_size
+
+
+def is_texture_transparent(texture_path: str) -> bool:
+    """Check if a texture contains any pixels that are not fully opaque."""
+    with open_resource(texture_path) as f, Image.open(f) as im:
+        if im.mode == "RGBA":
+            # Decode the alpha channel straight into a numpy buffer.
+            alpha = numpy.asarray(im.getchannel("A"))
+            return bool(numpy.any(alpha != 255))
+        elif im.mode == "P":
+            return bool(im.info.get("transparency", 0) != 0)
+        else:
+            return False
+
+
+def scan_texture_transparency(
+    texture_paths: list[str], max_workers: Optional[int] = None
+) -> Iterator[bool]:
+    """Compute if each texture is transparent. The results are yielded in the same order as the input.
+
+    :param texture_paths: The paths of the textures to scan.
+    :param max_workers: The number of threads used to decode textures. If 1 textures are decoded on the calling thread.
+    """
+    if max_workers == 1 or len(texture_paths) <= 1:
+        yield from map(is_texture_transparent, texture_paths)
+    else:
+        with ThreadPoolExecutor(max_workers) as executor:
+            yield from executor.map(is_texture_transparent, texture_paths)
+
+
+def _to_file_stat(stat: os.stat_result) -> FileStatT:
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _stat(path: str) -> Optional[FileStatT]:
+    try:
+        return _to_file_stat(os.stat(path))
+    except OSError:
+        return None
+
+
+class JavaPackIndex:
+    """The files in a Java resource pack and the data loaded from them."""
+
+    def __init__(
+        self,
+        root_dir: str,
+        directories: dict[str, FileStatT],
+        files: dict[str, FileStatT],
+        textures: dict[tuple[str, str], str],
+        texture_is_transparent: dict[str, tuple[int, bool]],
+        blockstate_files: dict[tuple[str, str], dict],
+        model_files: dict[tuple[str, str], dict],
+    ) -> None:
+        self.root_dir = root_dir
+        # The stat of every directory that was walked. Keyed by the path relative to the pack root.
+        # Adding or removing a file changes the modification time of the parent directory.
+        self.directories = directories
+        # The stat of every indexed file. Keyed by the path relative to the pack root.
+        self.files = files
+        # (namespace, relative path) to absolute texture path.
+        self.textures = textures
+        # Absolute texture path to (modification time in nanoseconds, is transparent).
+        self.texture_is_transparent = texture_is_transparent
+        # (namespace, relative path) to the parsed json data.
+        self.blockstate_files = blockstate_files
+        self.model_files = model_files
+
+    def is_current(self) -> bool:
+        """Have the indexed files and directories not changed since the index was created.
+
+        The directory stats detect files that were added, removed or renamed.
+        The file stats detect files that were edited in place, which does not change the directory.
+        For a directory pack this costs one stat call per indexed file and directory.
+        This is much cheaper than walking the pack and parsing the files again, but it is not free for large packs.
+        A zip pack costs a single stat call.
+        """
+        root_dir = self.root_dir
+        if os.path.isfile(root_dir):
+            # A zip pack. The members cannot change without the zip file changing.
+            return _stat(root_dir) == self.directories.get("")
+        return all(
+            _stat(os.path.join(root_dir, rel_path)) == stat
+            for rel_path, stat in self.directories.items()
+        ) and all(
+            _stat(os.path.join(root_dir, rel_path)) == stat
+            for rel_path, stat in self.files.items()
+        )
+
+    def _serialise(self) -> tuple[Any, ...]:
+        return (
+            self.root_dir,
+            self.directories,
+            self.files,
+            self.textures,
+            self.texture_is_transparent,
+            self.blockstate_files,
+            self.model_files,
+        )
+
+
+def _get_index_path(root_dir: str) -> str:
+    key = hashlib.sha256(
+        os.path.normcase(os.path.abspath(root_dir)).encode("utf-8")
+    ).hexdigest()
+    return os.path.join(
+        os.environ["CACHE_DIR"], "resource_packs", "java", "index", f"{key}.bin"
+    )
+
+
+def _read_index(path: str) -> Optional[JavaPackIndex]:
+    try:
+        with (
+            open(path, "rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data,
+        ):
+            header = _Magic + bytes([_FormatVersion, marshal.version])
+            if data[: len(header)] != header:
+                return None
+            # Unmarshal directly from the memory map without copying the data.
+            with memoryview(data)[len(header) :] as view:
+                return JavaPackIndex(*marshal.loads(view))
+    except FileNotFoundError:
+        return None
+    except Exception:
+        log.warning(f"Failed to read resource pack index {path}", exc_info=True)
+        return None
+
+
+def _write_index(path: str, index: JavaPackIndex) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A unique temporary file so that concurrent writers do not clobber each other.
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_Magic)
+                f.write(bytes([_FormatVersion, marshal.version]))
+                marshal.dump(index._serialise(), f)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+    except Exception:
+        log.warning(f"Failed to write resource pack index {path}", exc_info=True)
+
+
+# The directories in each namespace that are indexed and if they are searched recursively.
+_Categories = {"textures": True, "blockstates": False, "models": True}
+
+
+def walk_pack(
+    root_dir: str, directories: dict[str, FileStatT]
+) -> Iterator[tuple[str, str, str, FileStatT]]:
+    """Walk the indexed files in a resource pack in one pass.
+
+    Only the textures, blockstates and models directories are walked.
+    Texture directories that are not used by the renderer are skipped.
+    If the pack is a zip file the members are listed from the central directory.
+
+    :param root_dir: The root directory or zip file of the resource pack.
+    :param directories: The stat of every walked directory is added to this. Keyed by the path relative to root_dir.
+        For zip packs only the stat of the zip file is added with the key "".
+    :return: An iterator of (namespace, category, relative path, stat) for each file.
+        The relative path is relative to the category directory and uses / as the separator.
+    """
+    if os.path.isfile(root_dir):
+        yield from _walk_zip_pack(root_dir, directories)
+        return
+
+    def scan(rel_dir: str) -> list[os.DirEntry]:
+        path = os.path.join(root_dir, rel_dir)
+        try:
+            directories[rel_dir] = _to_file_stat(os.stat(path))
+            with os.scandir(path) as it:
+                return list(it)
+        except OSError:
+            return []
+
+    def walk_category(
+        namespace: str, category: str, rel_dir: str, prefix: str, recursive: bool
+    ) -> Iterator[tuple[str, str, str, FileStatT]]:
+        for entry in scan(rel_dir):
+            if entry.is_dir():
+                if recursive and not (
+                    category == "textures"
+                    and not prefix
+                    and entry.name in UselessImageGroups
+                ):
+                    yield from walk_category(
+                        namespace,
+                        category,
+                        os.path.join(rel_dir, entry.name),
+                        f"{prefix}{entry.name}/",
+                        recursive,
+                    )
+            else:
+                yield namespace, category, f"{prefix}{entry.name}", _to_file_stat(
+                    entry.stat()
+                )
+
+    scan("")
+    assets_dir = "assets"
+    for namespace_entry in scan(assets_dir):
+        if not namespace_entry.is_dir():
+            continue
+        namespace = namespace_entry.name
+        namespace_dir = os.path.join(assets_dir, namespace)
+        for category_entry in scan(namespace_dir):
+            category = category_entry.name
+            if category in _Categories and category_entry.is_dir():
+                yield from walk_category(
+                    namespace,
+                    category,
+                    os.path.join(namespace_dir, category),
+                    "",
+                    _Categories[category],
+                )
+
+
+def _walk_zip_pack(
+    zip_path: str, directories: dict[str, FileStatT]
+) -> Iterator[tuple[str, str, str, FileStatT]]:
+    zip_stat = _stat(zip_path)
+    zip_file = get_zip_file(zip_path)
+    if zip_stat is None or zip_file is None:
+        log.error(f"Failed to open zip resource pack {zip_path}")
+        return
+    directories[""] = zip_stat
+    for info in zip_file.infolist():
+        if info.is_dir():
+            continue
+        parts = info.filename.split("/")
+        if len(parts) < 4 or parts[0] != "assets":
+            continue
+        namespace, category, *rel_path = parts[1:]
+        recursive = _Categories.get(category)
+        if recursive is None or not (recursive or len(rel_path) == 1):
+            continue
+        if (
+            category == "textures"
+            and len(rel_path) > 1
+            and rel_path[0] in UselessImageGroups
+        ):
+            continue
+        # The members cannot change without the zip file changing.
+        yield namespace, category, "/".join(rel_path), (zip_stat[0], info.file_size)
+
+
+def load_json_file(path: str, file_type: str) -> Optional[dict]:
+    """Load a json file. If it is not a valid json object an error is logged and None is returned."""
+    with open_resource(path) as fi:
+        try:
+            data = json.load(fi)
+        except json.JSONDecodeError:
+            log.error(f"Failed to parse {file_type} file {path}")
+            return None
+    if not isinstance(data, dict):
+        log.error(f"Failed to parse {file_type} file {path}")
+        return None
+    return data
+
+
+class PackIndexLoader:
+    """Load the index for a resource pack in stages.
+
+    If the cached index is up to date it is used and the stages do nothing.
+    Otherwise the pack is indexed and the data for files that have not changed since the cached index is reused.
+    The stages must be run in order. The cache is updated when the last stage finishes.
+    """
+
+    def __init__(
+        self,
+        root_dir: str,
+        max_workers: Optional[int] = None,
+        previous: Optional[JavaPackIndex] = None,
+    ) -> None:
+        """
+        :param root_dir: The root directory or zip file of the resource pack.
+        :param max_workers: The number of threads used to decode textures.
+        :param previous: An index of the pack already in memory. If None the cached index is read.
+            Unchanged data is shared with this index rather than copied.
+        """
+        self._root_dir = root_dir
+        self._max_workers = max_workers
+        self._cache_path = _get_index_path(root_dir)
+        if previous is None:
+            previous = _read_index(self._cache_path)
+        if previous is not None and previous.root_dir != root_dir:
+            previous = None
+        self._previous = previous
+        self._is_current = previous is not None and previous.is_current()
+        self._index = (
+            previous
+            if previous is not None and self._is_current
+            else JavaPackIndex(root_dir, {}, {}, {}, {}, {}, {})
+        )
+        # The textures that need their transparency computing and their modification time.
+        self._scan_paths: list[str] = []
+        self._scan_mtimes: list[int] = []
+        # The json files that have changed.
+        self._json_paths: list[tuple[str, tuple[str, str], str]] = (
+            []
+        )  # category, key, path
+
+    @property
+    def index(self) -> JavaPackIndex:
+        """The index. This is only complete once all stages have been run."""
+        return self._index
+
+    def index_paths(
+        self, progress_manager: AbstractProgressManager = VoidProgressManager()
+    ) -> None:
+        """Walk the pack and populate the file stats and texture paths."""
+        if self._is_current:
+            return
+        index = self._index
+        previous = self._previous
+        previous_files = {} if previous is None else previous.files
+        previous_transparency = (
+            {} if previous is None else previous.texture_is_transparent
+        )
+        previous_json = {
+            "blockstates": {} if previous is None else previous.blockstate_files,
+            "models": {} if previous is None else previous.model_files,
+        }
+        json_out = {"blockstates": index.blockstate_files, "models": index.model_files}
+
+        progress_manager.update_progress(0.0)
+        for namespace, category, rel_path, file_stat in walk_pack(
+            self._root_dir, index.directories
+        ):
+            if category == "textures":
+                if not rel_path.endswith(".png"):
+                    continue
+                key = (namespace, rel_path[:-4])
+            elif rel_path.endswith(".json"):
+                key = (namespace, rel_path[:-5])
+            else:
+                continue
+            pack_rel_path = os.path.join(
+                "assets", namespace, category, *rel_path.split("/")
+            )
+            path = os.path.join(self._root_dir, pack_rel_path)
+            index.files[pack_rel_path] = file_stat
+
+            if category == "textures":
+                index.textures[key] = path
+                cached = previous_transparency.get(path)
+                if cached is not None and cached[0] == file_stat[0]:
+                    index.texture_is_transparent[path] = cached
+                else:
+                    self._scan_paths.append(path)
+                    self._scan_mtimes.append(file_stat[0])
+            elif (
+                previous_files.get(pack_rel_path) == file_stat
+                and key in previous_json[category]
+            ):
+                json_out[category][key] = previous_json[category][key]
+            else:
+                self._json_paths.append((category, key, path))
+        progress_manager.update_progress(1.0)
+
+    def classify_textures(
+        self, progress_manager: AbstractProgressManager = VoidProgressManager()
+    ) -> None:
+        """Find which of the new or changed textures are transparent."""
+        scan_paths = self._scan_paths
+        scan_mtimes = self._scan_mtimes
+        texture_is_transparent = self._index.texture_is_transparent
+        scan_count = len(scan_paths)
+        for scan_index, is_transparent in enumerate(
+            scan_texture_transparency(scan_paths, self._max_workers)
+        ):
+            texture_is_transparent[scan_paths[scan_index]] = (
+                scan_mtimes[scan_index],
+                is_transparent,
+            )
+            if not scan_index % 100:
+                progress_manager.update_progress(scan_index / scan_count)
+        self._scan_paths = []
+        self._scan_mtimes = []
+
+    def parse_json(
+        self, progress_manager: AbstractProgressManager = VoidProgressManager()
+    ) -> None:
+        """Parse the new or changed blockstate and model files and update the cache."""
+        if self._is_current:
+            return
+        json_out = {
+            "blockstates": self._index.blockstate_files,
+            "models": self._index.model_files,
+        }
+        json_count = len(self._json_paths)
+        for json_index, (category, key, path) in enumerate(self._json_paths):
+            data = load_json_file(
+                path, "blockstate" if category == "blockstates" else "model"
+            )
+            if data is not None:
+                json_out[category][key] = data
+            if not json_index % 100:
+                progress_manager.update_progress(json_index / json_count)
+        self._json_paths = []
+        _write_index(self._cache_path, self._index)
+        self._is_current = True
+
+
+def get_pack_index(
+    root_dir: str,
+    progress_manager: AbstractProgressManager = VoidProgressManager(),
+    max_workers: Optional[int] = None,
+) -> JavaPackIndex:
+    """Get the index for a resource pack.
+    If the cached index is up to date it is used otherwise the pack is indexed and the cache is updated.
+
+    :param root_dir: The root directory of the resource pack.
+    :param progress_manager: The progress manager to notify of progress.
+    :param max_workers: The number of threads used to decode textures.
+    :return: The index of the pack.
+    """
+    loader = PackIndexLoader(root_dir, max_workers)
+    loader.index_paths(progress_manager.get_child(0.0, 0.1))
+    loader.classify_textures(progress_manager.get_child(0.1, 0.7))
+    loader.parse_json(progress_manager.get_child(0.7, 1.0))
+    return loader.index
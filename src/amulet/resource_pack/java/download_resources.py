@@ -1,14 +1,20 @@
+import io
 import os
 import shutil
+import tempfile
 import zipfile
 import json
+import threading
+from http.client import HTTPException
 from urllib.request import urlopen, Request
-import io
-from typing import Generator, TypeVar, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Generator, TypeVar, Any, Optional
 import logging
 
 from amulet.utils.task_manager import AbstractProgressManager, VoidProgressManager
 from amulet.resource_pack import JavaResourcePack
+from amulet.resource_pack.java._asset_store import AssetStore, FileHashT, hash_file
+from amulet.resource_pack.java._http_cache import HTTPCache
 
 T = TypeVar("T")
 
@@ -16,52 +22,151 @@ log = logging.getLogger(__name__)
 
 launcher_manifest: Optional[dict] = None
 INCLUDE_SNAPSHOT = False
+# The URL of the launcher manifest. The version manifests and client jars are found through this.
+LAUNCHER_MANIFEST_URL = "https://launchermeta.mojang.com/mc/game/version_manifest.json"
+# The number of seconds the cached launcher manifest is used before it is revalidated.
+# A stale manifest is still used while it is revalidated in the background.
+LAUNCHER_MANIFEST_TTL = 60 * 60
+# If True the launcher and version manifests are only read from the cache and nothing is downloaded.
+OFFLINE = False
+# The socket timeout in seconds for network requests.
+HTTP_TIMEOUT = 20
+# Files larger than this are downloaded in parts of this size with parallel ranged requests.
+DOWNLOAD_PART_SIZE = 8 * 1024 * 1024
+
+
+def _get_http_cache() -> HTTPCache:
+    return HTTPCache(
+        os.path.join(_get_java_path(), "http_cache"), HTTP_TIMEOUT, OFFLINE
+    )
 
 
 def get_launcher_manifest() -> dict:
     global launcher_manifest
     if launcher_manifest is None:
-        log.info("Downloading java launcher manifest file.")
-        with urlopen(
-            "https://launchermeta.mojang.com/mc/game/version_manifest.json", timeout=20
-        ) as manifest:
-            launcher_manifest = json.load(manifest)
-        log.info("Finished downloading java launcher manifest file.")
+        log.info("Getting java launcher manifest file.")
+        launcher_manifest = json.loads(
+            _get_http_cache().get(LAUNCHER_MANIFEST_URL, LAUNCHER_MANIFEST_TTL)
+        )
+        log.info("Finished getting java launcher manifest file.")
     return launcher_manifest
 
 
+def _get_version_manifest(version: str) -> dict:
+    version_url = next(
+        (v["url"] for v in get_launcher_manifest()["versions"] if v["id"] == version),
+        None,
+    )
+    if version_url is None:
+        raise Exception(f"Could not find Java resource pack for version {version}.")
+    # The URL contains the hash of the manifest so it never needs revalidating.
+    version_manifest: dict = json.loads(_get_http_cache().get(version_url, None))
+    return version_manifest
+
+
+def _get_java_path() -> str:
+    return os.path.join(os.environ["CACHE_DIR"], "resource_packs", "java")
+
+
+def get_asset_store() -> AssetStore:
+    """Get the content addressed store shared by all downloaded vanilla versions."""
+    return AssetStore(os.path.join(_get_java_path(), "store"))
+
+
+def get_version_path(version: str) -> str:
+    """Get the resource pack directory of a vanilla version."""
+    return os.path.join(_get_java_path(), "versions", version)
+
+
+def get_installed_versions() -> list[str]:
+    """Get the vanilla versions in the store that can be loaded without downloading."""
+    return get_asset_store().versions
+
+
+def get_version(
+    version: str,
+    progress_manager: AbstractProgressManager = VoidProgressManager(),
+) -> JavaResourcePack:
+    """Get the vanilla resource pack for a version, downloading it if it is not in the store.
+
+    Only files that are not already stored for another version are written.
+    The resource pack directory is made of hard links to the stored files.
+    It is recreated if any of the files are missing.
+
+    :param version: The version id from the launcher manifest.
+    :param progress_manager: The progress manager to notify of progress.
+    :return: The loaded Java resource pack.
+    """
+    store = get_asset_store()
+    path = get_version_path(version)
+    files = store.get_manifest(version)
+    if files is None:
+        # Stop a concurrent prune removing the objects before the manifest is stored.
+        with store.writing():
+            files = _download_resources(store, version, progress_manager)
+            store.set_manifest(version, files)
+        store.link(files, path)
+    elif not store.is_linked(files, path):
+        # The directory is missing or a file has been deleted from it.
+        store.link(files, path)
+    return JavaResourcePack(path)
+
+
+def remove_version(version: str) -> None:
+    """Remove a vanilla version and the stored files no other version uses."""
+    store = get_asset_store()
+    store.remove_manifest(version)
+    shutil.rmtree(get_version_path(version), ignore_errors=True)
+    store.prune()
+
+
+def _get_latest_version_path() -> str:
+    return os.path.join(_get_java_path(), "latest_version")
+
+
 def get_latest(
     progress_manager: AbstractProgressManager = VoidProgressManager(),
 ) -> JavaResourcePack:
     """Download the latest resource pack if required.
 
+    If the launcher manifest cannot be downloaded the last version loaded by this function is used.
+    If there is no such version the pack downloaded before versions were stored side by side is used.
+
     :return: The loaded Java resource pack.
     """
-    vanilla_rp_path = os.path.join(
-        os.environ["CACHE_DIR"], "resource_packs", "java", "vanilla"
-    )
     try:
         if INCLUDE_SNAPSHOT:
-            new_version = get_launcher_manifest()["latest"]["snapshot"]
+            version = get_launcher_manifest()["latest"]["snapshot"]
         else:
-            new_version = get_launcher_manifest()["latest"]["release"]
+            version = get_launcher_manifest()["latest"]["release"]
     except Exception as e:
-        if os.path.isdir(vanilla_rp_path):
+        try:
+            with open(_get_latest_version_path()) as f:
+                version = f.read()
+        except OSError:
+            pass
+        else:
+            if get_asset_store().get_manifest(version) is not None:
+                log.error(
+                    f"Could not download the launcher manifest. Version {version} is present so using that."
+                )
+                return get_version(version, progress_manager)
+        legacy_path = os.path.join(_get_java_path(), "vanilla")
+        if os.path.isdir(legacy_path):
             log.error(
                 "Could not download the launcher manifest. The resource pack seems to be present so using that."
             )
-        else:
-            raise e
-    else:
-        has_new_pack = False
-        if os.path.isfile(os.path.join(vanilla_rp_path, "version")):
-            with open(os.path.join(vanilla_rp_path, "version")) as f:
-                old_version = f.read()
-            has_new_pack = old_version == new_version
+            return JavaResourcePack(legacy_path)
+        raise e
 
-        if not has_new_pack:
-            _remove_and_download(vanilla_rp_path, new_version, progress_manager)
-    return JavaResourcePack(vanilla_rp_path)
+    resource_pack = get_version(version, progress_manager)
+    with open(_get_latest_version_path(), "w") as f:
+        f.write(version)
+    if not OFFLINE:
+        # The latest version is now stored and linked.
+        # Remove the directory used before versions were stored side by side.
+        shutil.rmtree(os.path.join(_get_java_path(), "vanilla"), ignore_errors=True)
+    return resource_pack
 
 
 _java_vanilla_fix: Optional[JavaResourcePack] = None
@@ -86,111 +191,229 @@ def get_java_vanilla_latest(
     return _java_vanilla_latest
 
 
-def _remove_and_download(
-    path: str,
-    version: str,
-    progress_manager: AbstractProgressManager = VoidProgressManager(),
-) -> None:
-    # try downloading the new resources to a temporary location
-    temp_path = os.path.join(os.path.dirname(path), "_temp_")
-    # clear the temporary location
-    if os.path.isfile(temp_path):
-        os.remove(temp_path)
-    elif os.path.isdir(temp_path):
-        shutil.rmtree(temp_path, ignore_errors=True)
+def _get_download_size(url: str) -> tuple[Optional[int], bool]:
+    """Get the size of a remote file and if the server supports ranged requests.
 
-    _download_resources(temp_path, version, progress_manager)
-    if os.path.isdir(path):
-        shutil.rmtree(path, ignore_errors=True)
+    :return: The size in bytes or None if it is not known and True if ranged requests are supported.
+    """
+    request = Request(url, headers={"Range": "bytes=0-0"})
+    with urlopen(request, timeout=HTTP_TIMEOUT) as response:
+        if response.status == 206:
+            # Content-Range: bytes 0-0/size
+            size = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if size.isdigit():
+                return int(size), True
+        content_length = response.headers.get("Content-Length")
+        if content_length is not None and content_length.strip().isdigit():
+            return int(content_length), False
+        return None, False
 
-    shutil.move(temp_path, path)
 
-    with open(os.path.join(path, "version"), "w") as f:
-        f.write(version)
+def _download_range(
+    url: str,
+    path: str,
+    start: int,
+    stop: int,
+    chunk_size: int,
+    attempts: int,
+    on_progress: Callable[[int], None],
+) -> None:
+    """Download a byte range of a remote file into the same range of a local file.
+    If the connection fails the download is resumed from the last byte received."""
+    offset = start
+    for _ in range(attempts):
+        try:
+            request = Request(url, headers={"Range": f"bytes={offset}-{stop - 1}"})
+            with (
+                urlopen(request, timeout=HTTP_TIMEOUT) as response,
+                open(path, "r+b") as f,
+            ):
+                if response.status != 206:
+                    raise RuntimeError(f"Server ignored the range request for {url}")
+                f.seek(offset)
+                while offset < stop:
+                    chunk = response.read(min(chunk_size, stop - offset))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    offset += len(chunk)
+                    on_progress(len(chunk))
+        except (OSError, HTTPException) as e:
+            log.warning(f"Download of {url} interrupted. Retrying. {e}")
+        if offset == stop:
+            return
+    raise RuntimeError(f"Failed to download {url}")
 
 
 def _download_with_retry(
     url: str,
-    chunk_size: int = 4096,
+    path: str,
+    chunk_size: int = 65536,
     attempts: int = 5,
     progress_manager: AbstractProgressManager = VoidProgressManager(),
-) -> bytes:
-    content_length_found = 0
-    content = []
+    max_workers: Optional[int] = 4,
+) -> None:
+    """Download a file to disk without holding it in memory.
+
+    If the server supports ranged requests the file is split into parts of DOWNLOAD_PART_SIZE
+    which are downloaded in parallel and resumed individually if they are interrupted.
+
+    :param url: The URL to download.
+    :param path: The file to write to.
+    :param chunk_size: The number of bytes to read at a time.
+    :param attempts: The number of times to try each part.
+    :param progress_manager: The progress manager to notify of progress.
+    :param max_workers: The maximum number of parts to download at once.
+    """
+    size, is_ranged = _get_download_size(url)
 
+    downloaded = 0
+    lock = threading.Lock()
+
+    def on_progress(length: int) -> None:
+        nonlocal downloaded
+        with lock:
+            downloaded += length
+            if size:
+                progress_manager.update_progress(min(1.0, downloaded / size))
+
+    if size is not None and is_ranged:
+        with open(path, "wb") as f:
+            f.truncate(size)
+        parts = [
+            (start, min(start + DOWNLOAD_PART_SIZE, size))
+            for start in range(0, size, DOWNLOAD_PART_SIZE)
+        ]
+
+        def download_part(part: tuple[int, int]) -> None:
+            _download_range(url, path, *part, chunk_size, attempts, on_progress)
+
+        if max_workers == 1 or len(parts) <= 1:
+            for part in parts:
+                download_part(part)
+        else:
+            with ThreadPoolExecutor(max_workers) as executor:
+                # Consume the results so that errors are raised.
+                list(executor.map(download_part, parts))
+        return
+
+    # The server does not support ranged requests so the download must restart if it fails.
     for _ in range(attempts):
-        request = Request(url, headers={"Range": f"bytes={content_length_found}-"})
-        with urlopen(request, timeout=20) as response:
-            content_length = int(response.headers["content-length"].strip())
-            while content_length_found < content_length:
-                chunk = response.read(chunk_size)
-                if not chunk:
-                    break
-                content.append(chunk)
-                content_length_found += len(chunk)
-                progress_manager.update_progress(
-                    min(1.0, content_length_found / content_length)
-                )
-        if content_length == content_length_found:
-            break
-    else:
-        raise RuntimeError(f"Failed to download")
-    return b"".join(content)
+        downloaded = 0
+        try:
+            with urlopen(url, timeout=HTTP_TIMEOUT) as response, open(path, "wb") as f:
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    on_progress(len(chunk))
+        except (OSError, HTTPException) as e:
+            log.warning(f"Download of {url} interrupted. Retrying. {e}")
+            continue
+        if size is None or downloaded == size:
+            return
+    raise RuntimeError(f"Failed to download {url}")
+
+
+def _store_assets(
+    jar_path: str,
+    store: AssetStore,
+    progress_manager: AbstractProgressManager = VoidProgressManager(),
+    max_workers: Optional[int] = None,
+) -> dict[str, FileHashT]:
+    """Add the resource pack files from a client jar to the store with a pool of workers.
+
+    Each file is hashed and only written if the store does not already contain it.
+
+    :return: The relative path to hash map of the resource pack files.
+    """
+    with zipfile.ZipFile(jar_path) as client:
+        members = [
+            info
+            for info in client.infolist()
+            if (
+                info.filename.startswith("assets/")
+                or info.filename in ("pack.mcmeta", "pack.png")
+            )
+            and not info.is_dir()
+            and ".." not in info.filename.split("/")
+        ]
+
+        def store_member(info: zipfile.ZipInfo) -> tuple[FileHashT, bool]:
+            with client.open(info) as src:
+                file_hash = hash_file(src)
+            if store.has_object(file_hash):
+                return file_hash, False
+            # Decompress again rather than holding the file in memory.
+            with client.open(info) as src:
+                store.add_object(file_hash, src)
+            return file_hash, True
+
+        files: dict[str, FileHashT] = {}
+        written = 0
+        member_count = len(members)
+        with ThreadPoolExecutor(max_workers) as executor:
+            for member_index, (info, (file_hash, is_new)) in enumerate(
+                zip(members, executor.map(store_member, members))
+            ):
+                files[info.filename] = file_hash
+                written += is_new
+                if not member_index % 30:
+                    progress_manager.update_progress(member_index / member_count)
+
+        if "pack.mcmeta" not in client.NameToInfo:
+            # TODO: work out proper version support for this
+            pack_mcmeta = io.BytesIO(
+                b'{"pack": {"description": "The default data for Minecraft","pack_format": 7}}'
+            )
+            file_hash = hash_file(pack_mcmeta)
+            if not store.has_object(file_hash):
+                pack_mcmeta.seek(0)
+                store.add_object(file_hash, pack_mcmeta)
+            files["pack.mcmeta"] = file_hash
+
+    log.info(f"Stored {written} new files of {len(files)}")
+    return files
 
 
 def _download_resources(
-    path: str,
+    store: AssetStore,
     version: str,
     progress_manager: AbstractProgressManager = VoidProgressManager(),
-    chunk_size: int = 4096,
-) -> None:
+    chunk_size: int = 65536,
+    max_workers: Optional[int] = None,
+) -> dict[str, FileHashT]:
+    """Download the client jar of a version and add its resource pack files to the store.
+
+    :return: The relative path to hash map of the resource pack files.
+    """
+    if OFFLINE:
+        raise ConnectionError(
+            f"Java resource pack for version {version} is not stored and offline mode is enabled."
+        )
     log.info(f"Downloading Java resource pack for version {version}")
-    version_url = next(
-        (v["url"] for v in get_launcher_manifest()["versions"] if v["id"] == version),
-        None,
+    # The client jar is spooled to a unique file next to the version directory.
+    versions_path = os.path.dirname(get_version_path(version))
+    os.makedirs(versions_path, exist_ok=True)
+    fd, jar_path = tempfile.mkstemp(
+        prefix=f"{version}.", suffix=".jar", dir=versions_path
     )
-    if version_url is None:
-        raise Exception(f"Could not find Java resource pack for version {version}.")
-
+    os.close(fd)
     try:
-        with urlopen(version_url, timeout=20) as vm:
-            version_manifest = json.load(vm)
-        version_client_url = version_manifest["downloads"]["client"]["url"]
-
-        progress_manager_child_1 = progress_manager.get_child(0.0, 0.5)
+        version_client_url = _get_version_manifest(version)["downloads"]["client"][
+            "url"
+        ]
 
-        data = _download_with_retry(
+        _download_with_retry(
             version_client_url,
+            jar_path,
             chunk_size=chunk_size,
-            progress_manager=progress_manager_child_1,
+            progress_manager=progress_manager.get_child(0.0, 0.5),
+        )
+        files = _store_assets(
+            jar_path, store, progress_manager.get_child(0.5, 1.0), max_workers
         )
-
-        client = zipfile.ZipFile(io.BytesIO(data))
-        paths: list[str] = [
-            fpath for fpath in client.namelist() if fpath.startswith("assets/")
-        ]
-        path_count = len(paths)
-        progress_manager_child_2 = progress_manager.get_child(0.5, 1.0)
-        for path_index, fpath in enumerate(paths):
-            if not path_index % 30:
-                progress_manager_child_2.update_progress(path_index / path_count)
-            if fpath.endswith("/"):
-                continue
-            os.makedirs(
-                os.path.dirname(os.path.abspath(os.path.join(path, fpath))),
-                exist_ok=True,
-            )
-            client.extract(fpath, path)
-        if "pack.mcmeta" in client.namelist():
-            client.extract("pack.mcmeta", path)
-        else:
-            # TODO: work out proper version support for this
-            with open(os.path.join(path, "pack.mcmeta"), "w") as f:
-                f.write(
-                    '{"pack": {"description": "The default data for Minecraft","pack_format": 7}}'
-                )
-        if "pack.png" in client.namelist():
-            client.extract("pack.png", path)
 
     except Exception as e:
         log.error(
@@ -198,4 +421,8 @@ def _download_resources(
             exc_info=True,
         )
         raise e
+    finally:
+        if os.path.isfile(jar_path):
+            os.remove(jar_path)
     log.info(f"Finished downloading Java resource pack for version {version}")
+    return files
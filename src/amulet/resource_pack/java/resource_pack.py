@@ -2,20 +2,23 @@ import os
 import json
 
 from amulet.resource_pack.abc import BaseResourcePack
+from amulet.resource_pack.resource_file import open_resource, is_resource_file
 
 
 class JavaResourcePack(BaseResourcePack):
     """A class to hold the bare bones information about the resource pack.
     Holds the pack format, description and if the pack is valid.
-    This information can be used in a viewer to display the packs to the user."""
+    This information can be used in a viewer to display the packs to the user.
+    The pack may be a directory or a zip file. Files in a zip pack are read with open_resource.
+    """
 
     def __init__(self, resource_pack_path: str):
         super().__init__(resource_pack_path)
         meta_path = os.path.join(resource_pack_path, "pack.mcmeta")
         self._pack_format = 0
-        if os.path.isfile(meta_path):
+        if is_resource_file(meta_path):
             try:
-                with open(meta_path) as f:
+                with open_resource(meta_path) as f:
                     pack_mcmeta = json.load(f)
             except json.JSONDecodeError:
                 pass
@@ -28,12 +31,12 @@ class JavaResourcePack(BaseResourcePack):
                         self._valid_pack = True
 
         pack_icon_path = os.path.join(resource_pack_path, "pack.png")
-        if os.path.isfile(pack_icon_path):
+        if is_resource_file(pack_icon_path):
             self._pack_icon = pack_icon_path
 
     @staticmethod
     def is_valid(pack_path: str) -> bool:
-        return os.path.isfile(os.path.join(pack_path, "pack.mcmeta"))
+        return is_resource_file(os.path.join(pack_path, "pack.mcmeta"))
 
     def __repr__(self) -> str:
         return f"JavaResourcePack({self._root_dir})"
@@ -1,52 +1,39 @@
-import os
-import json
-from typing import Union, Iterable, Iterator, Optional
-from PIL import Image
-import numpy
-import glob
-import itertools
+from __future__ import annotations
+
+from typing import Union, Iterable, Iterator, Optional, Literal, Any
 import logging
-import re
 
 from amulet.nbt import StringTag
 
-from amulet.utils.cast import dynamic_cast
-from amulet.utils.task_manager import AbstractProgressManager
-from amulet.core.block import Block
+from amulet.utils.task_manager import AbstractProgressManager, VoidProgressManager
+from amulet.core.block import Block, BlockStack
 from amulet.resource_pack import BaseResourcePackManager
+from amulet.resource_pack.abc.resource_pack_manager import ReloadStage
 from amulet.resource_pack.java import JavaResourcePack
+from amulet.resource_pack.java._pack_index import (
+    JavaPackIndex,
+    PackIndexLoader,
+    UselessImageGroups,
+)
+from amulet.resource_pack.java._lazy_pack import LazyPackFiles
+from amulet.resource_pack.java._blockstate import (
+    CompiledBlockstate,
+    VariantBlockstate,
+    MultipartBlockstate,
+    compile_blockstate,
+    get_py_data,
+)
 from amulet.resource_pack.mesh.block import (
     BlockMesh,
-    BlockMeshPart,
-    Triangle,
-    Vertex,
-    FloatVec3,
-    FloatVec2,
-    BlockMeshTransparency,
     BlockMeshCullDirection,
     merge_block_meshes,
-    FACE_KEYS,
-    CUBE_FACE_LUT,
-    UV_ROTATION_LUT,
-    TRI_FACE,
+    build_java_block_mesh,
 )
-from amulet.resource_pack.mesh.util import rotate_3d
 
 log = logging.getLogger(__name__)
 
+ResourceKeyT = tuple[str, str]  # namespace, relative path
 
-UselessImageGroups = {
-    "colormap",
-    "effect",
-    "environment",
-    "font",
-    "gui",
-    "map",
-    "mob_effect",
-    "particle",
-}
-
-_PropertiesPattern = re.compile(r"(?P<name>[a-zA-Z0-9_]+)=(?P<value>[a-zA-Z0-9_]+),?")
 
 CULL_DIRECTIONS = {
     None: BlockMeshCullDirection.CullNone,
@@ -59,11 +46,28 @@ CULL_DIRECTIONS = {
 }
 
 
-def get_py_data(obj: Block.PropertyValue) -> str | bytes | int:
-    if isinstance(obj, StringTag):
-        return obj.py_str_or_bytes
-    else:
-        return obj.py_int
+def _get_changed_keys(old: dict[Any, Any], new: dict[Any, Any]) -> set[Any]:
+    """Get the keys that were added, removed or have a different value."""
+    changed = set(old.keys() ^ new.keys())
+    for key, value in new.items():
+        old_value = old.get(key, value)
+        if old_value is not value and old_value != value:
+            changed.add(key)
+    return changed
+
+
+def _get_model_paths(
+    blockstate: Optional[CompiledBlockstate], block: Block
+) -> set[str]:
+    """Get every model path that a blockstate can use for a block."""
+    model_paths = set()
+    if blockstate is not None:
+        for blockstate_value in blockstate.match(block.properties):
+            if isinstance(blockstate_value, list):
+                blockstate_value = blockstate_value[0] if blockstate_value else {}
+            if isinstance(blockstate_value, dict) and "model" in blockstate_value:
+                model_paths.add(blockstate_value["model"])
+    return model_paths
 
 
 class JavaResourcePackManager(BaseResourcePackManager[JavaResourcePack]):
@@ -73,13 +77,39 @@ class JavaResourcePackManager(BaseResourcePackManager[JavaResourcePack]):
     def __init__(
         self,
         resource_packs: Union[JavaResourcePack, Iterable[JavaResourcePack]],
-        load: bool = True,
+        load: Union[bool, Literal["lazy"]] = True,
+        max_workers: Optional[int] = None,
     ) -> None:
+        """
+        :param resource_packs: The resource packs to load. Later packs overwrite earlier packs.
+        :param load: Should the resources be loaded now.
+            If "lazy" the packs are not scanned. Textures, blockstates and models are found when they are first used.
+        :param max_workers: The number of threads used to decode textures. If 1 textures are decoded on the calling thread.
+        """
         super().__init__()
+        self._max_workers = max_workers
+        self._lazy = load == "lazy"
+        # Resolves files on demand in lazy mode. None if the packs have been fully loaded.
+        self._lazy_files: Optional[LazyPackFiles] = None
+        # The index of each loaded pack in pack order.
+        self._pack_indexes: list[JavaPackIndex] = []
         self._blockstate_files: dict[tuple[str, str], dict] = {}
+        self._blockstates: dict[tuple[str, str], CompiledBlockstate] = {}
         self._textures: dict[tuple[str, str], str] = {}
-        self._texture_is_transparent: dict[str, tuple[float, bool]] = {}
+        self._texture_is_transparent: dict[str, tuple[int, bool]] = {}
         self._model_files: dict[tuple[str, str], dict] = {}
+        # The model files with the parent chain merged in.
+        self._resolved_models: dict[tuple[str, str], dict] = {}
+        # The model and its parent models for each resolved model.
+        self._model_chains: dict[ResourceKeyT, tuple[ResourceKeyT, ...]] = {}
+        # The unrotated mesh for each model path.
+        self._block_meshes: dict[str, BlockMesh] = {}
+        # The model files and textures each unrotated mesh was built from.
+        self._block_mesh_sources: dict[
+            str, tuple[frozenset[ResourceKeyT], frozenset[ResourceKeyT]]
+        ] = {}
+        # The mesh for each model path, x rotation, y rotation and uvlock.
+        self._rotated_block_meshes: dict[tuple[str, int, int, bool], BlockMesh] = {}
         if isinstance(resource_packs, Iterable):
             self._packs = list(resource_packs)
         elif isinstance(resource_packs, JavaResourcePack):
@@ -89,168 +119,347 @@ class JavaResourcePackManager(BaseResourcePackManager[JavaResourcePack]):
         if load:
             self.reload()
 
-    def _unload(self) -> None:
-        """Clear all loaded resources."""
-        super()._unload()
-        self._blockstate_files.clear()
-        self._textures.clear()
-        self._texture_is_transparent.clear()
-        self._model_files.clear()
+    def _new_unloaded(self) -> JavaResourcePackManager:
+        manager = JavaResourcePackManager(self._packs, False, self._max_workers)
+        manager._lazy = self._lazy
+        return manager
+
+    def _swap(self, manager: BaseResourcePackManager[JavaResourcePack]) -> None:
+        if not isinstance(manager, JavaResourcePackManager):
+            raise TypeError(f"Cannot swap in resources from {manager}")
+        # Assign the data before the caches built from it.
+        self._lazy_files = manager._lazy_files
+        self._pack_indexes = manager._pack_indexes
+        self._blockstate_files = manager._blockstate_files
+        self._blockstates = manager._blockstates
+        self._textures = manager._textures
+        self._texture_is_transparent = manager._texture_is_transparent
+        self._model_files = manager._model_files
+        self._resolved_models = manager._resolved_models
+        self._model_chains = manager._model_chains
+        self._block_meshes = manager._block_meshes
+        self._block_mesh_sources = manager._block_mesh_sources
+        self._rotated_block_meshes = manager._rotated_block_meshes
+        super()._swap(manager)
 
     def _load(self, progress_manager: AbstractProgressManager) -> None:
-        blockstate_file_paths: dict[tuple[str, str], str] = {}
-        model_file_paths: dict[tuple[str, str], str] = {}
-
-        transparency_cache_path = os.path.join(
-            os.environ["CACHE_DIR"], "resource_packs", "java", "transparency_cache.json"
-        )
-        self._load_transparency_cache(transparency_cache_path)
-
         self._textures[("minecraft", "missing_no")] = self.missing_no
+        if self._lazy:
+            self._lazy_files = LazyPackFiles(
+                [
+                    pack.root_dir
+                    for pack in self._packs
+                    if pack.valid_pack and pack.pack_format >= 2
+                ]
+            )
+        else:
+            self._load_packs(progress_manager)
+
+    def _load_packs(self, progress_manager: AbstractProgressManager) -> None:
+        """Scan all the packs and compile the blockstates.
+        Each stage is run for every pack before the next stage starts."""
+        # pack_format=2 textures/blocks, textures/items - case sensitive
+        # pack_format=3 textures/blocks, textures/items - lower case
+        # pack_format=4 textures/block, textures/item
+        # pack_format=5 model paths and texture paths are now optionally namespaced
+        pack_dirs = [
+            pack.root_dir
+            for pack in self._packs
+            if pack.valid_pack and pack.pack_format >= 2
+        ]
+        pack_count = max(1, len(pack_dirs))
+
+        def get_pack_progress_manager(
+            start: float, stop: float, pack_index: int
+        ) -> AbstractProgressManager:
+            step = (stop - start) / pack_count
+            return progress_manager.get_child(
+                start + step * pack_index, start + step * (pack_index + 1)
+            )
 
-        pack_count = len(self._packs)
-
-        for pack_index, pack in enumerate(self._packs):
-            # pack_format=2 textures/blocks, textures/items - case sensitive
-            # pack_format=3 textures/blocks, textures/items - lower case
-            # pack_format=4 textures/block, textures/item
-            # pack_format=5 model paths and texture paths are now optionally namespaced
+        loaders = []
+        for pack_index, pack_dir in enumerate(pack_dirs):
+            loader = PackIndexLoader(pack_dir, self._max_workers)
+            loader.index_paths(get_pack_progress_manager(0.0, 0.1, pack_index))
+            loaders.append(loader)
+            self._textures.update(loader.index.textures)
+        self._finish_reload_stage(ReloadStage.PathsIndexed)
+
+        for pack_index, loader in enumerate(loaders):
+            loader.classify_textures(get_pack_progress_manager(0.1, 0.7, pack_index))
+            self._texture_is_transparent.update(loader.index.texture_is_transparent)
+        self._finish_reload_stage(ReloadStage.TexturesClassified)
+
+        for pack_index, loader in enumerate(loaders):
+            loader.parse_json(get_pack_progress_manager(0.7, 1.0, pack_index))
+            self._blockstate_files.update(loader.index.blockstate_files)
+            self._model_files.update(loader.index.model_files)
+        self._pack_indexes = [loader.index for loader in loaders]
+
+        for key, blockstate in self._blockstate_files.items():
+            compiled_blockstate = self._compile_blockstate(key, blockstate)
+            if compiled_blockstate is not None:
+                self._blockstates[key] = compiled_blockstate
+        self._finish_reload_stage(ReloadStage.JsonParsed)
 
-            pack_progress_manager = progress_manager.get_child(
-                max(0.0, pack_index / pack_count),
-                min(1.0, (1 + pack_index) / pack_count),
-            )
-            pack_progress_manager.update_progress(0.0)
-
-            if pack.valid_pack and pack.pack_format >= 2:
-                image_progress_manager = pack_progress_manager.get_child(0.0, 1 / 3)
-                image_paths = glob.glob(
-                    os.path.join(
-                        glob.escape(pack.root_dir),
-                        "assets",
-                        "*",  # namespace
-                        "textures",
-                        "**",
-                        "*.png",
-                    ),
-                    recursive=True,
-                )
-                image_count = len(image_paths)
-                for image_index, texture_path in enumerate(image_paths):
-                    _, namespace, _, *rel_path_list = os.path.normpath(
-                        os.path.relpath(texture_path, pack.root_dir)
-                    ).split(os.sep)
-                    if rel_path_list[0] not in UselessImageGroups:
-                        rel_path = "/".join(rel_path_list)[:-4]
-                        self._textures[(namespace, rel_path)] = texture_path
-                        if (
-                            os.stat(texture_path).st_mtime
-                            != self._texture_is_transparent.get(texture_path, [0])[0]
-                        ):
-                            im: Image.Image = Image.open(texture_path)
-                            if im.mode == "RGBA":
-                                alpha = numpy.array(im.getchannel("A").getdata())
-                                texture_is_transparent = bool(numpy.any(alpha != 255))
-                            elif im.mode == "P":
-                                texture_is_transparent = (
-                                    im.info.get("transparency", 0) != 0
-                                )
-                            else:
-                                texture_is_transparent = False
-
-                            self._texture_is_transparent[texture_path] = (
-                                os.stat(texture_path).st_mtime,
-                                texture_is_transparent,
-                            )
-                    if not image_index % 100:
-                        image_progress_manager.update_progress(
-                            image_index / image_count
-                        )
-
-                blockstate_progress_manager = pack_progress_manager.get_child(
-                    1 / 3, 2 / 3
-                )
-                blockstate_paths = glob.glob(
-                    os.path.join(
-                        glob.escape(pack.root_dir),
-                        "assets",
-                        "*",  # namespace
-                        "blockstates",
-                        "*.json",
-                    )
-                )
-                blockstate_count = len(blockstate_paths)
-                for blockstate_index, blockstate_path in enumerate(blockstate_paths):
-                    _, namespace, _, blockstate_file = os.path.normpath(
-                        os.path.relpath(blockstate_path, pack.root_dir)
-                    ).split(os.sep)
-                    blockstate_file_paths[(namespace, blockstate_file[:-5])] = (
-                        blockstate_path
-                    )
-                    if not blockstate_index % 100:
-                        blockstate_progress_manager.update_progress(
-                            blockstate_index / blockstate_count
-                        )
-
-                model_progress_manager = pack_progress_manager.get_child(2 / 3, 1.0)
-                model_paths = glob.glob(
-                    os.path.join(
-                        glob.escape(pack.root_dir),
-                        "assets",
-                        "*",  # namespace
-                        "models",
-                        "**",
-                        "*.json",
-                    ),
-                    recursive=True,
+    @staticmethod
+    def _compile_blockstate(
+        key: ResourceKeyT, blockstate: dict
+    ) -> Optional[CompiledBlockstate]:
+        try:
+            return compile_blockstate(blockstate)
+        except Exception as e:
+            log.exception(f"Failed to compile blockstate {key}\n{e}")
+            return None
+
+    def incremental_reload(
+        self,
+        resource_packs: Optional[Iterable[JavaResourcePack]] = None,
+        progress_manager: AbstractProgressManager = VoidProgressManager(),
+    ) -> tuple[set[BlockStack], Optional[set[str]]]:
+        """Reload only the resources that have changed since they were loaded.
+
+        Packs whose files have not changed are not read.
+        In changed packs only the new or modified json files are parsed and textures classified.
+        Cached meshes are only removed if their blockstate, models, parent models or textures changed.
+        In lazy mode everything is reloaded.
+
+        :param resource_packs: The new resource packs. If None the current packs are checked for changes.
+        :param progress_manager: The progress manager to notify of progress.
+        :return: The block stacks whose cached meshes were removed and should be re-meshed
+            and the paths of the textures that were added, removed or modified.
+            The texture paths are None if every texture may have changed, which is the case in lazy mode.
+        """
+        if self._lazy or not self._loaded:
+            return super().incremental_reload(resource_packs, progress_manager)
+        packs = self._packs if resource_packs is None else list(resource_packs)
+
+        # Get the index for each pack. Indexes that are still current are reused.
+        previous_indexes = {index.root_dir: index for index in self._pack_indexes}
+        pack_dirs = [
+            pack.root_dir for pack in packs if pack.valid_pack and pack.pack_format >= 2
+        ]
+        pack_count = max(1, len(pack_dirs))
+        indexes = []
+        for pack_index, pack_dir in enumerate(pack_dirs):
+            index = previous_indexes.get(pack_dir)
+            if index is None or not index.is_current():
+                pack_progress_manager = progress_manager.get_child(
+                    pack_index / pack_count, (pack_index + 1) / pack_count
                 )
-                model_count = len(model_paths)
-                for model_index, model_path in enumerate(model_paths):
-                    _, namespace, _, *rel_path_list = os.path.normpath(
-                        os.path.relpath(model_path, pack.root_dir)
-                    ).split(os.sep)
-                    rel_path = "/".join(rel_path_list)[:-5]
-                    model_file_paths[(namespace, rel_path.replace(os.sep, "/"))] = (
-                        model_path
-                    )
-                    if not model_index % 100:
-                        model_progress_manager.update_progress(
-                            model_index / model_count
-                        )
-
-        os.makedirs(os.path.dirname(transparency_cache_path), exist_ok=True)
-        with open(transparency_cache_path, "w") as f:
-            json.dump(self._texture_is_transparent, f)
-
-        for key, path in blockstate_file_paths.items():
-            with open(path) as fi:
-                try:
-                    self._blockstate_files[key] = json.load(fi)
-                except json.JSONDecodeError:
-                    log.error(f"Failed to parse blockstate file {path}")
-
-        for key, path in model_file_paths.items():
-            with open(path) as fi:
-                try:
-                    self._model_files[key] = json.load(fi)
-                except json.JSONDecodeError:
-                    log.error(f"Failed to parse model file file {path}")
+                loader = PackIndexLoader(pack_dir, self._max_workers, index)
+                loader.index_paths(pack_progress_manager.get_child(0.0, 0.1))
+                loader.classify_textures(pack_progress_manager.get_child(0.1, 0.7))
+                loader.parse_json(pack_progress_manager.get_child(0.7, 1.0))
+                index = loader.index
+            indexes.append(index)
+
+        textures = {("minecraft", "missing_no"): self.missing_no}
+        texture_is_transparent: dict[str, tuple[int, bool]] = {}
+        blockstate_files: dict[ResourceKeyT, dict] = {}
+        model_files: dict[ResourceKeyT, dict] = {}
+        for index in indexes:
+            textures.update(index.textures)
+            texture_is_transparent.update(index.texture_is_transparent)
+            blockstate_files.update(index.blockstate_files)
+            model_files.update(index.model_files)
+
+        # Find what changed.
+        changed_blockstates = _get_changed_keys(
+            self._blockstate_files, blockstate_files
+        )
+        changed_models = _get_changed_keys(self._model_files, model_files)
+        changed_textures = _get_changed_keys(self._textures, textures)
+        for key, texture_path in textures.items():
+            if self._texture_is_transparent.get(
+                texture_path
+            ) != texture_is_transparent.get(texture_path):
+                changed_textures.add(key)
+        # Editing a texture changes the modification time stored with its transparency.
+        changed_texture_paths = set()
+        for key in changed_textures:
+            for texture_map in (self._textures, textures):
+                if key in texture_map:
+                    changed_texture_paths.add(texture_map[key])
+
+        blockstates = {
+            key: blockstate
+            for key, blockstate in self._blockstates.items()
+            if key not in changed_blockstates
+        }
+        for key in changed_blockstates:
+            blockstate_file = blockstate_files.get(key)
+            if blockstate_file is not None:
+                compiled_blockstate = self._compile_blockstate(key, blockstate_file)
+                if compiled_blockstate is not None:
+                    blockstates[key] = compiled_blockstate
+
+        # Build the new state without modifying the old state so lookups can continue while this runs.
+        with self._state_lock:
+            # Lookups add to the caches without the lock and record the sources of an entry before the entry.
+            # The caches are copied in the opposite order so every copied mesh has its sources
+            # and every copied resolved model has its chain. Later additions to the old caches are dropped.
+            rotated_block_meshes = self._rotated_block_meshes.copy()
+            block_meshes = self._block_meshes.copy()
+            block_mesh_sources = self._block_mesh_sources.copy()
+            resolved_models = self._resolved_models.copy()
+            model_chains = self._model_chains.copy()
+
+            # Find the derived data that depends on the changes.
+            stale_models = {
+                key
+                for key, chain in model_chains.items()
+                if not changed_models.isdisjoint(chain)
+            }
+            stale_meshes = {
+                model_path
+                for model_path, (
+                    mesh_models,
+                    mesh_textures,
+                ) in block_mesh_sources.items()
+                if not changed_models.isdisjoint(mesh_models)
+                or not changed_textures.isdisjoint(mesh_textures)
+            }
+
+            old_blockstates = self._blockstates
+            affected = set()
+            for block_stack in self._cached_models.keys():
+                for block in (block_stack.base_block, *block_stack.extra_blocks):
+                    key = (block.namespace, block.base_name)
+                    if key in changed_blockstates or not stale_meshes.isdisjoint(
+                        _get_model_paths(old_blockstates.get(key), block)
+                    ):
+                        affected.add(block_stack)
+                        break
+
+            # Assign the data before the caches built from it.
+            self._packs = packs
+            self._pack_indexes = indexes
+            self._blockstate_files = blockstate_files
+            self._blockstates = blockstates
+            self._textures = textures
+            self._texture_is_transparent = texture_is_transparent
+            self._model_files = model_files
+            self._resolved_models = {
+                key: model
+                for key, model in resolved_models.items()
+                if key not in stale_models
+            }
+            self._model_chains = {
+                key: chain
+                for key, chain in model_chains.items()
+                if key not in stale_models
+            }
+            self._block_meshes = {
+                model_path: mesh
+                for model_path, mesh in block_meshes.items()
+                if model_path not in stale_meshes
+            }
+            self._block_mesh_sources = {
+                model_path: sources
+                for model_path, sources in block_mesh_sources.items()
+                if model_path not in stale_meshes
+            }
+            self._rotated_block_meshes = {
+                rotated_key: mesh
+                for rotated_key, mesh in rotated_block_meshes.items()
+                if rotated_key[0] not in stale_meshes
+            }
+            self._generation += 1
+            for block_stack in affected:
+                self._cached_models.discard(block_stack)
+        return affected, changed_texture_paths
+
+    def load_all(
+        self, progress_manager: AbstractProgressManager = VoidProgressManager()
+    ) -> None:
+        """Scan all the packs now rather than finding each resource when it is first used.
+
+        This does nothing unless the manager is in lazy mode and the packs have not been scanned.
+        Every texture is decoded to find its transparency and every json file is parsed,
+        which can take several seconds for large packs that are not in the on-disk index cache.
+        The resources are loaded separately and swapped in under the state lock. The block mesh cache is cleared.
+        The next reload is lazy again.
+
+        :param progress_manager: The progress manager to notify of progress.
+        """
+        target = self._get_reload_target(ReloadStage.JsonParsed)
+        if isinstance(target, JavaResourcePackManager):
+            target.load_all(progress_manager)
+            return
+        lazy_files = self._lazy_files
+        if lazy_files is None:
+            return
+        manager = JavaResourcePackManager(self._packs, False, self._max_workers)
+        manager._load(progress_manager)
+        with self._state_lock:
+            # Do nothing if the resources were reloaded in the meantime.
+            if self._lazy_files is lazy_files:
+                self._swap(manager)
 
     @property
     def textures(self) -> tuple[str, ...]:
-        """Returns a tuple of all the texture paths in the resource pack."""
+        """Returns a tuple of all the texture paths in the resource pack.
+        In lazy mode the first call runs :meth:`load_all`, which scans all the packs."""
+        target = self._get_reload_target(ReloadStage.PathsIndexed)
+        if target is not None:
+            return target.textures
+        if self._lazy_files is not None:
+            self.load_all()
         return tuple(self._textures.values())
 
     def get_texture_path(self, namespace: Optional[str], relative_path: str) -> str:
-        """Get the absolute texture path from the namespace and relative path pair"""
+        """Get the absolute texture path from the namespace and relative path pair.
+        Textures in zip packs have a path through the zip file that can be read with open_resource.
+        """
         if namespace is None:
             return self.missing_no
+        target = self._get_reload_target(ReloadStage.PathsIndexed)
+        if target is not None:
+            return target.get_texture_path(namespace, relative_path)
         key = (namespace, relative_path)
         if key in self._textures:
             return self._textures[key]
+        elif self._lazy_files is not None:
+            return (
+                self._lazy_files.get_texture(namespace, relative_path)
+                or self.missing_no
+            )
         else:
             return self.missing_no
 
+    def _is_texture_transparent(self, texture_path: str) -> Optional[bool]:
+        """Check if a texture is transparent. None if it is not known."""
+        texture_is_transparent = self._texture_is_transparent.get(texture_path)
+        if texture_is_transparent is not None:
+            return texture_is_transparent[1]
+        elif self._lazy_files is not None and texture_path != self.missing_no:
+            return self._lazy_files.is_texture_transparent(texture_path)
+        return None
+
+    def _get_blockstate(
+        self, namespace: str, base_name: str
+    ) -> Optional[CompiledBlockstate]:
+        """Get the compiled blockstate for a block. None if it does not exist."""
+        key = (namespace, base_name)
+        blockstates = self._blockstates
+        blockstate = blockstates.get(key)
+        lazy_files = self._lazy_files
+        if blockstate is None and lazy_files is not None:
+            blockstate_file = lazy_files.get_blockstate_file(namespace, base_name)
+            if blockstate_file is not None:
+                blockstate = self._compile_blockstate(key, blockstate_file)
+                if blockstate is not None:
+                    blockstates[key] = blockstate
+        return blockstate
+
+    def _get_model_file(self, namespace: str, model_path: str) -> Optional[dict]:
+        """Get the data from a model file. None if it does not exist."""
+        model = self._model_files.get((namespace, model_path))
+        if model is None and self._lazy_files is not None:
+            model = self._lazy_files.get_model_file(namespace, model_path)
+        return model
+
     @staticmethod
     def parse_state_val(val: Union[str, bool]) -> list:
         """Convert the json block state format into a consistent format."""
@@ -263,89 +472,23 @@ class JavaResourcePackManager(BaseResourcePackManager[JavaResourcePack]):
 
     def _get_model(self, block: Block) -> BlockMesh:
         """Find the model paths for a given block state and load them."""
-        if (block.namespace, block.base_name) in self._blockstate_files:
-            blockstate: dict = self._blockstate_files[
-                (block.namespace, block.base_name)
-            ]
-            if "variants" in blockstate:
-                for variant in blockstate["variants"]:
-                    if variant == "":
-                        try:
-                            return self._load_blockstate_model(
-                                blockstate["variants"][variant]
-                            )
-                        except Exception as e:
-                            log.exception(
-                                f"Failed to load block model {blockstate['variants'][variant]}\n{e}"
-                            )
-                    else:
-                        properties_match = _PropertiesPattern.finditer(f",{variant}")
-                        if all(
-                            get_py_data(
-                                block.properties.get(
-                                    match.group("name"),
-                                    StringTag(match.group("value")),
-                                )
-                            )
-                            == match.group("value")
-                            for match in properties_match
-                        ):
-                            try:
-                                return self._load_blockstate_model(
-                                    blockstate["variants"][variant]
-                                )
-                            except Exception as e:
-                                log.exception(
-                                    f"Failed to load block model {blockstate['variants'][variant]}\n{e}"
-                                )
-
-            elif "multipart" in blockstate:
-                models = []
-
-                for case in blockstate["multipart"]:
-                    try:
-                        if "when" in case:
-                            if "OR" in case["when"]:
-                                if not any(
-                                    all(
-                                        block.properties.get(prop, None)
-                                        in self.parse_state_val(val)
-                                        for prop, val in prop_match.items()
-                                    )
-                                    for prop_match in case["when"]["OR"]
-                                ):
-                                    continue
-                            elif "AND" in case["when"]:
-                                if not all(
-                                    all(
-                                        block.properties.get(prop, None)
-                                        in self.parse_state_val(val)
-                                        for prop, val in prop_match.items()
-                                    )
-                                    for prop_match in case["when"]["AND"]
-                                ):
-                                    continue
-                            elif not all(
-                                block.properties.get(prop, None)
-                                in self.parse_state_val(val)
-                                for prop, val in case["when"].items()
-                            ):
-                                continue
-
-                        if "apply" in case:
-                            try:
-                                models.append(
-                                    self._load_blockstate_model(case["apply"])
-                                )
-
-                            except Exception as e:
-                                log.exception(
-                                    f"Failed to load block model {case['apply']}\n{e}"
-                                )
-                    except Exception as e:
-                        log.exception(f"Failed to parse block state for {block}\n{e}")
-
-                return merge_block_meshes(models)
+        blockstate = self._get_blockstate(block.namespace, block.base_name)
+        if isinstance(blockstate, VariantBlockstate):
+            for variant in blockstate.match(block.properties):
+                try:
+                    return self._load_blockstate_model(variant)
+                except Exception as e:
+                    log.exception(f"Failed to load block model {variant}\n{e}")
+
+        elif isinstance(blockstate, MultipartBlockstate):
+            models = []
+            for apply in blockstate.match(block.properties):
+                try:
+                    models.append(self._load_blockstate_model(apply))
+                except Exception as e:
+                    log.exception(f"Failed to load block model {apply}\n{e}")
+
+            return merge_block_meshes(models)
 
         return self.missing_block
 
@@ -360,222 +503,115 @@ class JavaResourcePackManager(BaseResourcePackManager[JavaResourcePack]):
         model_path = blockstate_value["model"]
         rotx = int(blockstate_value.get("x", 0) // 90)
         roty = int(blockstate_value.get("y", 0) // 90)
-        uvlock = blockstate_value.get("uvlock", False)
-
-        model = self._load_block_model(model_path)
-
-        # TODO: rotate model based on uv_lock
-        return model.rotate(rotx, roty)
+        uvlock = bool(blockstate_value.get("uvlock", False))
+
+        # Get the caches before the data they are built from is read.
+        # If the resources are swapped mid-lookup the result is stored in the old caches.
+        rotated_block_meshes = self._rotated_block_meshes
+        block_meshes = self._block_meshes
+        rotated_key = (model_path, rotx, roty, uvlock)
+        rotated_model = rotated_block_meshes.get(rotated_key)
+        if rotated_model is None:
+            model = block_meshes.get(model_path)
+            if model is None:
+                model = block_meshes[model_path] = self._load_block_model(model_path)
+            # TODO: rotate model based on uv_lock
+            if rotx or roty:
+                rotated_model = model.rotate(rotx, roty)
+            else:
+                # Share the unrotated mesh rather than storing a copy.
+                rotated_model = model
+            rotated_block_meshes[rotated_key] = rotated_model
+        return rotated_model
 
     def _load_block_model(self, model_path: str) -> BlockMesh:
-        """Load the model file associated with the Block and convert to a BlockMesh."""
+        """Load the model file associated with the Block and convert to a BlockMesh.
+        The model files and textures it is built from are recorded."""
+        block_mesh_sources = self._block_mesh_sources
+        key = self._get_model_key(model_path)
         # recursively load model files into one dictionary
         java_model = self._recursive_load_block_model(model_path)
+        model_keys = frozenset(self._model_chains.get(key, (key,)))
 
         if set(java_model.get("textures", {})).difference(
             {"particle"}
         ) and not java_model.get("elements"):
+            block_mesh_sources[model_path] = (model_keys, frozenset())
             return self.missing_block
 
-        # set up some variables
-        texture_paths: dict[str, int] = {}
-        mesh_parts: list[tuple[list[Vertex], list[Triangle]] | None] = [
-            None,
-            None,
-            None,
-            None,
-            None,
-            None,
-            None,
-        ]
-        transparency = BlockMeshTransparency.Partial
-
-        for element in dynamic_cast(java_model.get("elements", []), list):
-            # iterate through elements (one cube per element)
-            element_faces = dynamic_cast(element.get("faces", {}), dict)
-
-            opaque_face_count = 0
-            if (
-                transparency
-                and "rotation" not in element
-                and element.get("to", [16, 16, 16]) == [16, 16, 16]
-                and element.get("from", [0, 0, 0]) == [0, 0, 0]
-                and len(element_faces) >= 6
-            ):
-                # if the block is not yet defined as a solid block
-                # and this element is a full size element
-                # check if the texture is opaque
-                transparency = BlockMeshTransparency.FullTranslucent
-                check_faces = True
-            else:
-                check_faces = False
-
-            # lower and upper box coordinates
-            x1, y1, z1 = [v / 16.0 for v in element.get("from", [0, 0, 0])]
-            x2, y2, z2 = [v / 16.0 for v in element.get("to", [16, 16, 16])]
-
-            # vertex coordinates of the box
-            box_coordinates = numpy.array(
-                list(
-                    itertools.product(
-                        (min(x1, x2), max(x1, x2)),
-                        (min(y1, y2), max(y1, y2)),
-                        (min(z1, z2), max(z1, x2)),
-                    )
-                )
-            )
+        texture_keys: set[ResourceKeyT] = set()
 
-            for face_dir, face_data in element_faces.items():
-                if face_dir not in CUBE_FACE_LUT:
-                    continue
-
-                # get the cull direction. If there is an opaque block in this direction then cull this face
-                cull_dir = face_data.get("cullface", None)
-                if cull_dir not in FACE_KEYS:
-                    cull_dir = None
-
-                # get the relative texture path for the texture used
-                texture_relative_path = face_data.get("texture", None)
-                while isinstance(
-                    texture_relative_path, str
-                ) and texture_relative_path.startswith("#"):
-                    texture_relative_path = java_model["textures"].get(
-                        texture_relative_path[1:], None
-                    )
-                texture_path_list = texture_relative_path.split(":", 1)
-                if len(texture_path_list) == 2:
-                    namespace, texture_relative_path = texture_path_list
-                else:
-                    namespace = "minecraft"
-
-                texture_path = self.get_texture_path(namespace, texture_relative_path)
-
-                if check_faces:
-                    if self._texture_is_transparent[texture_path][1]:
-                        check_faces = False
-                    else:
-                        opaque_face_count += 1
-
-                # texture index for the face
-                texture_index = texture_paths.setdefault(
-                    texture_path, len(texture_paths)
-                )
+        def resolve_texture(namespace: str, relative_path: str) -> tuple[str, bool]:
+            texture_keys.add((namespace, relative_path))
+            return self._resolve_texture(namespace, relative_path)
 
-                # get the uv values for each vertex
-                texture_uv: tuple[float, float, float, float]
-                if "uv" in face_data:
-                    uv = face_data["uv"]
-                    texture_uv = (
-                        uv[0] / 16.0,
-                        uv[1] / 16.0,
-                        uv[2] / 16.0,
-                        uv[3] / 16.0,
-                    )
-                else:
-                    # TODO: get the uv based on box location if not defined
-                    texture_uv = (0.0, 0.0, 1.0, 1.0)
-
-                texture_rotation = face_data.get("rotation", 0)
-                uv_slice = (
-                    UV_ROTATION_LUT[2 * int(texture_rotation / 90) :]
-                    + UV_ROTATION_LUT[: 2 * int(texture_rotation / 90)]
-                )
+        block_mesh = build_java_block_mesh(java_model, resolve_texture)
+        block_mesh_sources[model_path] = (model_keys, frozenset(texture_keys))
+        return block_mesh
 
-                # merge the vertex coordinates and texture coordinates
-                face_verts = box_coordinates[CUBE_FACE_LUT[face_dir]]
-                if "rotation" in element:
-                    rotation = element["rotation"]
-                    origin = [r / 16 for r in rotation.get("origin", [8, 8, 8])]
-                    angle = rotation.get("angle", 0)
-                    axis = rotation.get("axis", "x")
-                    angles = [0, 0, 0]
-                    if axis == "x":
-                        angles[0] = -angle
-                    elif axis == "y":
-                        angles[1] = -angle
-                    elif axis == "z":
-                        angles[2] = -angle
-                    face_verts = rotate_3d(face_verts, *angles, *origin)
-
-                cull_direction = CULL_DIRECTIONS[cull_dir]
-                part = mesh_parts[cull_direction]
-                if part is None:
-                    mesh_parts[cull_direction] = part = ([], [])
-                verts, tris = part
-                vert_count = len(verts)
-
-                if "tintindex" in face_data:
-                    # TODO: set this up for each supported block
-                    tint_vec = FloatVec3(0, 1, 0)
-                else:
-                    tint_vec = FloatVec3(1, 1, 1)
-
-                for i in range(4):
-                    x, y, z = face_verts[i]
-                    uvx = texture_uv[uv_slice[i * 2]]
-                    uvy = texture_uv[uv_slice[i * 2 + 1]]
-                    verts.append(
-                        Vertex(
-                            FloatVec3(x, y, z),
-                            FloatVec2(uvx, uvy),
-                            tint_vec,
-                        )
-                    )
-
-                for a, b, c in TRI_FACE.reshape((2, 3)):
-                    tris.append(
-                        Triangle(
-                            a + vert_count,
-                            b + vert_count,
-                            c + vert_count,
-                            texture_index,
-                        )
-                    )
-
-            if opaque_face_count == 6:
-                transparency = BlockMeshTransparency.FullOpaque
-
-        def create_part(
-            part: tuple[list[Vertex], list[Triangle]] | None,
-        ) -> BlockMeshPart | None:
-            return None if part is None else BlockMeshPart(*part)
-
-        return BlockMesh(
-            transparency,
-            list(texture_paths),
-            (
-                create_part(mesh_parts[0]),
-                create_part(mesh_parts[1]),
-                create_part(mesh_parts[2]),
-                create_part(mesh_parts[3]),
-                create_part(mesh_parts[4]),
-                create_part(mesh_parts[5]),
-                create_part(mesh_parts[6]),
-            ),
-        )
+    def _resolve_texture(self, namespace: str, relative_path: str) -> tuple[str, bool]:
+        """Get the absolute texture path and if the texture is transparent.
+        Textures with unknown transparency, such as missing_no, are treated as transparent.
+        """
+        texture_path = self.get_texture_path(namespace, relative_path)
+        is_transparent = self._is_texture_transparent(texture_path)
+        return texture_path, True if is_transparent is None else is_transparent
 
     def _recursive_load_block_model(self, model_path: str) -> dict:
-        """Load a model json file and recursively load and merge the parent entries into one json file."""
+        """Load a model json file and recursively load and merge the parent entries into one json file.
+        The result is cached and shared so it must not be modified."""
+        return self._resolve_block_model(model_path, set())
+
+    @staticmethod
+    def _get_model_key(model_path: str) -> ResourceKeyT:
+        """Split a model path into the namespace and relative path."""
         model_path_list = model_path.split(":", 1)
         if len(model_path_list) == 2:
-            namespace, model_path = model_path_list
-        else:
-            namespace = "minecraft"
-        if (namespace, model_path) in self._model_files:
-            model = self._model_files[(namespace, model_path)]
+            return model_path_list[0], model_path_list[1]
+        return "minecraft", model_path
+
+    def _resolve_block_model(
+        self, model_path: str, resolving: set[tuple[str, str]]
+    ) -> dict:
+        key = self._get_model_key(model_path)
+        namespace, model_path = key
+
+        resolved_models = self._resolved_models
+        model_chains = self._model_chains
+        resolved_model = resolved_models.get(key)
+        if resolved_model is not None:
+            return resolved_model
+
+        model = self._get_model_file(namespace, model_path)
+        if model is not None:
+            if key in resolving:
+                log.error(f"Model {namespace}:{model_path} has a circular parent chain")
+                return {}
+            resolving.add(key)
 
             if "parent" in model:
-                parent_model = self._recursive_load_block_model(model["parent"])
+                parent_key = self._get_model_key(model["parent"])
+                parent_model = self._resolve_block_model(model["parent"], resolving)
+                chain = (key,) + model_chains.get(parent_key, (parent_key,))
             else:
                 parent_model = {}
+                chain = (key,)
+
+            resolved_model = {}
             if "textures" in model:
-                if "textures" not in parent_model:
-                    parent_model["textures"] = {}
-                for key, val in model["textures"].items():
-                    parent_model["textures"][key] = val
+                resolved_model["textures"] = {
+                    **parent_model.get("textures", {}),
+                    **model["textures"],
+                }
+            elif "textures" in parent_model:
+                resolved_model["textures"] = parent_model["textures"]
             if "elements" in model:
-                parent_model["elements"] = model["elements"]
+                resolved_model["elements"] = model["elements"]
+            elif "elements" in parent_model:
+                resolved_model["elements"] = parent_model["elements"]
 
-            return parent_model
+            model_chains[key] = chain
+            resolved_models[key] = resolved_model
+            return resolved_model
 
         return {}
@@ -4,7 +4,12 @@ import collections.abc
 import typing
 
 import numpy
-from amulet.resource_pack.mesh.block._cube import get_cube, get_unit_cube
+import numpy.typing
+from amulet.resource_pack.mesh.block._cube import (
+    create_quad_part,
+    get_cube,
+    get_unit_cube,
+)
 
 from . import _cube
 
@@ -21,6 +26,8 @@ __all__ = [
     "Triangle",
     "UV_ROTATION_LUT",
     "Vertex",
+    "build_java_block_mesh",
+    "create_quad_part",
     "get_cube",
     "get_unit_cube",
     "merge_block_meshes",
@@ -45,6 +52,17 @@ class BlockMesh:
             amulet.resource_pack.mesh.block.BlockMeshPart | None,
         ],
     ) -> None: ...
+    def deduplicate(self) -> BlockMesh:
+        """
+        Get a copy of this mesh with identical vertices in each part welded together.
+        Unused vertices, triangles with no area, empty parts and unused or duplicate textures are removed.
+        """
+
+    def memory_usage(self) -> int:
+        """
+        The number of bytes used by the C++ object and the parts and textures it owns.
+        """
+
     def rotate(self, rotx: typing.SupportsInt, roty: typing.SupportsInt) -> BlockMesh:
         """
         Rotate the mesh in the x and y axis. Accepted values are -3 to 3 which correspond to 90 degree rotations.
@@ -152,17 +170,67 @@ class BlockMeshPart:
     A part of a block mesh for one of the culling directions.
     """
 
+    @typing.overload
     def __init__(
         self,
         verts: collections.abc.Sequence[Vertex],
         triangles: collections.abc.Sequence[Triangle],
     ) -> None: ...
+    @typing.overload
+    def __init__(
+        self,
+        vertex_array: numpy.typing.ArrayLike,
+        triangle_array: numpy.typing.ArrayLike,
+    ) -> None:
+        """
+        Construct from numpy arrays.
+
+        :param vertex_array: A (N, 8) float32 array. Each row is the x, y, z coordinate, the u, v texture coordinate and the r, g, b tint.
+        :param triangle_array: A (M, 4) uint32 array. Each row is the three vertex indexes and the texture index.
+        """
+
+    def deduplicate(self) -> BlockMeshPart:
+        """
+        Get a copy of this mesh part with identical vertices welded together.
+        Vertices that are not used and triangles with no area are removed.
+        """
+
+    def get_index_array(
+        self,
+    ) -> numpy.typing.NDArray[numpy.uint16] | numpy.typing.NDArray[numpy.uint32]:
+        """
+        Get a new (M, 3) array of the vertex indexes of each triangle.
+        The dtype is uint16 if there are at most 65536 vertices, otherwise uint32.
+        This can be used directly as an index buffer.
+        """
+
+    def memory_usage(self) -> int:
+        """
+        The number of bytes used by the C++ object and the vertex and triangle memory it owns.
+        """
+
+    @property
+    def triangle_array(self) -> numpy.typing.NDArray[numpy.uint32]:
+        """
+        A read-only (M, 4) uint32 view of the triangles without copying.
+        Each row is the three vertex indexes and the texture index.
+        The array shares memory with this object.
+        """
+
     @property
     def triangles(self) -> list[Triangle]:
         """
         The triangles in this block mesh part.
         """
 
+    @property
+    def vertex_array(self) -> numpy.typing.NDArray[numpy.float32]:
+        """
+        A read-only (N, 8) float32 view of the vertices without copying.
+        Each row is the x, y, z coordinate, the u, v texture coordinate and the r, g, b tint.
+        The array shares memory with this object.
+        """
+
     @property
     def verts(self) -> list[Vertex]:
         """
@@ -284,6 +352,18 @@ class Vertex:
         The tint colour for the vertex.
         """
 
+def build_java_block_mesh(
+    model: dict,
+    resolve_texture: collections.abc.Callable[[str, str], tuple[str, bool]],
+) -> BlockMesh:
+    """
+    Convert a Java block model into a block mesh.
+
+    :param model: The model json data with the parent models merged in.
+    :param resolve_texture: A function taking the texture namespace and relative path and returning the texture path and if it is transparent.
+    :return: The block mesh.
+    """
+
 def merge_block_meshes(meshes: collections.abc.Sequence[BlockMesh]) -> BlockMesh:
     """
     Merge multiple block mesh objects into one block mesh.
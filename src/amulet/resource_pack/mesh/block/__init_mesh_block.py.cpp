@@ -5,9 +5,11 @@
 namespace py = pybind11;
 
 void init_block_mesh(py::module m_parent);
+void init_java_block_mesh(py::module m_parent);
 
 void init_mesh_block(py::module m_parent)
 {
     auto m = Amulet::pybind11_extensions::def_subpackage(m_parent, "block");
     init_block_mesh(m);
+    init_java_block_mesh(m);
 }
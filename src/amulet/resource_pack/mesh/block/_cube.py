@@ -1,14 +1,11 @@
 from typing import TypeAlias
 import numpy
+import numpy.typing
 import itertools
 
 from amulet.resource_pack.mesh.block import (
     BlockMesh,
     BlockMeshPart,
-    Triangle,
-    Vertex,
-    FloatVec3,
-    FloatVec2,
     BlockMeshTransparency,
     BlockMeshCullDirection,
 )
@@ -75,6 +72,21 @@ TRI_FACE = numpy.array([0, 1, 2, 0, 2, 3], numpy.uint32)
 
 UV_ROTATION_LUT = [0, 3, 2, 3, 2, 1, 0, 1]  # remap
 
+# The vertex indexes of each face in an array of shape (6, 4)
+_VertexIndexArray = numpy.array(VERTEX_INDEXES)
+
+# The cull direction of each face in the order down, up, north, east, south, west
+_FaceCullDirections = numpy.array(
+    [
+        BlockMeshCullDirection.CullDown.value,
+        BlockMeshCullDirection.CullUp.value,
+        BlockMeshCullDirection.CullNorth.value,
+        BlockMeshCullDirection.CullEast.value,
+        BlockMeshCullDirection.CullSouth.value,
+        BlockMeshCullDirection.CullWest.value,
+    ]
+)
+
 
 # tvert_lut = {  # TODO: implement this for the cases where the UV is not defined
 # 	'down': [],
@@ -86,6 +98,28 @@ UV_ROTATION_LUT = [0, 3, 2, 3, 2, 1, 0, 1]  # remap
 # }
 
 
+def create_quad_part(
+    quad_verts: numpy.typing.ArrayLike,
+    texture_indexes: numpy.typing.ArrayLike,
+) -> BlockMeshPart:
+    """Create a mesh part from quads.
+
+    :param quad_verts: A (F, 4, 8) array of the four vertices of each quad.
+        Each vertex is the x, y, z coordinate, the u, v texture coordinate and the r, g, b tint.
+    :param texture_indexes: The texture index of each quad.
+    :return: The mesh part with two triangles per quad.
+    """
+    vertex_array = numpy.asarray(quad_verts, numpy.float32).reshape(-1, 8)
+    texture_indexes = numpy.asarray(texture_indexes, numpy.uint32)
+    quad_count = texture_indexes.shape[0]
+    triangle_array = numpy.empty((quad_count, 2, 4), numpy.uint32)
+    triangle_array[:, :, :3] = TRI_FACE.reshape(1, 2, 3) + 4 * numpy.arange(
+        quad_count, dtype=numpy.uint32
+    ).reshape(-1, 1, 1)
+    triangle_array[:, :, 3] = texture_indexes.reshape(-1, 1)
+    return BlockMeshPart(vertex_array, triangle_array.reshape(-1, 4))
+
+
 def get_cube(
     down: str,
     up: str,
@@ -107,80 +141,46 @@ def get_cube(
     ),
 ) -> BlockMesh:
     texture_paths: dict[str, int] = {}
-    mesh_parts: list[tuple[list[Vertex], list[Triangle]] | None] = [
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-        None,
-    ]
-    box_coordinates = list(itertools.product(*bounds))
-    tint_vec = FloatVec3(*tint)
-
-    for (
-        cull_direction,
-        vertex_index,
-        do_not_cull_face,
-        texture_path,
-        texture_coords,
-    ) in zip(
-        (
-            BlockMeshCullDirection.CullDown,
-            BlockMeshCullDirection.CullUp,
-            BlockMeshCullDirection.CullNorth,
-            BlockMeshCullDirection.CullEast,
-            BlockMeshCullDirection.CullSouth,
-            BlockMeshCullDirection.CullWest,
-        ),
-        VERTEX_INDEXES,
+    # Get the index of each texture path. Add if it is not contained.
+    texture_indexes = numpy.array(
+        [
+            texture_paths.setdefault(texture_path, len(texture_paths))
+            for texture_path in (down, up, north, east, south, west)
+        ],
+        numpy.uint32,
+    )
+    cull_directions = numpy.where(
         do_not_cull,
-        (down, up, north, east, south, west),
-        texture_uv,
-    ):
-        # Get the index of the texture path. Add if it is not contained.
-        texture_index = texture_paths.setdefault(texture_path, len(texture_paths))
-        if do_not_cull_face:
-            cull_direction = BlockMeshCullDirection.CullNone
-        part = mesh_parts[cull_direction]
-        if part is None:
-            mesh_parts[cull_direction] = part = ([], [])
-        verts, tris = part
-        vert_count = len(verts)
-
-        for i in range(4):
-            x, y, z = box_coordinates[vertex_index[i]]
-            uvx = texture_coords[UV_ROTATION_LUT[i * 2]]
-            uvy = texture_coords[UV_ROTATION_LUT[i * 2 + 1]]
-            verts.append(
-                Vertex(
-                    FloatVec3(x, y, z),
-                    FloatVec2(uvx, uvy),
-                    tint_vec,
-                )
-            )
-        for a, b, c in TRI_FACE.reshape((2, 3)):
-            tris.append(
-                Triangle(a + vert_count, b + vert_count, c + vert_count, texture_index)
-            )
-
-    def create_part(
-        part: tuple[list[Vertex], list[Triangle]] | None,
-    ) -> BlockMeshPart | None:
-        return None if part is None else BlockMeshPart(*part)
+        BlockMeshCullDirection.CullNone.value,
+        _FaceCullDirections,
+    )
+
+    # The vertices of all six faces in an array of shape (6, 4, 8)
+    box_coordinates = numpy.array(list(itertools.product(*bounds)), numpy.float32)
+    face_verts = numpy.empty((6, 4, 8), numpy.float32)
+    face_verts[:, :, 0:3] = box_coordinates[_VertexIndexArray]
+    face_verts[:, :, 3:5] = numpy.asarray(texture_uv, numpy.float32)[
+        :, UV_ROTATION_LUT
+    ].reshape(6, 4, 2)
+    face_verts[:, :, 5:8] = tint
+
+    def create_part(cull_direction: int) -> BlockMeshPart | None:
+        faces = cull_directions == cull_direction
+        if not faces.any():
+            return None
+        return create_quad_part(face_verts[faces], texture_indexes[faces])
 
     return BlockMesh(
         transparency,
         list(texture_paths),
         (
-            create_part(mesh_parts[0]),
-            create_part(mesh_parts[1]),
-            create_part(mesh_parts[2]),
-            create_part(mesh_parts[3]),
-            create_part(mesh_parts[4]),
-            create_part(mesh_parts[5]),
-            create_part(mesh_parts[6]),
+            create_part(0),
+            create_part(1),
+            create_part(2),
+            create_part(3),
+            create_part(4),
+            create_part(5),
+            create_part(6),
         ),
     )
 
@@ -1,6 +1,9 @@
 #include <array>
+#include <bit>
 #include <functional>
+#include <limits>
 #include <string>
+#include <unordered_map>
 
 #include <amulet/resource_pack/dll.hpp>
 
@@ -102,7 +105,7 @@ BlockMesh merge_block_meshes(std::vector<std::reference_wrapper<const BlockMesh>
 {
     BlockMesh new_mesh;
     new_mesh.transparency = BlockMeshTransparency::Partial;
-    std::map<std::string, size_t> texture_index_map;
+    std::map<std::string, std::uint32_t> texture_index_map;
     for (const auto& wrapper : meshes) {
         const auto& temp_mesh = wrapper.get();
         // Get the minimum transparency of the two meshes.
@@ -137,12 +140,17 @@ BlockMesh merge_block_meshes(std::vector<std::reference_wrapper<const BlockMesh>
                     temp_triangles.begin(),
                     temp_triangles.end());
 
+                if (std::numeric_limits<std::uint32_t>::max() < new_verts.size()) {
+                    throw std::overflow_error("The merged mesh part has too many vertices.");
+                }
+                const auto vert_offset = static_cast<std::uint32_t>(vert_count);
+
                 for (size_t i = triangle_count; i < new_mesh_part->triangles.size(); i++) {
                     // Update the triangle indexes
                     auto& triangle = new_mesh_part->triangles[i];
-                    triangle.vert_index_a += vert_count;
-                    triangle.vert_index_b += vert_count;
-                    triangle.vert_index_c += vert_count;
+                    triangle.vert_index_a += vert_offset;
+                    triangle.vert_index_b += vert_offset;
+                    triangle.vert_index_c += vert_offset;
                     if (temp_mesh.textures.size() <= triangle.texture_index) {
                         throw std::invalid_argument("Texture index is higher than the number of textures.");
                     }
@@ -150,7 +158,7 @@ BlockMesh merge_block_meshes(std::vector<std::reference_wrapper<const BlockMesh>
                     auto it = texture_index_map.find(texture_path);
                     if (it == texture_index_map.end()) {
                         // Texture has not been added yet.
-                        size_t texture_index = new_mesh.textures.size();
+                        auto texture_index = static_cast<std::uint32_t>(new_mesh.textures.size());
                         new_mesh.textures.push_back(texture_path);
                         triangle.texture_index = texture_index;
                         texture_index_map[texture_path] = texture_index;
@@ -161,7 +169,120 @@ BlockMesh merge_block_meshes(std::vector<std::reference_wrapper<const BlockMesh>
             }
         }
     }
+    new_mesh.shrink_to_fit();
     return new_mesh;
 }
 
+namespace {
+    // The bit patterns of the vertex attributes. Vertices are only welded if they are exactly equal.
+    using VertexKey = std::array<std::uint32_t, 8>;
+
+    struct VertexKeyHash {
+        size_t operator()(const VertexKey& key) const
+        {
+            size_t hash = 0;
+            for (const auto& value : key) {
+                hash ^= std::hash<std::uint32_t>()(value) + 0x9e3779b9 + (hash << 6) + (hash >> 2);
+            }
+            return hash;
+        }
+    };
+
+    std::uint32_t float_key(float value)
+    {
+        // Adding zero makes negative zero positive so that it matches zero.
+        return std::bit_cast<std::uint32_t>(value + 0.0f);
+    }
+
+    VertexKey get_vertex_key(const Vertex& vertex)
+    {
+        return {
+            float_key(vertex.coord.x),
+            float_key(vertex.coord.y),
+            float_key(vertex.coord.z),
+            float_key(vertex.texture_coord.x),
+            float_key(vertex.texture_coord.y),
+            float_key(vertex.tint.x),
+            float_key(vertex.tint.y),
+            float_key(vertex.tint.z)
+        };
+    }
+}
+
+BlockMeshPart BlockMeshPart::deduplicate() const
+{
+    constexpr std::uint32_t unmapped = std::numeric_limits<std::uint32_t>::max();
+    BlockMeshPart part;
+    part.triangles.reserve(triangles.size());
+    // The new index of each vertex.
+    std::vector<std::uint32_t> index_map(verts.size(), unmapped);
+    std::unordered_map<VertexKey, std::uint32_t, VertexKeyHash> vertex_indexes;
+
+    auto map_vertex = [&](std::uint32_t index) {
+        if (verts.size() <= index) {
+            throw std::invalid_argument("Vertex index is higher than the number of vertices.");
+        }
+        auto& new_index = index_map[index];
+        if (new_index == unmapped) {
+            const auto& vertex = verts[index];
+            auto [it, inserted] = vertex_indexes.try_emplace(get_vertex_key(vertex), static_cast<std::uint32_t>(part.verts.size()));
+            if (inserted) {
+                part.verts.push_back(vertex);
+            }
+            new_index = it->second;
+        }
+        return new_index;
+    };
+
+    for (const auto& triangle : triangles) {
+        auto a = map_vertex(triangle.vert_index_a);
+        auto b = map_vertex(triangle.vert_index_b);
+        auto c = map_vertex(triangle.vert_index_c);
+        if (a == b || b == c || a == c) {
+            // The triangle has no area.
+            continue;
+        }
+        part.triangles.emplace_back(a, b, c, triangle.texture_index);
+    }
+    part.shrink_to_fit();
+    return part;
+}
+
+BlockMesh BlockMesh::deduplicate() const
+{
+    BlockMesh mesh;
+    mesh.transparency = transparency;
+    // The new index of each texture. Textures with the same path are merged.
+    std::vector<std::optional<std::uint32_t>> index_map(textures.size());
+    std::map<std::string, std::uint32_t> texture_indexes;
+    for (std::uint8_t cull_direction = 0; cull_direction < 7; cull_direction++) {
+        const auto& part = parts[cull_direction];
+        if (!part) {
+            continue;
+        }
+        auto new_part = part->deduplicate();
+        if (new_part.triangles.empty()) {
+            continue;
+        }
+        for (auto& triangle : new_part.triangles) {
+            if (textures.size() <= triangle.texture_index) {
+                throw std::invalid_argument("Texture index is higher than the number of textures.");
+            }
+            auto& new_index = index_map[triangle.texture_index];
+            if (!new_index) {
+                const auto& texture_path = textures[triangle.texture_index];
+                auto [it, inserted] = texture_indexes.try_emplace(texture_path, static_cast<std::uint32_t>(mesh.textures.size()));
+                if (inserted) {
+                    mesh.textures.push_back(texture_path);
+                }
+                new_index = it->second;
+            }
+            triangle.texture_index = *new_index;
+        }
+        mesh.parts[cull_direction] = std::move(new_part);
+    }
+    mesh.textures.shrink_to_fit();
+    return mesh;
+}
+
 }
@@ -42,17 +42,17 @@ public:
 class Triangle {
 public:
     // The indicies of the vertexes in BlockMeshPart::verts.
-    size_t vert_index_a;
-    size_t vert_index_b;
-    size_t vert_index_c;
+    std::uint32_t vert_index_a;
+    std::uint32_t vert_index_b;
+    std::uint32_t vert_index_c;
     // The index of the texture in BlockMesh::textures.
-    size_t texture_index;
+    std::uint32_t texture_index;
 
     Triangle(
-        size_t vert_index_a,
-        size_t vert_index_b,
-        size_t vert_index_c,
-        size_t texture_index)
+        std::uint32_t vert_index_a,
+        std::uint32_t vert_index_b,
+        std::uint32_t vert_index_c,
+        std::uint32_t texture_index)
         : vert_index_a(vert_index_a)
         , vert_index_b(vert_index_b)
         , vert_index_c(vert_index_c)
@@ -80,6 +80,24 @@ public:
         , triangles(triangles)
     {
     }
+
+    // Weld identical vertices and remove unused vertices and degenerate triangles.
+    AMULET_RESOURCE_PACK_EXPORT BlockMeshPart deduplicate() const;
+
+    // Release memory reserved by the vectors that is not used.
+    void shrink_to_fit()
+    {
+        verts.shrink_to_fit();
+        triangles.shrink_to_fit();
+    }
+
+    // The number of bytes used by this object and the memory it owns.
+    size_t memory_usage() const
+    {
+        return sizeof(BlockMeshPart)
+            + verts.capacity() * sizeof(Vertex)
+            + triangles.capacity() * sizeof(Triangle);
+    }
 };
 
 enum class BlockMeshTransparency : std::uint8_t {
@@ -134,6 +152,40 @@ public:
     }
 
     AMULET_RESOURCE_PACK_EXPORT BlockMesh rotate(std::int8_t rotx, std::int8_t roty) const;
+
+    // Deduplicate each part and remove unused and duplicate textures.
+    AMULET_RESOURCE_PACK_EXPORT BlockMesh deduplicate() const;
+
+    // Release memory reserved by the vectors that is not used.
+    void shrink_to_fit()
+    {
+        textures.shrink_to_fit();
+        for (auto& part : parts) {
+            if (part) {
+                part->shrink_to_fit();
+            }
+        }
+    }
+
+    // The number of bytes used by this object and the memory it owns.
+    size_t memory_usage() const
+    {
+        // Strings that fit in the small string buffer do not allocate.
+        const size_t small_string_capacity = std::string().capacity();
+        size_t size = sizeof(BlockMesh) + textures.capacity() * sizeof(std::string);
+        for (const auto& texture : textures) {
+            if (small_string_capacity < texture.capacity()) {
+                size += texture.capacity() + 1;
+            }
+        }
+        for (const auto& part : parts) {
+            if (part) {
+                // The part object is stored inline.
+                size += part->memory_usage() - sizeof(BlockMeshPart);
+            }
+        }
+        return size;
+    }
 };
 
 AMULET_RESOURCE_PACK_EXPORT BlockMesh merge_block_meshes(std::vector<std::reference_wrapper<const BlockMesh>>);
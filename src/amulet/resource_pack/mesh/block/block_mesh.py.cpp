@@ -1,9 +1,15 @@
+#include <pybind11/numpy.h>
 #include <pybind11/operators.h>
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 #include <pybind11/typing.h>
 
+#include <cstdint>
+#include <limits>
 #include <memory>
+#include <stdexcept>
+#include <string>
+#include <type_traits>
 
 #include <amulet/pybind11_extensions/collections.hpp>
 
@@ -11,6 +17,45 @@
 
 namespace py = pybind11;
 
+// The numpy views rely on these types being tightly packed.
+static_assert(std::is_standard_layout_v<Amulet::Vertex>);
+static_assert(sizeof(Amulet::Vertex) == 8 * sizeof(float));
+static_assert(std::is_standard_layout_v<Amulet::Triangle>);
+static_assert(sizeof(Amulet::Triangle) == 4 * sizeof(std::uint32_t));
+
+// Create a read-only numpy array that views the data owned by base.
+template <typename T>
+static py::array_t<T> make_readonly_view(const T* data, size_t rows, size_t columns, size_t row_stride, py::handle base)
+{
+    py::array_t<T> array(
+        { static_cast<py::ssize_t>(rows), static_cast<py::ssize_t>(columns) },
+        { static_cast<py::ssize_t>(row_stride), static_cast<py::ssize_t>(sizeof(T)) },
+        data,
+        base);
+    py::detail::array_proxy(array.ptr())->flags &= ~py::detail::npy_api::NPY_ARRAY_WRITEABLE_;
+    return array;
+}
+
+// Copy the vertex indexes of the triangles into a new (M, 3) array.
+template <typename T>
+static py::array_t<T> make_index_array(const Amulet::BlockMeshPart& part)
+{
+    const size_t vertex_count = part.verts.size();
+    const size_t triangle_count = part.triangles.size();
+    py::array_t<T> array({ static_cast<py::ssize_t>(triangle_count), static_cast<py::ssize_t>(3) });
+    auto data = array.template mutable_unchecked<2>();
+    for (size_t i = 0; i < triangle_count; i++) {
+        const auto& triangle = part.triangles[i];
+        if (vertex_count <= triangle.vert_index_a || vertex_count <= triangle.vert_index_b || vertex_count <= triangle.vert_index_c) {
+            throw std::out_of_range("Triangle " + std::to_string(i) + " references a vertex that does not exist.");
+        }
+        data(i, 0) = static_cast<T>(triangle.vert_index_a);
+        data(i, 1) = static_cast<T>(triangle.vert_index_b);
+        data(i, 2) = static_cast<T>(triangle.vert_index_c);
+    }
+    return array;
+}
+
 void init_block_mesh(py::module m)
 {
     // FloatVec2
@@ -60,10 +105,10 @@ void init_block_mesh(py::module m)
         "The vertex and texture indexes that make up a triangle.");
     Triangle.def(
         py::init<
-            size_t,
-            size_t,
-            size_t,
-            size_t>(),
+            std::uint32_t,
+            std::uint32_t,
+            std::uint32_t,
+            std::uint32_t>(),
         py::arg("vert_index_a"),
         py::arg("vert_index_b"),
         py::arg("vert_index_c"),
@@ -82,8 +127,109 @@ void init_block_mesh(py::module m)
             const std::vector<Amulet::Triangle>&>(),
         py::arg("verts"),
         py::arg("triangles"));
+    BlockMeshPart.def(
+        py::init(
+            [](
+                py::array_t<float, py::array::c_style | py::array::forcecast> vertex_array,
+                py::array_t<uint32_t, py::array::c_style | py::array::forcecast> triangle_array) {
+                if (vertex_array.ndim() != 2 || vertex_array.shape(1) != 8) {
+                    throw std::invalid_argument("vertex_array must have shape (N, 8).");
+                }
+                if (triangle_array.ndim() != 2 || triangle_array.shape(1) != 4) {
+                    throw std::invalid_argument("triangle_array must have shape (M, 4).");
+                }
+                const size_t vertex_count = vertex_array.shape(0);
+                const size_t triangle_count = triangle_array.shape(0);
+
+                Amulet::BlockMeshPart part;
+                part.verts.reserve(vertex_count);
+                const float* vertex_data = vertex_array.data();
+                for (size_t i = 0; i < vertex_count; i++) {
+                    const float* v = vertex_data + 8 * i;
+                    part.verts.emplace_back(
+                        Amulet::FloatVec3(v[0], v[1], v[2]),
+                        Amulet::FloatVec2(v[3], v[4]),
+                        Amulet::FloatVec3(v[5], v[6], v[7]));
+                }
+
+                part.triangles.reserve(triangle_count);
+                auto triangle_data = triangle_array.unchecked<2>();
+                for (size_t i = 0; i < triangle_count; i++) {
+                    const std::uint32_t a = triangle_data(i, 0);
+                    const std::uint32_t b = triangle_data(i, 1);
+                    const std::uint32_t c = triangle_data(i, 2);
+                    if (vertex_count <= a || vertex_count <= b || vertex_count <= c) {
+                        throw std::out_of_range("Triangle " + std::to_string(i) + " references a vertex that does not exist.");
+                    }
+                    part.triangles.emplace_back(a, b, c, triangle_data(i, 3));
+                }
+                return part;
+            }),
+        py::arg("vertex_array"),
+        py::arg("triangle_array"),
+        py::doc(
+            "Construct from numpy arrays.\n"
+            "\n"
+            ":param vertex_array: A (N, 8) float32 array. Each row is the x, y, z coordinate, the u, v texture coordinate and the r, g, b tint.\n"
+            ":param triangle_array: A (M, 4) uint32 array. Each row is the three vertex indexes and the texture index."));
     BlockMeshPart.def_readonly("verts", &Amulet::BlockMeshPart::verts, py::doc("The vertices in this block mesh part."));
     BlockMeshPart.def_readonly("triangles", &Amulet::BlockMeshPart::triangles, py::doc("The triangles in this block mesh part."));
+    BlockMeshPart.def_property_readonly(
+        "vertex_array",
+        [](py::object self) {
+            const auto& part = self.cast<const Amulet::BlockMeshPart&>();
+            return make_readonly_view(
+                reinterpret_cast<const float*>(part.verts.data()),
+                part.verts.size(),
+                8,
+                sizeof(Amulet::Vertex),
+                self);
+        },
+        py::doc(
+            "A read-only (N, 8) float32 view of the vertices without copying.\n"
+            "Each row is the x, y, z coordinate, the u, v texture coordinate and the r, g, b tint.\n"
+            "The array shares memory with this object."));
+    BlockMeshPart.def_property_readonly(
+        "triangle_array",
+        [](py::object self) {
+            const auto& part = self.cast<const Amulet::BlockMeshPart&>();
+            return make_readonly_view(
+                reinterpret_cast<const std::uint32_t*>(part.triangles.data()),
+                part.triangles.size(),
+                4,
+                sizeof(Amulet::Triangle),
+                self);
+        },
+        py::doc(
+            "A read-only (M, 4) uint32 view of the triangles without copying.\n"
+            "Each row is the three vertex indexes and the texture index.\n"
+            "The array shares memory with this object."));
+    BlockMeshPart.def(
+        "get_index_array",
+        [](const Amulet::BlockMeshPart& self) -> py::array {
+            const size_t vertex_count = self.verts.size();
+            if (vertex_count <= static_cast<size_t>(std::numeric_limits<std::uint16_t>::max()) + 1) {
+                return make_index_array<std::uint16_t>(self);
+            }
+            if (vertex_count <= static_cast<size_t>(std::numeric_limits<std::uint32_t>::max()) + 1) {
+                return make_index_array<std::uint32_t>(self);
+            }
+            throw std::overflow_error("The mesh part has too many vertices for 32 bit indexes.");
+        },
+        py::doc(
+            "Get a new (M, 3) array of the vertex indexes of each triangle.\n"
+            "The dtype is uint16 if there are at most 65536 vertices, otherwise uint32.\n"
+            "This can be used directly as an index buffer."));
+    BlockMeshPart.def(
+        "memory_usage",
+        &Amulet::BlockMeshPart::memory_usage,
+        py::doc("The number of bytes used by the C++ object and the vertex and triangle memory it owns."));
+    BlockMeshPart.def(
+        "deduplicate",
+        &Amulet::BlockMeshPart::deduplicate,
+        py::doc(
+            "Get a copy of this mesh part with identical vertices welded together.\n"
+            "Vertices that are not used and triangles with no area are removed."));
 
     // BlockMeshTransparency
     py::enum_<Amulet::BlockMeshTransparency>(m, "BlockMeshTransparency",
@@ -133,31 +279,53 @@ void init_block_mesh(py::module m)
     BlockMesh.def_readonly("textures", &Amulet::BlockMesh::textures, py::doc("The texture paths used in this block mesh. The Triangle's texture_index attribute is an index into this list."));
     BlockMesh.def_property_readonly(
         "parts",
-        [](const Amulet::BlockMesh& self) -> py::typing::Tuple<
-                                              std::optional<Amulet::BlockMeshPart>,
-                                              std::optional<Amulet::BlockMeshPart>,
-                                              std::optional<Amulet::BlockMeshPart>,
-                                              std::optional<Amulet::BlockMeshPart>,
-                                              std::optional<Amulet::BlockMeshPart>,
-                                              std::optional<Amulet::BlockMeshPart>,
-                                              std::optional<Amulet::BlockMeshPart>> {
+        [](py::object py_self) -> py::typing::Tuple<
+                                   std::optional<Amulet::BlockMeshPart>,
+                                   std::optional<Amulet::BlockMeshPart>,
+                                   std::optional<Amulet::BlockMeshPart>,
+                                   std::optional<Amulet::BlockMeshPart>,
+                                   std::optional<Amulet::BlockMeshPart>,
+                                   std::optional<Amulet::BlockMeshPart>,
+                                   std::optional<Amulet::BlockMeshPart>> {
+            const auto& self = py_self.cast<const Amulet::BlockMesh&>();
+            // Return references to the parts that keep this object alive so that no data is copied.
+            auto get_part = [&](size_t cull_direction) -> py::object {
+                const auto& part = self.parts[cull_direction];
+                if (!part) {
+                    return py::none();
+                }
+                return py::cast(&*part, py::return_value_policy::reference_internal, py_self);
+            };
             return py::make_tuple(
-                py::cast(self.parts[0]),
-                py::cast(self.parts[1]),
-                py::cast(self.parts[2]),
-                py::cast(self.parts[3]),
-                py::cast(self.parts[4]),
-                py::cast(self.parts[5]),
-                py::cast(self.parts[6]));
+                get_part(0),
+                get_part(1),
+                get_part(2),
+                get_part(3),
+                get_part(4),
+                get_part(5),
+                get_part(6));
         },
         py::doc("The mesh parts that make up this mesh. The index corresponds to the value of BlockMeshCullDirection."));
     BlockMesh.def("rotate", &Amulet::BlockMesh::rotate, py::arg("rotx"), py::arg("roty"), py::doc("Rotate the mesh in the x and y axis. Accepted values are -3 to 3 which correspond to 90 degree rotations."));
+    BlockMesh.def(
+        "memory_usage",
+        &Amulet::BlockMesh::memory_usage,
+        py::doc("The number of bytes used by the C++ object and the parts and textures it owns."));
+    BlockMesh.def(
+        "deduplicate",
+        &Amulet::BlockMesh::deduplicate,
+        py::doc(
+            "Get a copy of this mesh with identical vertices in each part welded together.\n"
+            "Unused vertices, triangles with no area, empty parts and unused or duplicate textures are removed."));
 
     m.def(
         "merge_block_meshes", [](Amulet::pybind11_extensions::collections::Sequence<Amulet::BlockMesh> py_meshes) {
+            // Hold a reference to each python object so that the meshes they own outlive the merge.
+            std::vector<py::object> py_objects;
             std::vector<std::reference_wrapper<const Amulet::BlockMesh>> meshes;
-            for (auto mesh : py_meshes) {
-                meshes.push_back(mesh);
+            for (auto py_mesh : py::iter(py_meshes)) {
+                py_objects.push_back(py::reinterpret_borrow<py::object>(py_mesh));
+                meshes.push_back(py_objects.back().cast<const Amulet::BlockMesh&>());
             }
             return Amulet::merge_block_meshes(meshes);
         },
@@ -166,6 +334,7 @@ void init_block_mesh(py::module m)
     m.attr("CUBE_FACE_LUT") = py::module::import("amulet.resource_pack.mesh.block._cube").attr("CUBE_FACE_LUT");
     m.attr("TRI_FACE") = py::module::import("amulet.resource_pack.mesh.block._cube").attr("TRI_FACE");
     m.attr("UV_ROTATION_LUT") = py::module::import("amulet.resource_pack.mesh.block._cube").attr("UV_ROTATION_LUT");
+    m.attr("create_quad_part") = py::module::import("amulet.resource_pack.mesh.block._cube").attr("create_quad_part");
     m.attr("get_cube") = py::module::import("amulet.resource_pack.mesh.block._cube").attr("get_cube");
     m.attr("get_unit_cube") = py::module::import("amulet.resource_pack.mesh.block._cube").attr("get_unit_cube");
 
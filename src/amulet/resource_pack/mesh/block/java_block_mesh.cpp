@@ -0,0 +1,206 @@
+#include <algorithm>
+#include <array>
+#include <cmath>
+#include <cstdint>
+#include <numbers>
+#include <string>
+#include <unordered_map>
+#include <vector>
+
+#include <amulet/resource_pack/dll.hpp>
+
+#include "block_mesh.hpp"
+#include "java_block_mesh.hpp"
+
+namespace Amulet {
+
+// The corners of the element box used by each face. Corner i is at (i >> 2 & 1, i >> 1 & 1, i & 1).
+static const std::array<std::array<std::uint8_t, 4>, 6> FaceVertexIndexes = { {
+    { 0, 4, 5, 1 }, // down
+    { 3, 7, 6, 2 }, // up
+    { 4, 0, 2, 6 }, // north
+    { 5, 4, 6, 7 }, // east
+    { 1, 5, 7, 3 }, // south
+    { 0, 1, 3, 2 }, // west
+} };
+
+// The index into the uv array for the u and v of each vertex.
+static const std::array<std::uint8_t, 8> UVRotationLUT = { 0, 3, 2, 3, 2, 1, 0, 1 };
+
+// The vertex indexes of the two triangles in a quad.
+static const std::array<std::uint8_t, 6> QuadTriangles = { 0, 1, 2, 0, 2, 3 };
+
+using Matrix3 = std::array<std::array<double, 3>, 3>;
+
+// The rotation matrix for row vectors. Matches mesh.util.rotate_3d.
+static Matrix3 get_rotation_matrix(double x, double y, double z)
+{
+    const double sb = std::sin(x * std::numbers::pi / 180.0);
+    const double sh = std::sin(y * std::numbers::pi / 180.0);
+    const double sa = std::sin(z * std::numbers::pi / 180.0);
+    const double cb = std::cos(x * std::numbers::pi / 180.0);
+    const double ch = std::cos(y * std::numbers::pi / 180.0);
+    const double ca = std::cos(z * std::numbers::pi / 180.0);
+    return { {
+        { ch * ca, -ch * sa * cb + sh * sb, ch * sa * sb + sh * cb },
+        { sa, ca * cb, -ca * sb },
+        { -sh * ca, sh * sa * cb + ch * sb, -sh * sa * sb + ch * cb },
+    } };
+}
+
+// The transform for an element rotation.
+// If rescale is true the axes perpendicular to the rotation axis are scaled by 1 / cos(angle).
+static Matrix3 get_element_rotation_matrix(JavaModelAxis axis, double angle, bool rescale)
+{
+    Matrix3 matrix = get_rotation_matrix(
+        axis == JavaModelAxis::X ? -angle : 0.0,
+        axis == JavaModelAxis::Y ? -angle : 0.0,
+        axis == JavaModelAxis::Z ? -angle : 0.0);
+    if (rescale) {
+        const double scale = 1.0 / std::cos(angle * std::numbers::pi / 180.0);
+        for (size_t j = 0; j < 3; j++) {
+            if (j != static_cast<size_t>(axis)) {
+                for (size_t i = 0; i < 3; i++) {
+                    matrix[i][j] *= scale;
+                }
+            }
+        }
+    }
+    return matrix;
+}
+
+// The angles that Java element rotations are limited to.
+static const std::array<float, 5> ElementRotationAngles = { -45.0f, -22.5f, 0.0f, 22.5f, 45.0f };
+
+// The transforms for each axis, angle and rescale state.
+static const auto ElementRotationMatrices = []() {
+    std::array<std::array<std::array<Matrix3, 2>, ElementRotationAngles.size()>, 3> matrices;
+    for (std::uint8_t axis = 0; axis < 3; axis++) {
+        for (size_t angle_index = 0; angle_index < ElementRotationAngles.size(); angle_index++) {
+            for (std::uint8_t rescale = 0; rescale < 2; rescale++) {
+                matrices[axis][angle_index][rescale] = get_element_rotation_matrix(
+                    static_cast<JavaModelAxis>(axis),
+                    ElementRotationAngles[angle_index],
+                    rescale);
+            }
+        }
+    }
+    return matrices;
+}();
+
+// Get the transform for an element rotation.
+// The standard angles are looked up in the precomputed table. Other angles are computed.
+static Matrix3 get_element_rotation(const JavaModelElementRotation& rotation)
+{
+    for (size_t angle_index = 0; angle_index < ElementRotationAngles.size(); angle_index++) {
+        if (rotation.angle == ElementRotationAngles[angle_index]) {
+            return ElementRotationMatrices[static_cast<std::uint8_t>(rotation.axis)][angle_index][rotation.rescale];
+        }
+    }
+    return get_element_rotation_matrix(rotation.axis, rotation.angle, rotation.rescale);
+}
+
+static bool is_full_element(const JavaModelElement& element)
+{
+    return !element.rotation
+        && element.from.x == 0 && element.from.y == 0 && element.from.z == 0
+        && element.to.x == 16 && element.to.y == 16 && element.to.z == 16
+        && 6 <= element.faces.size();
+}
+
+BlockMesh build_java_block_mesh(const std::vector<JavaModelElement>& elements)
+{
+    BlockMesh mesh;
+    mesh.transparency = BlockMeshTransparency::Partial;
+    std::unordered_map<std::string, std::uint32_t> texture_indexes;
+
+    for (const auto& element : elements) {
+        // If this element fills the whole block check if all of its textures are opaque.
+        if (mesh.transparency != BlockMeshTransparency::FullOpaque && is_full_element(element)) {
+            mesh.transparency = BlockMeshTransparency::FullTranslucent;
+            bool is_opaque = true;
+            for (const auto& face : element.faces) {
+                is_opaque = is_opaque && !face.is_transparent;
+            }
+            if (is_opaque) {
+                mesh.transparency = BlockMeshTransparency::FullOpaque;
+            }
+        }
+
+        // The corners of the element box.
+        const double x1 = std::min(element.from.x, element.to.x) / 16.0;
+        const double y1 = std::min(element.from.y, element.to.y) / 16.0;
+        const double z1 = std::min(element.from.z, element.to.z) / 16.0;
+        const double x2 = std::max(element.from.x, element.to.x) / 16.0;
+        const double y2 = std::max(element.from.y, element.to.y) / 16.0;
+        const double z2 = std::max(element.from.z, element.to.z) / 16.0;
+        std::array<std::array<double, 3>, 8> box;
+        for (std::uint8_t i = 0; i < 8; i++) {
+            box[i] = { i & 4 ? x2 : x1, i & 2 ? y2 : y1, i & 1 ? z2 : z1 };
+        }
+        if (element.rotation) {
+            const auto& rotation = *element.rotation;
+            const Matrix3& matrix = get_element_rotation(rotation);
+            const std::array<double, 3> origin = {
+                rotation.origin.x / 16.0,
+                rotation.origin.y / 16.0,
+                rotation.origin.z / 16.0
+            };
+            for (auto& corner : box) {
+                std::array<double, 3> rotated;
+                for (size_t j = 0; j < 3; j++) {
+                    rotated[j] = origin[j];
+                    for (size_t i = 0; i < 3; i++) {
+                        rotated[j] += (corner[i] - origin[i]) * matrix[i][j];
+                    }
+                }
+                corner = rotated;
+            }
+        }
+
+        for (const auto& face : element.faces) {
+            // Get the index of the texture. Add it if it does not exist.
+            auto [texture_it, texture_added] = texture_indexes.try_emplace(face.texture, static_cast<std::uint32_t>(mesh.textures.size()));
+            if (texture_added) {
+                mesh.textures.push_back(face.texture);
+            }
+            const std::uint32_t texture_index = texture_it->second;
+
+            auto& part = mesh.parts[face.cull_direction];
+            if (!part) {
+                part = BlockMeshPart();
+            }
+            const auto vert_count = static_cast<std::uint32_t>(part->verts.size());
+
+            // The number of 90 degree texture rotations.
+            int uv_rotation = static_cast<int>(face.rotation / 90.0f);
+            uv_rotation = (-4 < uv_rotation && uv_rotation < 4) ? (uv_rotation + 4) % 4 : 0;
+
+            const FloatVec3 tint = face.tinted ? FloatVec3(0, 1, 0) : FloatVec3(1, 1, 1);
+            const auto& vertex_indexes = FaceVertexIndexes[static_cast<std::uint8_t>(face.direction)];
+            for (size_t i = 0; i < 4; i++) {
+                const auto& corner = box[vertex_indexes[i]];
+                part->verts.emplace_back(
+                    FloatVec3(
+                        static_cast<float>(corner[0]),
+                        static_cast<float>(corner[1]),
+                        static_cast<float>(corner[2])),
+                    FloatVec2(
+                        face.uv[UVRotationLUT[(2 * (i + uv_rotation)) % 8]] / 16.0f,
+                        face.uv[UVRotationLUT[(2 * (i + uv_rotation) + 1) % 8]] / 16.0f),
+                    tint);
+            }
+            for (size_t i = 0; i < 6; i += 3) {
+                part->triangles.emplace_back(
+                    vert_count + QuadTriangles[i],
+                    vert_count + QuadTriangles[i + 1],
+                    vert_count + QuadTriangles[i + 2],
+                    texture_index);
+            }
+        }
+    }
+    mesh.shrink_to_fit();
+    return mesh;
+}
+
+} // namespace Amulet
@@ -0,0 +1,116 @@
+#pragma once
+#include <array>
+#include <cstdint>
+#include <optional>
+#include <string>
+#include <vector>
+
+#include <amulet/resource_pack/dll.hpp>
+
+#include "block_mesh.hpp"
+
+namespace Amulet {
+
+// The side of a Java model element that a face is on.
+enum class JavaModelFaceDirection : std::uint8_t {
+    Down,
+    Up,
+    North,
+    East,
+    South,
+    West
+};
+
+class JavaModelFace {
+public:
+    // The side of the element this face is on.
+    JavaModelFaceDirection direction;
+    // The neighbouring block that culls this face.
+    BlockMeshCullDirection cull_direction;
+    // The resolved texture path.
+    std::string texture;
+    // Does the texture have any pixels that are not fully opaque.
+    bool is_transparent;
+    // The texture coordinates in pixels (x1, y1, x2, y2).
+    std::array<float, 4> uv;
+    // The rotation of the texture in degrees.
+    float rotation;
+    // Is the face tinted.
+    bool tinted;
+
+    JavaModelFace(
+        JavaModelFaceDirection direction,
+        BlockMeshCullDirection cull_direction,
+        const std::string& texture,
+        bool is_transparent,
+        const std::array<float, 4>& uv,
+        float rotation,
+        bool tinted)
+        : direction(direction)
+        , cull_direction(cull_direction)
+        , texture(texture)
+        , is_transparent(is_transparent)
+        , uv(uv)
+        , rotation(rotation)
+        , tinted(tinted)
+    {
+    }
+};
+
+enum class JavaModelAxis : std::uint8_t {
+    X,
+    Y,
+    Z
+};
+
+class JavaModelElementRotation {
+public:
+    // The centre of rotation in pixels.
+    FloatVec3 origin;
+    // The axis to rotate around.
+    JavaModelAxis axis;
+    // The angle in degrees.
+    float angle;
+    // Scale the faces perpendicular to the axis so that they span the whole block.
+    bool rescale;
+
+    JavaModelElementRotation(
+        const FloatVec3& origin,
+        JavaModelAxis axis,
+        float angle,
+        bool rescale)
+        : origin(origin)
+        , axis(axis)
+        , angle(angle)
+        , rescale(rescale)
+    {
+    }
+};
+
+class JavaModelElement {
+public:
+    // The corners of the element in pixels.
+    FloatVec3 from;
+    FloatVec3 to;
+    // The rotation of the element if defined.
+    std::optional<JavaModelElementRotation> rotation;
+    // The faces in the order they are defined.
+    std::vector<JavaModelFace> faces;
+
+    JavaModelElement(
+        const FloatVec3& from,
+        const FloatVec3& to,
+        const std::optional<JavaModelElementRotation>& rotation,
+        const std::vector<JavaModelFace>& faces)
+        : from(from)
+        , to(to)
+        , rotation(rotation)
+        , faces(faces)
+    {
+    }
+};
+
+// Convert the elements of a Java block model into a block mesh.
+AMULET_RESOURCE_PACK_EXPORT BlockMesh build_java_block_mesh(const std::vector<JavaModelElement>& elements);
+
+} // namespace Amulet
@@ -0,0 +1,219 @@
+#include <pybind11/functional.h>
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+
+#include <array>
+#include <functional>
+#include <map>
+#include <optional>
+#include <set>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include "block_mesh.hpp"
+#include "java_block_mesh.hpp"
+
+namespace py = pybind11;
+
+using ResolveTextureT = std::function<std::pair<std::string, bool>(const std::string&, const std::string&)>;
+
+static const std::map<std::string, Amulet::JavaModelFaceDirection> FaceDirections = {
+    { "down", Amulet::JavaModelFaceDirection::Down },
+    { "up", Amulet::JavaModelFaceDirection::Up },
+    { "north", Amulet::JavaModelFaceDirection::North },
+    { "east", Amulet::JavaModelFaceDirection::East },
+    { "south", Amulet::JavaModelFaceDirection::South },
+    { "west", Amulet::JavaModelFaceDirection::West },
+};
+
+static const std::map<std::string, Amulet::BlockMeshCullDirection> CullDirections = {
+    { "down", Amulet::BlockMeshCullDirection::BlockMeshCullDown },
+    { "up", Amulet::BlockMeshCullDirection::BlockMeshCullUp },
+    { "north", Amulet::BlockMeshCullDirection::BlockMeshCullNorth },
+    { "east", Amulet::BlockMeshCullDirection::BlockMeshCullEast },
+    { "south", Amulet::BlockMeshCullDirection::BlockMeshCullSouth },
+    { "west", Amulet::BlockMeshCullDirection::BlockMeshCullWest },
+};
+
+template <typename T>
+static T get_item(py::dict obj, const char* key, const char* type_name)
+{
+    py::object value = obj[key];
+    if (!py::isinstance<T>(value)) {
+        throw py::type_error(std::string(key) + " must be a " + type_name);
+    }
+    return value.cast<T>();
+}
+
+template <size_t N>
+static std::array<float, N> get_floats(py::dict obj, const char* key, const std::array<float, N>& default_value)
+{
+    if (!obj.contains(key)) {
+        return default_value;
+    }
+    auto values = obj[key].cast<std::vector<float>>();
+    if (values.size() != N) {
+        throw py::value_error(std::string(key) + " must contain " + std::to_string(N) + " numbers.");
+    }
+    std::array<float, N> out {};
+    std::copy(values.begin(), values.end(), out.begin());
+    return out;
+}
+
+static Amulet::FloatVec3 get_vec3(py::dict obj, const char* key, const std::array<float, 3>& default_value)
+{
+    auto values = get_floats(obj, key, default_value);
+    return Amulet::FloatVec3(values[0], values[1], values[2]);
+}
+
+// Find the texture path and transparency for a texture reference in a model.
+class TextureResolver {
+private:
+    py::dict textures;
+    const ResolveTextureT& resolve_texture;
+    std::map<std::string, std::pair<std::string, bool>> cache;
+
+public:
+    TextureResolver(py::dict textures, const ResolveTextureT& resolve_texture)
+        : textures(textures)
+        , resolve_texture(resolve_texture)
+    {
+    }
+
+    const std::pair<std::string, bool>& resolve(py::object texture)
+    {
+        // Follow the texture variables to the texture path.
+        std::set<std::string> visited;
+        while (py::isinstance<py::str>(texture)) {
+            auto texture_str = texture.cast<std::string>();
+            if (!texture_str.starts_with("#")) {
+                break;
+            }
+            if (!visited.insert(texture_str).second) {
+                throw py::value_error("Texture variable " + texture_str + " references itself.");
+            }
+            texture = textures.attr("get")(texture_str.substr(1));
+        }
+        if (!py::isinstance<py::str>(texture)) {
+            throw py::value_error("Could not resolve the texture " + py::repr(texture).cast<std::string>());
+        }
+        auto texture_str = texture.cast<std::string>();
+
+        auto it = cache.find(texture_str);
+        if (it == cache.end()) {
+            auto colon = texture_str.find(':');
+            if (colon == std::string::npos) {
+                it = cache.emplace(texture_str, resolve_texture("minecraft", texture_str)).first;
+            } else {
+                it = cache.emplace(texture_str, resolve_texture(texture_str.substr(0, colon), texture_str.substr(colon + 1))).first;
+            }
+        }
+        return it->second;
+    }
+};
+
+static Amulet::JavaModelElement parse_element(py::handle py_element, TextureResolver& texture_resolver)
+{
+    if (!py::isinstance<py::dict>(py_element)) {
+        throw py::type_error("element must be a dict");
+    }
+    auto element = py::reinterpret_borrow<py::dict>(py_element);
+
+    std::optional<Amulet::JavaModelElementRotation> rotation;
+    if (element.contains("rotation")) {
+        auto py_rotation = get_item<py::dict>(element, "rotation", "dict");
+        auto axis_str = py_rotation.contains("axis") ? py_rotation["axis"].cast<std::string>() : "x";
+        float angle = py_rotation.contains("angle") ? py_rotation["angle"].cast<float>() : 0.0f;
+        auto axis = Amulet::JavaModelAxis::X;
+        if (axis_str == "y") {
+            axis = Amulet::JavaModelAxis::Y;
+        } else if (axis_str == "z") {
+            axis = Amulet::JavaModelAxis::Z;
+        } else if (axis_str != "x") {
+            // An unknown axis is not rotated.
+            angle = 0.0f;
+        }
+        rotation = Amulet::JavaModelElementRotation(
+            get_vec3(py_rotation, "origin", { 8, 8, 8 }),
+            axis,
+            angle,
+            py_rotation.contains("rescale") && py::bool_(py_rotation["rescale"]));
+    }
+
+    std::vector<Amulet::JavaModelFace> faces;
+    if (element.contains("faces")) {
+        for (auto [py_face_dir, py_face] : get_item<py::dict>(element, "faces", "dict")) {
+            if (!py::isinstance<py::str>(py_face_dir)) {
+                continue;
+            }
+            auto direction_it = FaceDirections.find(py_face_dir.cast<std::string>());
+            if (direction_it == FaceDirections.end()) {
+                continue;
+            }
+            if (!py::isinstance<py::dict>(py_face)) {
+                throw py::type_error("face must be a dict");
+            }
+            auto face = py::reinterpret_borrow<py::dict>(py_face);
+
+            // If there is an opaque block in the cull direction then this face is culled.
+            auto cull_direction = Amulet::BlockMeshCullDirection::BlockMeshCullNone;
+            if (face.contains("cullface")) {
+                py::object cull_face = face["cullface"];
+                if (py::isinstance<py::str>(cull_face)) {
+                    auto cull_it = CullDirections.find(cull_face.cast<std::string>());
+                    if (cull_it != CullDirections.end()) {
+                        cull_direction = cull_it->second;
+                    }
+                }
+            }
+
+            const auto& [texture_path, is_transparent] = texture_resolver.resolve(face.attr("get")("texture"));
+
+            faces.emplace_back(
+                direction_it->second,
+                cull_direction,
+                texture_path,
+                is_transparent,
+                // TODO: get the uv based on box location if not defined
+                get_floats<4>(face, "uv", { 0, 0, 16, 16 }),
+                face.contains("rotation") ? face["rotation"].cast<float>() : 0.0f,
+                face.contains("tintindex"));
+        }
+    }
+
+    return Amulet::JavaModelElement(
+        get_vec3(element, "from", { 0, 0, 0 }),
+        get_vec3(element, "to", { 16, 16, 16 }),
+        rotation,
+        faces);
+}
+
+void init_java_block_mesh(py::module m)
+{
+    m.def(
+        "build_java_block_mesh",
+        [](py::dict model, ResolveTextureT resolve_texture) {
+            py::dict textures;
+            if (model.contains("textures")) {
+                textures = get_item<py::dict>(model, "textures", "dict");
+            }
+            std::vector<Amulet::JavaModelElement> elements;
+            if (model.contains("elements")) {
+                TextureResolver texture_resolver(textures, resolve_texture);
+                for (auto element : get_item<py::list>(model, "elements", "list")) {
+                    elements.push_back(parse_element(element, texture_resolver));
+                }
+            }
+            py::gil_scoped_release gil;
+            return Amulet::build_java_block_mesh(elements);
+        },
+        py::arg("model"),
+        py::arg("resolve_texture"),
+        py::doc(
+            "Convert a Java block model into a block mesh.\n"
+            "\n"
+            ":param model: The model json data with the parent models merged in.\n"
+            ":param resolve_texture: A function taking the texture namespace and relative path and returning the texture path and if it is transparent.\n"
+            ":return: The block mesh."));
+}
@@ -1,9 +1,22 @@
+from functools import lru_cache
+
 import numpy
 
 
-def rotate_3d(
-    verts: numpy.ndarray, x: float, y: float, z: float, dx: float, dy: float, dz: float
+@lru_cache(maxsize=256)
+def get_rotation_matrix(
+    x: float, y: float, z: float, rescale: bool = False
 ) -> numpy.ndarray:
+    """Get the 3x3 matrix that rotates row vectors by the given angles in degrees.
+
+    Matrices are cached so repeated angles, such as the few used by Java model elements, are only computed once.
+
+    :param x: The rotation around the x axis in degrees.
+    :param y: The rotation around the y axis in degrees.
+    :param z: The rotation around the z axis in degrees.
+    :param rescale: If True scale the axes perpendicular to each rotation axis by 1 / cos(angle).
+    :return: A read-only 3x3 matrix.
+    """
     sb, sh, sa = numpy.sin(numpy.radians([x, y, z]))
     cb, ch, ca = numpy.cos(numpy.radians([x, y, z]))
     trmtx = numpy.array(
@@ -13,5 +26,38 @@ def rotate_3d(
             [-sh * ca, sh * sa * cb + ch * sb, -sh * sa * sb + ch * cb],
         ]
     )
+    if rescale:
+        scale = numpy.ones(3)
+        for axis, cos in enumerate((cb, ch, ca)):
+            if cos != 1:
+                scale[[i for i in range(3) if i != axis]] /= cos
+        trmtx *= scale
+    trmtx.flags.writeable = False
+    return trmtx
+
+
+def rotate_3d(
+    verts: numpy.ndarray,
+    x: float,
+    y: float,
+    z: float,
+    dx: float,
+    dy: float,
+    dz: float,
+    rescale: bool = False,
+) -> numpy.ndarray:
+    """Rotate vertices around an origin.
+
+    :param verts: An array of vertices with shape (..., 3). All vertices are transformed in one call.
+    :param x: The rotation around the x axis in degrees.
+    :param y: The rotation around the y axis in degrees.
+    :param z: The rotation around the z axis in degrees.
+    :param dx: The x coordinate of the origin.
+    :param dy: The y coordinate of the origin.
+    :param dz: The z coordinate of the origin.
+    :param rescale: If True scale the axes perpendicular to each rotation axis by 1 / cos(angle).
+    :return: The rotated vertices with the same shape as the input.
+    """
+    trmtx = get_rotation_matrix(x, y, z, rescale)
     origin = numpy.array([dx, dy, dz])
     return numpy.matmul(verts - origin, trmtx) + origin  # type: ignore
@@ -0,0 +1,128 @@
+"""Read files from resource packs that are either directories or zip files.
+
+Files inside a zip pack are addressed with a path through the zip file.
+For example the texture path "/packs/pack.zip/assets/minecraft/textures/block/stone.png"
+refers to the member "assets/minecraft/textures/block/stone.png" in "/packs/pack.zip".
+
+The central directory of each zip file is read once and cached.
+Members are decompressed when they are opened so the pack is never extracted to disk.
+"""
+
+from __future__ import annotations
+
+import os
+import stat
+import threading
+from typing import BinaryIO, Optional
+from zipfile import ZipFile, BadZipFile
+
+# Zip file path to the stat of the file when it was opened and the open zip file.
+_zip_files: dict[str, tuple[tuple[int, int], ZipFile]] = {}
+_zip_files_lock = threading.Lock()
+
+
+def get_zip_file(path: str) -> Optional[ZipFile]:
+    """Get the open zip file at a path.
+
+    The zip file is cached and reopened if the file on disk changes.
+
+    :param path: The path to the zip file.
+    :return: The open zip file or None if the path is not a zip file.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    file_stat = (stat.st_mtime_ns, stat.st_size)
+    with _zip_files_lock:
+        cached = _zip_files.get(path)
+        if cached is not None and cached[0] == file_stat:
+            return cached[1]
+        try:
+            zip_file = ZipFile(path)
+        except (OSError, BadZipFile):
+            _zip_files.pop(path, None)
+            return None
+        # The previous zip file is closed when the last reference to it is released.
+        _zip_files[path] = (file_stat, zip_file)
+        return zip_file
+
+
+def split_zip_path(path: str) -> Optional[tuple[str, str]]:
+    """Split a path through a zip file into the zip file path and the member name.
+
+    :param path: The path to split.
+    :return: The zip file path and the member name or None if the path is not in a zip file.
+    """
+    parts: list[str] = []
+    head = path
+    while True:
+        parent, tail = os.path.split(head)
+        if parent == head:
+            return None
+        if tail:
+            parts.append(tail)
+        head = parent
+        try:
+            mode = os.stat(head).st_mode
+        except OSError:
+            continue
+        if stat.S_ISREG(mode):
+            return head, "/".join(reversed(parts))
+        # The deepest existing parent is a directory so the path is not in a zip file.
+        return None
+
+
+def open_resource(path: str) -> BinaryIO:
+    """Open a file in a resource pack for reading in binary mode.
+
+    :param path: The path to a file on disk or a path through a zip file.
+    :return: A readable binary file object.
+    :raises FileNotFoundError: If the file does not exist.
+    """
+    try:
+        return open(path, "rb")
+    except (FileNotFoundError, NotADirectoryError):
+        zip_path = split_zip_path(path)
+        if zip_path is not None:
+            zip_file = get_zip_file(zip_path[0])
+            if zip_file is not None:
+                try:
+                    return zip_file.open(zip_path[1])  # type: ignore
+                except KeyError:
+                    pass
+        raise FileNotFoundError(path) from None
+
+
+def stat_resource(path: str) -> Optional[tuple[int, int]]:
+    """Get the modification time in nanoseconds and size of a file in a resource pack.
+
+    The members of a zip file have the modification time of the zip file.
+
+    :param path: The path to a file on disk or a path through a zip file.
+    :return: (st_mtime_ns, st_size) or None if the file does not exist.
+    """
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        zip_path = split_zip_path(path)
+        if zip_path is None:
+            return None
+        zip_file = get_zip_file(zip_path[0])
+        if zip_file is None:
+            return None
+        try:
+            info = zip_file.getinfo(zip_path[1])
+            file_stat = os.stat(zip_path[0])
+        except (KeyError, OSError):
+            return None
+        return file_stat.st_mtime_ns, info.file_size
+    else:
+        if stat.S_ISDIR(file_stat.st_mode):
+            return None
+        return file_stat.st_mtime_ns, file_stat.st_size
+
+
+def is_resource_file(path: str) -> bool:
+    """Check if a path is a file on disk or a file in a zip file."""
+    return stat_resource(path) is not None
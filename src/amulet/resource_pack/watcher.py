@@ -0,0 +1,337 @@
+"""Watch the resource packs used by a manager and reload them when they change.
+
+On Linux the packs are watched with inotify. Elsewhere, or if inotify is unavailable, the packs are polled.
+Changes are batched and applied with :meth:`BaseResourcePackManager.incremental_reload`
+so only the textures, models and cached meshes that depend on the changed files are invalidated.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import logging
+import threading
+import ctypes
+import ctypes.util
+from typing import Callable, Optional
+
+from amulet.core.block import BlockStack
+from amulet.resource_pack.abc import BaseResourcePackManager
+
+log = logging.getLogger(__name__)
+
+# inotify event masks from sys/inotify.h
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_WatchMask = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+)
+_EventHeader = struct.Struct("iIII")  # wd, mask, cookie, len
+
+ChangeCallbackT = Callable[[set[BlockStack], Optional[set[str]]], None]
+
+
+class _PollingBackend:
+    """Detect changes by comparing the stat of every file and directory in the packs."""
+
+    def __init__(self, poll_interval: float) -> None:
+        self._poll_interval = poll_interval
+        self._paths: list[str] = []
+        self._snapshot: dict[str, tuple[int, int]] = {}
+        self._next_poll = 0.0
+
+    @staticmethod
+    def _take_snapshot(paths: list[str]) -> dict[str, tuple[int, int]]:
+        snapshot: dict[str, tuple[int, int]] = {}
+
+        def scan(path: str) -> None:
+            try:
+                with os.scandir(path) as it:
+                    entries = list(it)
+            except OSError:
+                return
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                if entry.is_dir():
+                    scan(entry.path)
+
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+            if os.path.isdir(path):
+                scan(path)
+        return snapshot
+
+    def sync(self, paths: list[str]) -> None:
+        if paths != self._paths:
+            self._paths = list(paths)
+            self._snapshot = self._take_snapshot(self._paths)
+            self._next_poll = time.monotonic() + self._poll_interval
+
+    def wait(self, timeout: float, stop: threading.Event) -> bool:
+        delay = self._next_poll - time.monotonic()
+        if timeout < delay:
+            stop.wait(timeout)
+            return False
+        if stop.wait(max(0.0, delay)):
+            return False
+        self._next_poll = time.monotonic() + self._poll_interval
+        snapshot = self._take_snapshot(self._paths)
+        changed = snapshot != self._snapshot
+        self._snapshot = snapshot
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class _InotifyBackend:
+    """Detect changes with inotify watches on every directory in the packs.
+    Zip packs are watched through their parent directory."""
+
+    def __init__(self) -> None:
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._add_watch.restype = ctypes.c_int
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        self._rm_watch.restype = ctypes.c_int
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._fd: int = fd
+        self._paths: list[str] = []
+        # Watch descriptor to the watched directory and the names of interest in it.
+        # If the names are None every entry in the directory is of interest.
+        self._watches: dict[int, tuple[str, Optional[set[str]]]] = {}
+
+    def _watch(self, path: str, names: Optional[set[str]] = None) -> Optional[int]:
+        wd: int = self._add_watch(self._fd, os.fsencode(path), _WatchMask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOSPC, errno.ENOMEM):
+                # The watch limit has been reached.
+                raise OSError(error, os.strerror(error))
+            return None
+        watch = self._watches.get(wd)
+        if watch is not None and names is not None and watch[1] is not None:
+            watch[1].update(names)
+        elif watch is None or names is None:
+            self._watches[wd] = (path, names)
+        return wd
+
+    def _watch_tree(self, path: str) -> None:
+        self._watch(path)
+        for dir_path, dir_names, _ in os.walk(path):
+            for dir_name in dir_names:
+                self._watch(os.path.join(dir_path, dir_name))
+
+    def sync(self, paths: list[str]) -> None:
+        if paths == self._paths:
+            return
+        for wd in self._watches:
+            self._rm_watch(self._fd, wd)
+        self._watches.clear()
+        self._paths = list(paths)
+        for path in self._paths:
+            if os.path.isdir(path):
+                self._watch_tree(path)
+            else:
+                # Zip packs are replaced or rewritten in place. Watch the name in the parent directory.
+                parent, name = os.path.split(path)
+                self._watch(parent or ".", {name})
+
+    def wait(self, timeout: float, stop: threading.Event) -> bool:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return False
+        changed = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = _EventHeader.unpack_from(data, offset)
+            offset += _EventHeader.size
+            name = os.fsdecode(data[offset : offset + name_length].rstrip(b"\0"))
+            offset += name_length
+            if mask & _IN_Q_OVERFLOW:
+                changed = True
+                continue
+            if mask & _IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            watch = self._watches.get(wd)
+            if watch is None:
+                continue
+            dir_path, names = watch
+            if names is not None and name not in names:
+                continue
+            changed = True
+            if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                self._watch_tree(os.path.join(dir_path, name))
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class ResourcePackWatcher:
+    """Reload the resource packs of a manager when their files change.
+
+    Events are batched. After the first change the watcher waits until no more changes have arrived for
+    the debounce time, or until the maximum delay has passed, and then reloads the changed files once.
+    """
+
+    def __init__(
+        self,
+        manager: BaseResourcePackManager,
+        callback: Optional[ChangeCallbackT] = None,
+        debounce: float = 0.2,
+        max_delay: float = 2.0,
+        poll_interval: float = 1.0,
+        use_inotify: bool = True,
+    ) -> None:
+        """
+        :param manager: The manager to reload.
+        :param callback: Called on the watcher thread after each batch of changes has been applied.
+            It is given the block stacks whose cached meshes were removed and should be re-meshed
+            and the paths of the textures that were added, removed or modified, or None if every texture may have changed.
+            It is called even if no cached meshes were affected, so that texture changes can be picked up.
+        :param debounce: The number of seconds without changes to wait before applying a batch.
+        :param max_delay: The maximum number of seconds to wait before applying a batch.
+        :param poll_interval: The number of seconds between checks when polling.
+        :param use_inotify: If True use inotify if it is available. If False always poll.
+        """
+        self._manager = manager
+        self._callback = callback
+        self._debounce = debounce
+        self._max_delay = max_delay
+        self._poll_interval = poll_interval
+        self._use_inotify = use_inotify
+        self._backend: Optional[_InotifyBackend | _PollingBackend] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> ResourcePackWatcher:
+        self.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.stop()
+
+    @property
+    def is_running(self) -> bool:
+        """Is the watcher thread running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def uses_inotify(self) -> bool:
+        """Is inotify being used rather than polling."""
+        return isinstance(self._backend, _InotifyBackend)
+
+    def _create_backend(self) -> _InotifyBackend | _PollingBackend:
+        if self._use_inotify:
+            backend: Optional[_InotifyBackend] = None
+            try:
+                backend = _InotifyBackend()
+                backend.sync(self._manager.pack_paths)
+            except Exception:
+                log.warning(
+                    "Could not watch the resource packs with inotify. Polling for changes instead.",
+                    exc_info=True,
+                )
+                if backend is not None:
+                    backend.close()
+            else:
+                return backend
+        polling_backend = _PollingBackend(self._poll_interval)
+        polling_backend.sync(self._manager.pack_paths)
+        return polling_backend
+
+    def start(self) -> None:
+        """Start watching for changes."""
+        if self.is_running:
+            return
+        self._stop.clear()
+        self._backend = self._create_backend()
+        self._thread = threading.Thread(
+            target=self._run, name="ResourcePackWatcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop watching for changes and wait for the watcher thread to exit."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._backend is not None:
+            self._backend.close()
+            self._backend = None
+
+    def _run(self) -> None:
+        backend = self._backend
+        assert backend is not None
+        while not self._stop.is_set():
+            if not backend.wait(0.5, self._stop):
+                continue
+            # Collect changes until they stop arriving.
+            deadline = time.monotonic() + self._max_delay
+            while not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not backend.wait(
+                    min(self._debounce, remaining), self._stop
+                ):
+                    break
+            if self._stop.is_set():
+                break
+            try:
+                affected, changed_textures = self._manager.incremental_reload()
+            except Exception:
+                log.exception("Failed to reload the resource packs")
+                continue
+            try:
+                # Watch any new packs.
+                backend.sync(self._manager.pack_paths)
+            except OSError:
+                log.exception("Failed to watch the resource packs")
+            if self._callback is not None:
+                try:
+                    self._callback(affected, changed_textures)
+                except Exception:
+                    log.exception("Resource pack change callback failed")
@@ -0,0 +1,149 @@
+import io
+import os
+import tempfile
+import threading
+import time
+from typing import Callable
+from unittest import TestCase
+
+from amulet.resource_pack.java import _asset_store
+from amulet.resource_pack.java._asset_store import AssetStore, FileHashT, hash_file
+
+
+def _run_threads(target: Callable[[], None], count: int = 8) -> None:
+    errors: list[BaseException] = []
+
+    def run() -> None:
+        try:
+            target()
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+class AssetStoreTestCase(TestCase):
+    def setUp(self) -> None:
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._store = AssetStore(os.path.join(self._temp_dir.name, "store"))
+        self._files: dict[str, FileHashT] = {}
+        for rel_path, data in (
+            ("pack.mcmeta", b"{}"),
+            ("assets/minecraft/textures/block/stone.png", b"stone"),
+            ("assets/minecraft/textures/block/dirt.png", b"dirt"),
+        ):
+            file_hash = hash_file(io.BytesIO(data))
+            self._store.add_object(file_hash, io.BytesIO(data))
+            self._files[rel_path] = file_hash
+
+    def tearDown(self) -> None:
+        self._temp_dir.cleanup()
+
+    def _check_linked(self, path: str) -> None:
+        self.assertTrue(AssetStore.is_linked(self._files, path))
+        for rel_path, file_hash in self._files.items():
+            with open(os.path.join(path, rel_path), "rb") as f:
+                self.assertEqual(file_hash, hash_file(f))
+
+    def test_concurrent_add_object(self) -> None:
+        data = b"shared" * 1000
+        file_hash = hash_file(io.BytesIO(data))
+        _run_threads(lambda: self._store.add_object(file_hash, io.BytesIO(data)))
+        with open(self._store.object_path(file_hash), "rb") as f:
+            self.assertEqual(data, f.read())
+        self.assertEqual(
+            [], os.listdir(os.path.join(self._temp_dir.name, "store", "temp"))
+        )
+
+    def test_concurrent_set_manifest(self) -> None:
+        _run_threads(lambda: self._store.set_manifest("1.0", self._files))
+        self.assertEqual(self._files, self._store.get_manifest("1.0"))
+        self.assertEqual(["1.0"], self._store.versions)
+        self.assertEqual(
+            ["1.0.json"],
+            os.listdir(os.path.join(self._temp_dir.name, "store", "manifests")),
+        )
+
+    def test_concurrent_link(self) -> None:
+        versions_path = os.path.join(self._temp_dir.name, "versions")
+        path = os.path.join(versions_path, "1.0")
+        _run_threads(lambda: self._store.link(self._files, path))
+        self._check_linked(path)
+        # No temporary directories are left behind.
+        self.assertEqual(["1.0"], os.listdir(versions_path))
+
+    def test_is_linked(self) -> None:
+        path = os.path.join(self._temp_dir.name, "versions", "1.0")
+        self.assertFalse(AssetStore.is_linked(self._files, path))
+        self._store.link(self._files, path)
+        self._check_linked(path)
+        os.remove(os.path.join(path, "assets/minecraft/textures/block/dirt.png"))
+        self.assertFalse(AssetStore.is_linked(self._files, path))
+        # Linking again replaces the directory.
+        self._store.link(self._files, path)
+        self._check_linked(path)
+
+    def test_prune(self) -> None:
+        self._store.set_manifest("1.0", self._files)
+        unused = hash_file(io.BytesIO(b"unused"))
+        self._store.add_object(unused, io.BytesIO(b"unused"))
+        self.assertEqual(1, self._store.prune())
+        self.assertFalse(self._store.has_object(unused))
+        for file_hash in self._files.values():
+            self.assertTrue(self._store.has_object(file_hash))
+
+    def test_prune_while_writing(self) -> None:
+        # The objects of a version being written have no manifest yet.
+        with self._store.writing():
+            self.assertEqual(0, self._store.prune())
+            self._store.set_manifest("1.0", {"pack.mcmeta": self._files["pack.mcmeta"]})
+        for file_hash in self._files.values():
+            self.assertTrue(self._store.has_object(file_hash))
+        self.assertEqual(2, self._store.prune())
+
+    def test_stale_writer(self) -> None:
+        # A writer that did not finish does not stop pruning forever.
+        with self._store.writing():
+            writers_path = os.path.join(self._temp_dir.name, "store", "writers")
+            (writer_name,) = os.listdir(writers_path)
+            writer_path = os.path.join(writers_path, writer_name)
+            os.utime(writer_path, (0, 0))
+            self.assertEqual(3, self._store.prune())
+
+    def test_writer_waits_for_prune(self) -> None:
+        lock_path = os.path.join(self._temp_dir.name, "store", "prune.lock")
+        os.mkdir(lock_path)
+        writing = threading.Event()
+
+        def write() -> None:
+            with self._store.writing():
+                writing.set()
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        try:
+            # A prune that is in progress does not know about the writer so the writer waits.
+            self.assertFalse(writing.wait(0.3))
+            # Another prune does nothing while one is running.
+            self.assertEqual(0, self._store.prune())
+        finally:
+            os.rmdir(lock_path)
+            thread.join()
+        self.assertTrue(writing.is_set())
+
+    def test_stale_prune_lock(self) -> None:
+        lock_path = os.path.join(self._temp_dir.name, "store", "prune.lock")
+        os.mkdir(lock_path)
+        old = time.time() - _asset_store._StalePruneAge - 10
+        os.utime(lock_path, (old, old))
+        # The lock of a prune that did not finish is taken over.
+        self.assertEqual(3, self._store.prune())
+        self.assertFalse(os.path.exists(lock_path))
+        with self._store.writing():
+            pass
@@ -0,0 +1,220 @@
+import os
+import random
+import tempfile
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy
+from PIL import Image
+
+from amulet.resource_pack import atlas as atlas_module
+from amulet.resource_pack.atlas import (
+    TextureAtlas,
+    build_texture_atlas,
+    get_texture_atlas,
+    _SkylinePacker,
+    _MaxCachedAtlases,
+    _prune_cache,
+    _read_atlas,
+    _write_atlas,
+)
+
+
+class SkylinePackerTestCase(TestCase):
+    def _check_placements(
+        self,
+        packer: _SkylinePacker,
+        placements: list[tuple[int, int, int, int]],
+    ) -> None:
+        # Draw every rectangle onto a grid. Each cell must be covered at most once.
+        grid = numpy.zeros((packer.height, packer.width), numpy.uint8)
+        for x, y, width, height in placements:
+            self.assertLessEqual(0, x)
+            self.assertLessEqual(0, y)
+            self.assertLessEqual(x + width, packer.width)
+            self.assertLessEqual(y + height, packer.height)
+            self.assertLessEqual(x + width, packer.used_width)
+            self.assertLessEqual(y + height, packer.used_height)
+            grid[y : y + height, x : x + width] += 1
+        self.assertLessEqual(grid.max(initial=0), 1)
+
+    def test_random(self) -> None:
+        rng = random.Random(0)
+        for size in (16, 64, 256):
+            packer = _SkylinePacker(size, size)
+            placements = []
+            for _ in range(500):
+                width = rng.randint(1, size // 4)
+                height = rng.randint(1, size // 4)
+                position = packer.insert(width, height)
+                if position is not None:
+                    placements.append((*position, width, height))
+            self.assertTrue(placements)
+            self._check_placements(packer, placements)
+
+    def test_full(self) -> None:
+        # Equal squares fill the area exactly.
+        packer = _SkylinePacker(64, 64)
+        placements = []
+        for _ in range(16):
+            position = packer.insert(16, 16)
+            self.assertIsNotNone(position)
+            assert position is not None
+            placements.append((*position, 16, 16))
+        self._check_placements(packer, placements)
+        self.assertIsNone(packer.insert(1, 1))
+        self.assertEqual((64, 64), (packer.used_width, packer.used_height))
+
+    def test_too_large(self) -> None:
+        packer = _SkylinePacker(16, 16)
+        self.assertIsNone(packer.insert(17, 1))
+        self.assertIsNone(packer.insert(1, 17))
+        self.assertEqual((0, 0), packer.insert(16, 16))
+
+
+class BuildTextureAtlasTestCase(TestCase):
+    def test_invalid_options(self) -> None:
+        for max_size, padding in (
+            (0, 0),
+            (48, 0),
+            (16, -1),
+            (16, 8),
+            (16, 9),
+        ):
+            with self.subTest(max_size=max_size, padding=padding):
+                with self.assertRaises(ValueError):
+                    build_texture_atlas([], max_size, padding)
+
+    def test_invalid_cached_options(self) -> None:
+        # The options are checked before the cache is used.
+        with (
+            tempfile.TemporaryDirectory() as temp_dir,
+            patch.dict(os.environ, {"CACHE_DIR": temp_dir}),
+        ):
+            for max_size, padding in ((48, 0), (16, -1), (16, 8)):
+                with self.subTest(max_size=max_size, padding=padding):
+                    with self.assertRaises(ValueError):
+                        get_texture_atlas([], max_size=max_size, padding=padding)
+            self.assertEqual([], os.listdir(temp_dir))
+
+    def test_build(self) -> None:
+        rng = numpy.random.default_rng(0)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            textures = {}
+            for i, (width, height) in enumerate(
+                [(16, 16), (16, 32), (8, 8), (32, 16), (4, 12)] * 4
+            ):
+                path = os.path.join(temp_dir, f"texture_{i}.png")
+                data = rng.integers(0, 256, (height, width, 4), numpy.uint8)
+                Image.fromarray(data, "RGBA").save(path)
+                textures[path] = data
+            # A large texture is downscaled to fit in a page.
+            large_path = os.path.join(temp_dir, "large.png")
+            Image.new("RGBA", (128, 128)).save(large_path)
+
+            atlas = build_texture_atlas(
+                [*textures, large_path], max_size=64, padding=1, max_workers=1
+            )
+
+        self.assertEqual({*textures, large_path}, set(atlas.rects))
+        large_rect = atlas.rects[large_path]
+        self.assertEqual((62, 62), (large_rect.width, large_rect.height))
+        for path, data in textures.items():
+            rect = atlas.rects[path]
+            page = atlas.pages[rect.page]
+            numpy.testing.assert_array_equal(
+                data,
+                page[rect.y : rect.y + rect.height, rect.x : rect.x + rect.width],
+            )
+        # The padded rectangles on each page do not overlap.
+        for page_index, page in enumerate(atlas.pages):
+            grid = numpy.zeros(page.shape[:2], numpy.uint8)
+            for rect in atlas.rects.values():
+                if rect.page == page_index:
+                    grid[
+                        rect.y - 1 : rect.y + rect.height + 1,
+                        rect.x - 1 : rect.x + rect.width + 1,
+                    ] += 1
+            self.assertLessEqual(grid.max(), 1)
+
+
+class AtlasCacheTestCase(TestCase):
+    def _check_atlas(
+        self, texture_path: str, atlas: TextureAtlas, cached: TextureAtlas
+    ) -> None:
+        rect = atlas.rects[texture_path]
+        cached_rect = cached.rects[texture_path]
+        self.assertEqual(
+            (rect.page, rect.x, rect.y, rect.width, rect.height),
+            (
+                cached_rect.page,
+                cached_rect.x,
+                cached_rect.y,
+                cached_rect.width,
+                cached_rect.height,
+            ),
+        )
+        numpy.testing.assert_array_equal(atlas.pages[0], cached.pages[0])
+
+    def test_concurrent_write(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            texture_path = os.path.join(temp_dir, "texture.png")
+            Image.new("RGBA", (16, 16), (1, 2, 3, 4)).save(texture_path)
+            atlas = build_texture_atlas([texture_path], max_size=64)
+            # The cache directory does not exist yet.
+            cache_dir = os.path.join(temp_dir, "cache")
+            path = os.path.join(cache_dir, "key")
+
+            threads = [
+                threading.Thread(target=_write_atlas, args=(path, atlas))
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            # One writer stored the atlas and the others cleaned up after themselves.
+            self.assertEqual(["key"], os.listdir(cache_dir))
+            cached = _read_atlas(path)
+            assert cached is not None
+            self._check_atlas(texture_path, atlas, cached)
+            del cached
+
+    def test_empty_cache_dir(self) -> None:
+        with (
+            tempfile.TemporaryDirectory() as temp_dir,
+            patch.dict(os.environ, {"CACHE_DIR": os.path.join(temp_dir, "cache")}),
+        ):
+            texture_path = os.path.join(temp_dir, "texture.png")
+            Image.new("RGBA", (16, 16), (1, 2, 3, 4)).save(texture_path)
+            atlas = get_texture_atlas([texture_path], max_size=64, max_workers=1)
+            # The second call reads the atlas from the cache.
+            with patch.object(
+                atlas_module,
+                "build_texture_atlas",
+                side_effect=AssertionError("The atlas is cached"),
+            ):
+                cached = get_texture_atlas([texture_path], max_size=64, max_workers=1)
+            self._check_atlas(texture_path, atlas, cached)
+            del cached
+
+    def test_prune(self) -> None:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for i in range(_MaxCachedAtlases + 2):
+                path = os.path.join(cache_dir, f"key_{i}")
+                os.mkdir(path)
+                os.utime(path, (i, i))
+            # An unfinished write is kept. An abandoned one is removed.
+            os.mkdir(os.path.join(cache_dir, "writing.tmp"))
+            abandoned = os.path.join(cache_dir, "abandoned.tmp")
+            os.mkdir(abandoned)
+            os.utime(abandoned, (0, 0))
+
+            _prune_cache(cache_dir)
+
+            self.assertEqual(
+                {"writing.tmp"} | {f"key_{i}" for i in range(2, _MaxCachedAtlases + 2)},
+                set(os.listdir(cache_dir)),
+            )
@@ -0,0 +1,175 @@
+import gc
+from typing import Optional
+from unittest import TestCase
+
+import numpy
+
+from amulet.resource_pack.mesh.block import (
+    BlockMesh,
+    BlockMeshPart,
+    BlockMeshTransparency,
+    get_unit_cube,
+    merge_block_meshes,
+)
+
+
+def _cube(texture: str) -> BlockMesh:
+    return get_unit_cube(
+        texture,
+        texture,
+        texture,
+        texture,
+        texture,
+        texture,
+        BlockMeshTransparency.FullOpaque,
+    )
+
+
+def _part(
+    verts: list[tuple[float, float, float]], triangles: list[tuple[int, int, int, int]]
+) -> BlockMeshPart:
+    vertex_array = numpy.zeros((len(verts), 8), numpy.float32)
+    vertex_array[:, :3] = verts
+    return BlockMeshPart(vertex_array, numpy.array(triangles, numpy.uint32))
+
+
+def _mesh(textures: list[str], part: Optional[BlockMeshPart]) -> BlockMesh:
+    return BlockMesh(
+        BlockMeshTransparency.Partial,
+        textures,
+        (part, None, None, None, None, None, None),
+    )
+
+
+class MergeBlockMeshesTestCase(TestCase):
+    def _check_merged(self, merged: BlockMesh, textures: list[str]) -> None:
+        gc.collect()
+        self.assertEqual(textures, merged.textures)
+        cube = _cube("a")
+        for part, cube_part in zip(merged.parts, cube.parts):
+            if cube_part is None:
+                self.assertIsNone(part)
+                continue
+            assert part is not None
+            vertex_count = len(cube_part.verts)
+            self.assertEqual(len(textures) * vertex_count, len(part.verts))
+            self.assertEqual(
+                len(textures) * len(cube_part.triangles), len(part.triangles)
+            )
+            # Each merged cube references its own vertices and texture.
+            for triangle_index, triangle in enumerate(part.triangles):
+                mesh_index = triangle_index // len(cube_part.triangles)
+                self.assertEqual(mesh_index, triangle.texture_index)
+                for vert_index in (
+                    triangle.vert_index_a,
+                    triangle.vert_index_b,
+                    triangle.vert_index_c,
+                ):
+                    self.assertEqual(mesh_index, vert_index // vertex_count)
+
+    def test_merge_temporaries(self) -> None:
+        # The meshes are only referenced by the list.
+        textures = [f"texture_{i}" for i in range(20)]
+        self._check_merged(
+            merge_block_meshes([_cube(texture) for texture in textures]), textures
+        )
+
+    def test_merge_sequence(self) -> None:
+        # Each mesh is created when it is indexed and is not referenced anywhere else.
+        class CubeSequence:
+            def __len__(self) -> int:
+                return 5
+
+            def __getitem__(self, index: int) -> BlockMesh:
+                if index >= 5:
+                    raise IndexError
+                return _cube(f"texture_{index}")
+
+        self._check_merged(
+            merge_block_meshes(CubeSequence()),  # type: ignore
+            [f"texture_{i}" for i in range(5)],
+        )
+
+    def test_merge_empty(self) -> None:
+        merged = merge_block_meshes([])
+        self.assertEqual([], merged.textures)
+        self.assertEqual((None,) * 7, tuple(merged.parts))
+
+
+class DeduplicateTestCase(TestCase):
+    def test_weld(self) -> None:
+        # A quad stored as two triangles with their own vertices.
+        part = _part(
+            [(0, 0, 0), (1, 0, 0), (1, 1, 0), (1, 1, 0), (0, 1, 0), (0, 0, 0)],
+            [(0, 1, 2, 0), (3, 4, 5, 0)],
+        ).deduplicate()
+        numpy.testing.assert_array_equal(
+            [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], part.vertex_array[:, :3]
+        )
+        numpy.testing.assert_array_equal(
+            [[0, 1, 2, 0], [2, 3, 0, 0]], part.triangle_array
+        )
+
+    def test_negative_zero(self) -> None:
+        # -0.0 and 0.0 are the same position.
+        part = _part(
+            [(0, 0, 0), (1, 0, 0), (0, 1, 0), (-0.0, -0.0, -0.0)],
+            [(0, 1, 2, 0), (3, 2, 1, 0)],
+        ).deduplicate()
+        self.assertEqual(3, len(part.verts))
+        numpy.testing.assert_array_equal(
+            [[0, 1, 2, 0], [0, 2, 1, 0]], part.triangle_array
+        )
+
+    def test_degenerate(self) -> None:
+        # The second triangle has no area once its vertices are welded. The unused vertex is removed.
+        part = _part(
+            [(0, 0, 0), (1, 0, 0), (0, 1, 0), (1, 0, 0), (5, 5, 5)],
+            [(0, 1, 2, 0), (0, 1, 3, 0)],
+        ).deduplicate()
+        self.assertEqual(3, len(part.verts))
+        numpy.testing.assert_array_equal([[0, 1, 2, 0]], part.triangle_array)
+
+    def test_textures(self) -> None:
+        mesh = _mesh(
+            ["a", "unused", "a", "b"],
+            _part(
+                [(0, 0, 0), (1, 0, 0), (0, 1, 0)],
+                [(0, 1, 2, 3), (0, 1, 2, 2), (2, 1, 0, 0)],
+            ),
+        ).deduplicate()
+        # Unused textures are removed and duplicate paths share one index.
+        self.assertEqual(["b", "a"], mesh.textures)
+        part = mesh.parts[0]
+        assert part is not None
+        self.assertEqual([0, 1, 1], [t.texture_index for t in part.triangles])
+
+    def test_empty_part(self) -> None:
+        # A part with only degenerate triangles is removed along with its textures.
+        mesh = _mesh(["a"], _part([(0, 0, 0), (0, 0, 0)], [(0, 1, 1, 0)])).deduplicate()
+        self.assertEqual((None,) * 7, tuple(mesh.parts))
+        self.assertEqual([], mesh.textures)
+
+    def test_invalid_texture_index(self) -> None:
+        with self.assertRaises(ValueError):
+            _mesh(
+                [], _part([(0, 0, 0), (1, 0, 0), (0, 1, 0)], [(0, 1, 2, 0)])
+            ).deduplicate()
+
+
+class IndexArrayTestCase(TestCase):
+    def _check(self, vertex_count: int, dtype: type) -> None:
+        part = BlockMeshPart(
+            numpy.zeros((vertex_count, 8), numpy.float32),
+            numpy.array([[0, 1, vertex_count - 1, 0]], numpy.uint32),
+        )
+        index_array = part.get_index_array()
+        self.assertEqual(dtype, index_array.dtype)
+        numpy.testing.assert_array_equal([[0, 1, vertex_count - 1]], index_array)
+
+    def test_uint16(self) -> None:
+        # Every index of 65536 vertices fits in 16 bits.
+        self._check(65536, numpy.uint16)
+
+    def test_uint32(self) -> None:
+        self._check(65537, numpy.uint32)
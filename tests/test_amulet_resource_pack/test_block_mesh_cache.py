@@ -0,0 +1,170 @@
+import threading
+from unittest import TestCase
+
+from amulet.core.block import Block, BlockStack
+from amulet.core.version import VersionNumber
+
+from amulet.resource_pack.block_mesh_cache import BlockMeshCache
+from amulet.resource_pack.mesh.block import (
+    BlockMesh,
+    BlockMeshTransparency,
+    get_unit_cube,
+)
+
+
+def _stack(base_name: str) -> BlockStack:
+    return BlockStack(Block("java", VersionNumber(3578), "minecraft", base_name))
+
+
+def _empty_mesh() -> BlockMesh:
+    return BlockMesh(BlockMeshTransparency.Partial, [], (None,) * 7)
+
+
+def _cube_mesh() -> BlockMesh:
+    return get_unit_cube("a", "b", "c", "d", "e", "f", BlockMeshTransparency.FullOpaque)
+
+
+class BlockMeshCacheTestCase(TestCase):
+    def test_unbounded(self) -> None:
+        cache = BlockMeshCache()
+        for i in range(100):
+            cache.put(_stack(f"block_{i}"), _empty_mesh())
+        self.assertEqual(100, len(cache))
+        self.assertEqual(100 * _empty_mesh().memory_usage(), cache.memory)
+        self.assertEqual(0, cache.evictions)
+
+    def test_shared_mesh(self) -> None:
+        # A mesh stored for several block stacks is counted once.
+        cache = BlockMeshCache()
+        shared = _cube_mesh()
+        size = shared.memory_usage()
+        a, b, c = map(_stack, "abc")
+        cache.put(a, shared)
+        cache.put(b, shared)
+        cache.put(c, shared)
+        self.assertEqual(size, cache.memory)
+        # Replacing an entry with the same mesh does not change the memory.
+        cache.put(a, shared)
+        self.assertEqual(size, cache.memory)
+        cache.discard(a)
+        cache.discard(b)
+        self.assertEqual(size, cache.memory)
+        other = _empty_mesh()
+        cache.put(c, other)
+        self.assertEqual(other.memory_usage(), cache.memory)
+
+        # Evicting an entry that shares its mesh does not free any memory
+        # so the other entries using the mesh are evicted too.
+        cache = BlockMeshCache(max_memory=size + other.memory_usage())
+        cache.put(a, shared)
+        cache.put(b, shared)
+        cache.put(c, other)
+        self.assertEqual([a, b, c], cache.keys())
+        cache.max_memory = size
+        self.assertEqual([c], cache.keys())
+        self.assertEqual(other.memory_usage(), cache.memory)
+        self.assertEqual(2, cache.evictions)
+
+    def test_eviction_order(self) -> None:
+        cache = BlockMeshCache(max_entries=3)
+        a, b, c, d, e = map(_stack, "abcde")
+        mesh = _empty_mesh()
+        cache.put(a, mesh)
+        cache.put(b, mesh)
+        cache.put(c, mesh)
+        # Using a makes b the least recently used.
+        self.assertIs(mesh, cache.get(a))
+        cache.put(d, mesh)
+        self.assertEqual([c, a, d], cache.keys())
+        # Replacing an entry makes it the most recently used.
+        cache.put(c, mesh)
+        cache.put(e, mesh)
+        self.assertEqual([d, c, e], cache.keys())
+        self.assertEqual(2, cache.evictions)
+        self.assertIsNone(cache.get(b))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+        # Lowering the bound evicts straight away.
+        cache.max_entries = 1
+        self.assertEqual([e], cache.keys())
+        self.assertEqual(4, cache.evictions)
+
+    def test_memory_budget(self) -> None:
+        small_size = _empty_mesh().memory_usage()
+        large_size = _cube_mesh().memory_usage()
+        self.assertLess(small_size, large_size)
+
+        cache = BlockMeshCache(max_memory=3 * small_size)
+        a, b, c, d = map(_stack, "abcd")
+        cache.put(a, _empty_mesh())
+        cache.put(b, _empty_mesh())
+        cache.put(c, _empty_mesh())
+        self.assertEqual(3 * small_size, cache.memory)
+        self.assertEqual(0, cache.evictions)
+        cache.put(d, _empty_mesh())
+        self.assertEqual([b, c, d], cache.keys())
+        self.assertEqual(3 * small_size, cache.memory)
+
+        # A mesh larger than the whole budget evicts everything including itself.
+        cache.max_memory = large_size - 1
+        cache.put(a, _cube_mesh())
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.memory)
+
+        # A mesh that fits evicts only as much as it needs.
+        cache.max_memory = large_size + small_size
+        cache.put(b, _empty_mesh())
+        cache.put(c, _empty_mesh())
+        cache.put(a, _cube_mesh())
+        self.assertEqual([c, a], cache.keys())
+        self.assertEqual(large_size + small_size, cache.memory)
+
+    def test_discard_key_set(self) -> None:
+        cache = BlockMeshCache()
+        stacks = [_stack(f"block_{i}") for i in range(10)]
+        for stack in stacks:
+            cache.put(stack, _empty_mesh())
+        stale = set(stacks[::3])
+        for stack in stale:
+            cache.discard(stack)
+        # Discarding a stack that is not stored does nothing.
+        cache.discard(_stack("not_stored"))
+        self.assertEqual(
+            [stack for stack in stacks if stack not in stale], cache.keys()
+        )
+        for stack in stacks:
+            self.assertEqual(stack not in stale, stack in cache)
+        self.assertEqual(len(cache) * _empty_mesh().memory_usage(), cache.memory)
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.memory)
+
+    def test_threads(self) -> None:
+        size = _empty_mesh().memory_usage()
+        cache = BlockMeshCache(max_entries=50, max_memory=40 * size)
+        stacks = [_stack(f"block_{i}") for i in range(200)]
+        meshes = {stack: _empty_mesh() for stack in stacks}
+        errors: list[BaseException] = []
+
+        def work(offset: int) -> None:
+            try:
+                for i in range(2000):
+                    stack = stacks[(i * 7 + offset) % len(stacks)]
+                    if i % 5 == 0:
+                        cache.discard(stack)
+                    elif cache.get(stack) is None:
+                        cache.put(stack, meshes[stack])
+            except BaseException as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        self.assertLessEqual(len(cache), 40)
+        self.assertEqual(len(cache) * size, cache.memory)
+        self.assertEqual(len(cache.keys()), len(set(cache.keys())))
@@ -0,0 +1,177 @@
+import itertools
+from collections.abc import Mapping
+from typing import Any, Union
+from unittest import TestCase
+
+from amulet.nbt import IntTag, StringTag
+from amulet.core.block import Block
+
+from amulet.resource_pack.java._blockstate import (
+    MultipartBlockstate,
+    VariantBlockstate,
+    compile_blockstate,
+    get_py_data,
+    _PropertiesPattern,
+)
+
+PropertiesT = Mapping[str, Block.PropertyValue]
+
+
+def match_variants_reference(
+    variants: dict[str, Any], properties: PropertiesT
+) -> tuple[Any, ...]:
+    """The matching done before the blockstates were compiled.
+
+    The old code loaded the first matching variant and fell through to the next match if loading failed,
+    so all matches are returned in file order.
+    """
+    matches = []
+    for variant, value in variants.items():
+        if variant == "" or all(
+            get_py_data(
+                properties.get(match.group("name"), StringTag(match.group("value")))
+            )
+            == match.group("value")
+            for match in _PropertiesPattern.finditer(f",{variant}")
+        ):
+            matches.append(value)
+    return tuple(matches)
+
+
+def _parse_state_val(val: Union[str, bool]) -> list:
+    if isinstance(val, str):
+        return [StringTag(v) for v in val.split("|")]
+    elif isinstance(val, bool):
+        return [StringTag("true") if val else StringTag("false")]
+    else:
+        raise Exception(f"Could not parse state val {val}")
+
+
+def match_multipart_reference(
+    multipart: list[dict], properties: PropertiesT
+) -> tuple[Any, ...]:
+    """The matching done before the blockstates were compiled."""
+    matches = []
+    for case in multipart:
+        if "when" in case:
+            if "OR" in case["when"]:
+                if not any(
+                    all(
+                        properties.get(prop, None) in _parse_state_val(val)
+                        for prop, val in prop_match.items()
+                    )
+                    for prop_match in case["when"]["OR"]
+                ):
+                    continue
+            elif "AND" in case["when"]:
+                if not all(
+                    all(
+                        properties.get(prop, None) in _parse_state_val(val)
+                        for prop, val in prop_match.items()
+                    )
+                    for prop_match in case["when"]["AND"]
+                ):
+                    continue
+            elif not all(
+                properties.get(prop, None) in _parse_state_val(val)
+                for prop, val in case["when"].items()
+            ):
+                continue
+        if "apply" in case:
+            matches.append(case["apply"])
+    return tuple(matches)
+
+
+def _properties(**kwargs: str) -> dict[str, Block.PropertyValue]:
+    return {name: StringTag(value) for name, value in kwargs.items()}
+
+
+# Property sets to match against every blockstate. Includes missing, extra and unknown values.
+PropertySets: list[dict[str, Block.PropertyValue]] = [
+    {},
+    {"power": IntTag(1)},
+    {"axis": StringTag("x"), "power": IntTag(15)},
+] + [
+    _properties(**dict(zip(names, values)))
+    for names, choices in (
+        (("facing",), ("north", "south", "east")),
+        (("facing", "half"), ("north", "south", "top", "bottom")),
+        (("facing", "half", "waterlogged"), ("north", "top", "true", "false")),
+        (("half",), ("top", "bottom", "tall")),
+        (("north", "east", "up"), ("side", "up", "none", "true")),
+        (("north", "east", "south", "west", "up"), ("side", "none", "true")),
+        (("up", "waterlogged"), ("true", "false")),
+    )
+    for values in itertools.product(choices, repeat=len(names))
+]
+
+VariantTables: list[dict[str, Any]] = [
+    {"": {"model": "block/stone"}},
+    {"facing=north": "n", "facing=south": "s"},
+    # Variants that do not define every property.
+    {"facing=north,half=top": "nt", "facing=north": "n", "half=bottom": "b", "": "any"},
+    # Duplicate keys after reordering.
+    {"half=top,facing=north": "tn", "facing=north,half=top": "nt"},
+    # Every combination defined so the table is built up front.
+    {
+        f"facing={facing},half={half}": f"{facing}_{half}"
+        for facing in ("north", "south")
+        for half in ("top", "bottom")
+    },
+    {"facing=north,half=top,waterlogged=true": "w", "facing=north": "n"},
+]
+
+MultipartTables: list[list[dict]] = [
+    [{"apply": "always"}],
+    [{"when": {"north": "side|up"}, "apply": "north"}],
+    [
+        {"apply": "post"},
+        {"when": {"north": "side"}, "apply": "north_side"},
+        {"when": {"north": "up", "up": "true"}, "apply": "north_up"},
+        {"when": {"up": True}, "apply": "up_true"},
+        {"when": {"waterlogged": False}, "apply": "dry"},
+    ],
+    [
+        {
+            "when": {"OR": [{"north": "none", "east": "none"}, {"up": "true"}]},
+            "apply": "or",
+        },
+        {"when": {"AND": [{"north": "side|up"}, {"east": "side"}]}, "apply": "and"},
+        {"when": {"AND": [{"north": "side"}, {"north": "up"}]}, "apply": "never"},
+        {"when": {"OR": []}, "apply": "empty_or"},
+        {"when": {"AND": []}, "apply": "empty_and"},
+        {"when": {}, "apply": "empty_when"},
+    ],
+    # Cases without an apply are skipped.
+    [{"when": {"north": "side"}}, {"apply": "last"}],
+]
+
+
+class BlockstateTestCase(TestCase):
+    def test_variants(self) -> None:
+        for variants in VariantTables:
+            compiled = VariantBlockstate(variants)
+            for properties in PropertySets:
+                with self.subTest(variants=variants, properties=properties):
+                    expected = match_variants_reference(variants, properties)
+                    self.assertEqual(expected, compiled.match(properties))
+                    # The second lookup is served from the lookup table.
+                    self.assertEqual(expected, compiled.match(properties))
+
+    def test_multipart(self) -> None:
+        for multipart in MultipartTables:
+            compiled = MultipartBlockstate(multipart)
+            for properties in PropertySets:
+                with self.subTest(multipart=multipart, properties=properties):
+                    expected = match_multipart_reference(multipart, properties)
+                    self.assertEqual(expected, compiled.match(properties))
+                    self.assertEqual(expected, compiled.match(properties))
+
+    def test_compile_blockstate(self) -> None:
+        self.assertIsInstance(
+            compile_blockstate({"variants": {"": "a"}}), VariantBlockstate
+        )
+        self.assertIsInstance(
+            compile_blockstate({"multipart": [{"apply": "a"}]}), MultipartBlockstate
+        )
+        self.assertIsNone(compile_blockstate({}))
@@ -0,0 +1,346 @@
+import hashlib
+import io
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from unittest import TestCase
+from unittest.mock import patch
+
+from amulet.resource_pack.java import download_resources
+from amulet.resource_pack.java._asset_store import hash_file
+from amulet.resource_pack.java.download_resources import _download_with_retry
+
+_Payload = random.Random(0).randbytes(300_001)
+_PayloadHash = hashlib.sha256(_Payload).hexdigest()
+_PartSize = 64 * 1024
+
+
+class _Server(ThreadingHTTPServer):
+    # Does the server support ranged requests.
+    ranged = True
+    # Does the server send the Content-Length header for whole file responses.
+    send_length = True
+    # The number of responses to cut off half way through.
+    interruptions = 0
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.lock = threading.Lock()
+        # The (start, stop) byte range of each ranged request. stop is exclusive.
+        self.ranges: list[tuple[int, int]] = []
+        self.full_requests = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/client.jar"
+
+    def interrupt(self) -> bool:
+        with self.lock:
+            if self.interruptions:
+                self.interruptions -= 1
+                return True
+            return False
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: _Server
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        server = self.server
+        range_header = self.headers.get("Range")
+        match = range_header and re.fullmatch(r"bytes=(\d+)-(\d*)", range_header)
+        if server.ranged and match:
+            start = int(match.group(1))
+            stop = int(match.group(2)) + 1 if match.group(2) else len(_Payload)
+            stop = min(stop, len(_Payload))
+            with server.lock:
+                server.ranges.append((start, stop))
+            body = _Payload[start:stop]
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{stop - 1}/{len(_Payload)}"
+            )
+            self.send_header("Content-Length", str(len(body)))
+        else:
+            with server.lock:
+                server.full_requests += 1
+            body = _Payload
+            self.send_response(200)
+            if server.send_length:
+                self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if len(body) > 1 and server.interrupt():
+            # Drop the connection part way through the body.
+            self.wfile.write(body[: len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+class DownloadWithRetryTestCase(TestCase):
+    def setUp(self) -> None:
+        self._server = _Server()
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._temp_dir.name, "client.jar")
+        part_size = patch.object(download_resources, "DOWNLOAD_PART_SIZE", _PartSize)
+        part_size.start()
+        self.addCleanup(part_size.stop)
+
+    def tearDown(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._temp_dir.cleanup()
+
+    def _download(self, max_workers: Optional[int] = 4) -> None:
+        _download_with_retry(self._server.url, self._path, max_workers=max_workers)
+        with open(self._path, "rb") as f:
+            self.assertEqual(_PayloadHash, hashlib.sha256(f.read()).hexdigest())
+
+    def _part_ranges(self) -> list[tuple[int, int]]:
+        # Exclude the request used to find the size.
+        return sorted(r for r in self._server.ranges if r != (0, 1))
+
+    def test_ranged(self) -> None:
+        self._download()
+        expected_parts = [
+            (start, min(start + _PartSize, len(_Payload)))
+            for start in range(0, len(_Payload), _PartSize)
+        ]
+        self.assertEqual(expected_parts, self._part_ranges())
+        self.assertEqual(0, self._server.full_requests)
+
+    def test_ranged_serial(self) -> None:
+        self._download(max_workers=1)
+        self.assertEqual(5, len(self._part_ranges()))
+
+    def test_resume_interrupted_part(self) -> None:
+        self._server.interruptions = 2
+        self._download()
+        part_ranges = self._part_ranges()
+        part_starts = set(range(0, len(_Payload), _PartSize))
+        # Each interrupted part is resumed from the last byte received rather than restarted.
+        resumed = [r for r in part_ranges if r[0] not in part_starts]
+        self.assertEqual(2, len(resumed))
+        self.assertEqual(len(part_starts) + 2, len(part_ranges))
+        self.assertEqual(0, self._server.full_requests)
+
+    def test_not_ranged(self) -> None:
+        self._server.ranged = False
+        self._download()
+        self.assertEqual([], self._server.ranges)
+        # The size request and the download.
+        self.assertEqual(2, self._server.full_requests)
+
+    def test_no_content_length(self) -> None:
+        self._server.ranged = False
+        self._server.send_length = False
+        self._download()
+        self.assertEqual(2, self._server.full_requests)
+
+    def test_not_ranged_retry(self) -> None:
+        # Without ranged requests an interrupted download restarts from the beginning.
+        self._server.ranged = False
+        self._server.interruptions = 2
+        # Skip the size request so that only the downloads are interrupted.
+        with patch.object(
+            download_resources,
+            "_get_download_size",
+            return_value=(len(_Payload), False),
+        ):
+            self._download()
+        self.assertEqual(3, self._server.full_requests)
+
+    def test_progress(self) -> None:
+        # The real progress managers are compiled classes so record the calls with a stand in.
+        class Progress:
+            def __init__(self) -> None:
+                self.values: list[float] = []
+
+            def update_progress(self, progress: float) -> None:
+                self.values.append(progress)
+
+        for ranged in (True, False):
+            with self.subTest(ranged=ranged):
+                self._server.ranged = ranged
+                self._server.interruptions = 1
+                progress = Progress()
+                _download_with_retry(
+                    self._server.url,
+                    self._path,
+                    progress_manager=progress,  # type: ignore
+                )
+                self.assertEqual(1.0, progress.values[-1])
+                # An interrupted ranged part resumes so the progress never goes backwards.
+                if ranged:
+                    self.assertEqual(sorted(progress.values), progress.values)
+
+    def test_failure(self) -> None:
+        self._server.interruptions = 100
+        with self.assertRaises(RuntimeError):
+            _download_with_retry(self._server.url, self._path, attempts=3)
+
+
+class GetVersionTestCase(TestCase):
+    def setUp(self) -> None:
+        self._temp_dir = tempfile.TemporaryDirectory()
+        cache_dir = patch.dict(os.environ, {"CACHE_DIR": self._temp_dir.name})
+        cache_dir.start()
+        self.addCleanup(cache_dir.stop)
+        # Store a version so that nothing needs to be downloaded.
+        store = download_resources.get_asset_store()
+        self._files = {}
+        for rel_path, data in (
+            ("pack.mcmeta", b'{"pack": {"pack_format": 15}}'),
+            ("assets/minecraft/textures/block/stone.png", b"stone"),
+        ):
+            file_hash = hash_file(io.BytesIO(data))
+            store.add_object(file_hash, io.BytesIO(data))
+            self._files[rel_path] = file_hash
+        store.set_manifest("1.0", self._files)
+        self._legacy_path = os.path.join(download_resources._get_java_path(), "vanilla")
+        os.makedirs(self._legacy_path)
+
+    def tearDown(self) -> None:
+        self._temp_dir.cleanup()
+
+    def test_relink_missing_file(self) -> None:
+        download_resources.get_version("1.0")
+        path = download_resources.get_version_path("1.0")
+        texture_path = os.path.join(path, "assets/minecraft/textures/block/stone.png")
+        os.remove(texture_path)
+        with patch.object(
+            download_resources,
+            "_download_resources",
+            side_effect=AssertionError("The version is stored"),
+        ):
+            download_resources.get_version("1.0")
+        with open(texture_path, "rb") as f:
+            self.assertEqual(b"stone", f.read())
+
+    def test_unique_jar_path(self) -> None:
+        # Concurrent downloads of the same version spool the client jar to different files.
+        barrier = threading.Barrier(2, timeout=5)
+        jar_paths = []
+
+        def download(url: str, path: str, **kwargs: Any) -> None:
+            jar_paths.append(path)
+            barrier.wait()
+            with zipfile.ZipFile(path, "w") as client:
+                client.writestr("assets/minecraft/textures/block/stone.png", b"stone")
+
+        with (
+            patch.object(
+                download_resources,
+                "_get_version_manifest",
+                return_value={"downloads": {"client": {"url": "client.jar"}}},
+            ),
+            patch.object(download_resources, "_download_with_retry", download),
+        ):
+            store = download_resources.get_asset_store()
+            threads = [
+                threading.Thread(
+                    target=download_resources._download_resources, args=(store, "2.0")
+                )
+                for _ in range(2)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(2, len(set(jar_paths)))
+        versions_path = os.path.dirname(download_resources.get_version_path("2.0"))
+        for jar_path in jar_paths:
+            self.assertEqual(versions_path, os.path.dirname(jar_path))
+            self.assertFalse(os.path.exists(jar_path))
+
+    def test_latest_removes_legacy(self) -> None:
+        with patch.object(
+            download_resources,
+            "get_launcher_manifest",
+            return_value={"latest": {"release": "1.0"}},
+        ):
+            download_resources.get_latest()
+        self.assertFalse(os.path.exists(self._legacy_path))
+
+    def test_latest_keeps_legacy(self) -> None:
+        # The legacy directory is kept if the latest version is not confirmed online.
+        with open(download_resources._get_latest_version_path(), "w") as f:
+            f.write("1.0")
+        with (
+            patch.object(
+                download_resources,
+                "get_launcher_manifest",
+                side_effect=ConnectionError("offline"),
+            ),
+            self.assertLogs(download_resources.log, "ERROR"),
+        ):
+            download_resources.get_latest()
+        self.assertTrue(os.path.isdir(self._legacy_path))
+
+        with (
+            patch.object(download_resources, "OFFLINE", True),
+            patch.object(
+                download_resources,
+                "get_launcher_manifest",
+                return_value={"latest": {"release": "1.0"}},
+            ),
+        ):
+            download_resources.get_latest()
+        self.assertTrue(os.path.isdir(self._legacy_path))
+
+        # A version that fails to download does not remove it.
+        with (
+            patch.object(
+                download_resources,
+                "get_launcher_manifest",
+                return_value={"latest": {"release": "2.0"}},
+            ),
+            patch.object(
+                download_resources,
+                "_download_resources",
+                side_effect=ConnectionError("failed"),
+            ),
+            self.assertRaises(ConnectionError),
+        ):
+            download_resources.get_latest()
+        self.assertTrue(os.path.isdir(self._legacy_path))
+
+    def test_latest_legacy_fallback(self) -> None:
+        # Without a stored latest version the legacy pack is used when the manifest cannot be downloaded.
+        with open(os.path.join(self._legacy_path, "version"), "w") as f:
+            f.write("0.9")
+        with (
+            patch.object(
+                download_resources,
+                "get_launcher_manifest",
+                side_effect=ConnectionError("offline"),
+            ),
+            self.assertLogs(download_resources.log, "ERROR"),
+        ):
+            resource_pack = download_resources.get_latest()
+        self.assertEqual(self._legacy_path, resource_pack.root_dir)
+
+        # With neither the error is raised.
+        shutil.rmtree(self._legacy_path)
+        with (
+            patch.object(
+                download_resources,
+                "get_launcher_manifest",
+                side_effect=ConnectionError("offline"),
+            ),
+            self.assertRaises(ConnectionError),
+        ):
+            download_resources.get_latest()
@@ -0,0 +1,295 @@
+import json
+import os
+import tempfile
+import threading
+from typing import Any
+from unittest import TestCase
+from unittest.mock import patch
+
+from PIL import Image
+
+from amulet.core.block import Block, BlockStack
+from amulet.core.version import VersionNumber
+from amulet.resource_pack import JavaResourcePack, JavaResourcePackManager
+from amulet.resource_pack.java import _pack_index
+from amulet.resource_pack.mesh.block import BlockMeshTransparency
+
+
+def _write(pack_dir: str, rel_path: str, data: Any) -> None:
+    path = os.path.join(pack_dir, *rel_path.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if rel_path.endswith(".png"):
+        Image.new("RGBA", (16, 16), data).save(path)
+    else:
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+
+def _edit(pack_dir: str, rel_path: str, data: Any) -> None:
+    """Rewrite a file and make sure its modification time changes."""
+    path = os.path.join(pack_dir, *rel_path.split("/"))
+    mtime = os.stat(path).st_mtime_ns
+    _write(pack_dir, rel_path, data)
+    os.utime(path, ns=(mtime + 1_000_000_000, mtime + 1_000_000_000))
+
+
+def _cube_model(texture: str, height: int = 16) -> dict:
+    return {
+        "textures": {"all": texture},
+        "elements": [
+            {
+                "from": [0, 0, 0],
+                "to": [16, height, 16],
+                "faces": {
+                    face: {"texture": "#all"}
+                    for face in ("down", "up", "north", "south", "east", "west")
+                },
+            }
+        ],
+    }
+
+
+def _write_pack(pack_dir: str, texture: str) -> None:
+    _write(pack_dir, "pack.mcmeta", {"pack": {"pack_format": 15}})
+    _write(pack_dir, f"assets/minecraft/textures/block/{texture}.png", (1, 2, 3, 255))
+    _write(
+        pack_dir,
+        "assets/minecraft/blockstates/stone.json",
+        {"variants": {"": {"model": "block/stone"}}},
+    )
+    _write(
+        pack_dir,
+        "assets/minecraft/models/block/stone.json",
+        _cube_model(f"block/{texture}"),
+    )
+
+
+def _block_stack(base_name: str) -> BlockStack:
+    return BlockStack(Block("java", VersionNumber(3578), "minecraft", base_name))
+
+
+_Stone = _block_stack("stone")
+_Dirt = _block_stack("dirt")
+_Log = _block_stack("log")
+
+
+class ResourcePackManagerReloadTestCase(TestCase):
+    def setUp(self) -> None:
+        self._temp_dir = tempfile.TemporaryDirectory()
+        cache_dir = patch.dict(
+            os.environ, {"CACHE_DIR": os.path.join(self._temp_dir.name, "cache")}
+        )
+        cache_dir.start()
+        self.addCleanup(cache_dir.stop)
+        self._pack_dir = os.path.join(self._temp_dir.name, "pack")
+        _write_pack(self._pack_dir, "old")
+
+    def tearDown(self) -> None:
+        self._temp_dir.cleanup()
+
+    def _texture(self, manager: JavaResourcePackManager) -> str:
+        textures = manager.get_block_model(_Stone).textures
+        self.assertEqual(1, len(textures))
+        return os.path.basename(textures[0])
+
+    def test_reload_keeps_settings(self) -> None:
+        manager = JavaResourcePackManager(
+            JavaResourcePack(self._pack_dir), "lazy", max_workers=1
+        )
+        missing_block = manager.missing_block
+        self.assertEqual("old.png", self._texture(manager))
+        _write_pack(self._pack_dir, "new")
+        manager.reload()
+        self.assertEqual("new.png", self._texture(manager))
+        self.assertTrue(manager._lazy)
+        self.assertEqual(1, manager._max_workers)
+        self.assertIs(missing_block, manager.missing_block)
+
+    def test_reload_is_atomic(self) -> None:
+        manager = JavaResourcePackManager(JavaResourcePack(self._pack_dir))
+        self.assertEqual("old.png", self._texture(manager))
+        _write_pack(self._pack_dir, "new")
+
+        # Lookups during a reload see the old resources until the new resources are swapped in.
+        loading = threading.Event()
+        resume = threading.Event()
+        scan_texture_transparency = _pack_index.scan_texture_transparency
+
+        def blocking_scan(*args: Any) -> Any:
+            loading.set()
+            resume.wait()
+            return scan_texture_transparency(*args)
+
+        with patch.object(_pack_index, "scan_texture_transparency", blocking_scan):
+            reload_thread = threading.Thread(target=manager.reload)
+            reload_thread.start()
+            try:
+                self.assertTrue(loading.wait(5))
+                self.assertEqual("old.png", self._texture(manager))
+            finally:
+                resume.set()
+                reload_thread.join()
+        self.assertEqual("new.png", self._texture(manager))
+
+    def test_failed_reload(self) -> None:
+        manager = JavaResourcePackManager(JavaResourcePack(self._pack_dir))
+        self.assertEqual("old.png", self._texture(manager))
+
+        failing_scan = patch.object(
+            _pack_index,
+            "scan_texture_transparency",
+            side_effect=RuntimeError("reload failed"),
+        )
+
+        # A loaded manager keeps its resources if a reload fails.
+        _write_pack(self._pack_dir, "new")
+        with failing_scan:
+            with self.assertRaises(RuntimeError):
+                manager.reload()
+            with self.assertRaises(RuntimeError):
+                manager.reload_async().result(5)
+        self.assertEqual("old.png", self._texture(manager))
+
+        # Lookups on a manager that has nothing loaded raise the exception.
+        unloaded = JavaResourcePackManager(JavaResourcePack(self._pack_dir), False)
+        with failing_scan:
+            reload = unloaded.reload_async()
+            with self.assertRaises(RuntimeError):
+                reload.result(5)
+        with self.assertRaises(RuntimeError):
+            unloaded.get_block_model(_Stone)
+        with self.assertRaises(RuntimeError):
+            unloaded.get_texture_path("minecraft", "block/new")
+
+        unloaded.reload()
+        self.assertEqual("new.png", self._texture(unloaded))
+
+    def test_lazy_incremental_reload(self) -> None:
+        # Lazy managers reload everything and swap the new resources in.
+        manager = JavaResourcePackManager(JavaResourcePack(self._pack_dir), "lazy")
+        self.assertEqual("old.png", self._texture(manager))
+        new_pack_dir = os.path.join(self._temp_dir.name, "new_pack")
+        _write_pack(new_pack_dir, "new")
+        affected, changed_textures = manager.incremental_reload(
+            [JavaResourcePack(new_pack_dir)]
+        )
+        self.assertEqual({_Stone}, affected)
+        # Every texture may have changed.
+        self.assertIsNone(changed_textures)
+        self.assertEqual([new_pack_dir], manager.pack_paths)
+        self.assertEqual("new.png", self._texture(manager))
+        self.assertTrue(manager._lazy)
+
+    def test_lazy_load_all(self) -> None:
+        manager = JavaResourcePackManager(JavaResourcePack(self._pack_dir), "lazy")
+        self.assertEqual("old.png", self._texture(manager))
+        self.assertIsNotNone(manager._lazy_files)
+        # Getting the textures scans the packs.
+        self.assertEqual(
+            {manager.missing_no, manager.get_texture_path("minecraft", "block/old")},
+            set(manager.textures),
+        )
+        self.assertIsNone(manager._lazy_files)
+        self.assertEqual("old.png", self._texture(manager))
+        # The next reload is lazy again.
+        manager.reload()
+        self.assertIsNotNone(manager._lazy_files)
+        manager.load_all()
+        self.assertIsNone(manager._lazy_files)
+
+
+class ResourcePackManagerIncrementalReloadTestCase(TestCase):
+    def setUp(self) -> None:
+        self._temp_dir = tempfile.TemporaryDirectory()
+        cache_dir = patch.dict(
+            os.environ, {"CACHE_DIR": os.path.join(self._temp_dir.name, "cache")}
+        )
+        cache_dir.start()
+        self.addCleanup(cache_dir.stop)
+        self._pack_dir = pack_dir = os.path.join(self._temp_dir.name, "pack")
+        _write(pack_dir, "pack.mcmeta", {"pack": {"pack_format": 15}})
+        for name in ("stone", "dirt", "log"):
+            _write(
+                pack_dir, f"assets/minecraft/textures/block/{name}.png", (1, 2, 3, 255)
+            )
+            _write(
+                pack_dir,
+                f"assets/minecraft/blockstates/{name}.json",
+                {"variants": {"": {"model": f"block/{name}"}}},
+            )
+        # Stone and dirt share a parent model. Log does not depend on anything they use.
+        _write(
+            pack_dir,
+            "assets/minecraft/models/block/cube_all.json",
+            _cube_model("#all"),
+        )
+        for name in ("stone", "dirt"):
+            _write(
+                pack_dir,
+                f"assets/minecraft/models/block/{name}.json",
+                {"parent": "block/cube_all", "textures": {"all": f"block/{name}"}},
+            )
+        _write(
+            pack_dir, "assets/minecraft/models/block/log.json", _cube_model("block/log")
+        )
+        self._manager = JavaResourcePackManager(JavaResourcePack(pack_dir))
+        self._meshes = {
+            block_stack: self._manager.get_block_model(block_stack)
+            for block_stack in (_Stone, _Dirt, _Log)
+        }
+
+    def tearDown(self) -> None:
+        self._temp_dir.cleanup()
+
+    def _check_kept(self, *block_stacks: BlockStack) -> None:
+        for block_stack in block_stacks:
+            self.assertIs(
+                self._meshes[block_stack], self._manager.get_block_model(block_stack)
+            )
+
+    def test_unchanged(self) -> None:
+        self.assertEqual((set(), set()), self._manager.incremental_reload())
+        self._check_kept(_Stone, _Dirt, _Log)
+
+    def test_parent_model(self) -> None:
+        _edit(
+            self._pack_dir,
+            "assets/minecraft/models/block/cube_all.json",
+            _cube_model("#all", 8),
+        )
+        self.assertEqual(({_Stone, _Dirt}, set()), self._manager.incremental_reload())
+        self._check_kept(_Log)
+        # The half height cube is no longer a full opaque block.
+        for block_stack in (_Stone, _Dirt):
+            self.assertEqual(
+                BlockMeshTransparency.Partial,
+                self._manager.get_block_model(block_stack).transparency,
+            )
+
+    def test_texture(self) -> None:
+        # The texture becomes transparent.
+        _edit(
+            self._pack_dir, "assets/minecraft/textures/block/dirt.png", (1, 2, 3, 128)
+        )
+        dirt_path = self._manager.get_texture_path("minecraft", "block/dirt")
+        self.assertEqual(({_Dirt}, {dirt_path}), self._manager.incremental_reload())
+        self._check_kept(_Stone, _Log)
+        self.assertIsNot(self._meshes[_Dirt], self._manager.get_block_model(_Dirt))
+
+    def test_texture_pixels(self) -> None:
+        # The pixels change but the texture stays opaque.
+        _edit(self._pack_dir, "assets/minecraft/textures/block/log.png", (4, 5, 6, 255))
+        log_path = self._manager.get_texture_path("minecraft", "block/log")
+        self.assertEqual(({_Log}, {log_path}), self._manager.incremental_reload())
+        self._check_kept(_Stone, _Dirt)
+
+    def test_blockstate(self) -> None:
+        _edit(
+            self._pack_dir,
+            "assets/minecraft/blockstates/stone.json",
+            {"variants": {"": {"model": "block/dirt"}}},
+        )
+        self.assertEqual(({_Stone}, set()), self._manager.incremental_reload())
+        self._check_kept(_Dirt, _Log)
+        textures = self._manager.get_block_model(_Stone).textures
+        self.assertEqual(["dirt.png"], [os.path.basename(path) for path in textures])
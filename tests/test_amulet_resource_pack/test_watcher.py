@@ -0,0 +1,175 @@
+import errno
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+from typing import Any, Optional
+from unittest import TestCase
+from unittest.mock import patch
+
+from PIL import Image
+
+from amulet.core.block import Block, BlockStack
+from amulet.core.version import VersionNumber
+from amulet.resource_pack import JavaResourcePack, JavaResourcePackManager
+from amulet.resource_pack.watcher import (
+    ResourcePackWatcher,
+    _InotifyBackend,
+    _PollingBackend,
+)
+
+
+def _write(pack_dir: str, rel_path: str, data: Any) -> None:
+    path = os.path.join(pack_dir, *rel_path.split("/"))
+    mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if rel_path.endswith(".png"):
+        Image.new("RGBA", (16, 16), data).save(path)
+    else:
+        with open(path, "w") as f:
+            json.dump(data, f)
+    if mtime is not None:
+        # Make sure the change is visible to the stat based checks.
+        os.utime(path, ns=(mtime + 1_000_000_000, mtime + 1_000_000_000))
+
+
+def _cube_model(texture: str, height: int = 16) -> dict:
+    return {
+        "textures": {"all": texture},
+        "elements": [
+            {
+                "from": [0, 0, 0],
+                "to": [16, height, 16],
+                "faces": {
+                    face: {"texture": "#all"}
+                    for face in ("down", "up", "north", "south", "east", "west")
+                },
+            }
+        ],
+    }
+
+
+def _block_stack(base_name: str) -> BlockStack:
+    return BlockStack(Block("java", VersionNumber(3578), "minecraft", base_name))
+
+
+class ResourcePackWatcherTestCase(TestCase):
+    def setUp(self) -> None:
+        self._temp_dir = tempfile.TemporaryDirectory()
+        cache_dir = patch.dict(
+            os.environ, {"CACHE_DIR": os.path.join(self._temp_dir.name, "cache")}
+        )
+        cache_dir.start()
+        self.addCleanup(cache_dir.stop)
+        self._pack_dir = os.path.join(self._temp_dir.name, "pack")
+        _write(self._pack_dir, "pack.mcmeta", {"pack": {"pack_format": 15}})
+        for name in ("stone", "dirt", "log"):
+            _write(
+                self._pack_dir,
+                f"assets/minecraft/textures/block/{name}.png",
+                (1, 2, 3, 255),
+            )
+            _write(
+                self._pack_dir,
+                f"assets/minecraft/blockstates/{name}.json",
+                {"variants": {"": {"model": f"block/{name}"}}},
+            )
+            _write(
+                self._pack_dir,
+                f"assets/minecraft/models/block/{name}.json",
+                _cube_model(f"block/{name}"),
+            )
+
+    def tearDown(self) -> None:
+        self._temp_dir.cleanup()
+
+    def _check_batched(self, use_inotify: bool) -> None:
+        manager = JavaResourcePackManager(JavaResourcePack(self._pack_dir))
+        stone, dirt, log = (_block_stack(name) for name in ("stone", "dirt", "log"))
+        for block_stack in (stone, dirt, log):
+            manager.get_block_model(block_stack)
+        stone_path = manager.get_texture_path("minecraft", "block/stone")
+
+        calls: list[tuple[set[BlockStack], Optional[set[str]]]] = []
+        called = threading.Event()
+
+        def callback(
+            affected: set[BlockStack], changed_textures: Optional[set[str]]
+        ) -> None:
+            calls.append((affected, changed_textures))
+            called.set()
+
+        watcher = ResourcePackWatcher(
+            manager,
+            callback,
+            debounce=0.5,
+            max_delay=5.0,
+            poll_interval=0.05,
+            use_inotify=use_inotify,
+        )
+        with (
+            patch.object(
+                manager, "incremental_reload", wraps=manager.incremental_reload
+            ) as incremental_reload,
+            watcher,
+        ):
+            self.assertEqual(use_inotify, watcher.uses_inotify)
+            # The texture pixels change but it stays opaque.
+            _write(
+                self._pack_dir,
+                "assets/minecraft/textures/block/stone.png",
+                (4, 5, 6, 255),
+            )
+            _write(
+                self._pack_dir,
+                "assets/minecraft/models/block/dirt.json",
+                _cube_model("block/dirt", 8),
+            )
+            _write(
+                self._pack_dir,
+                "assets/minecraft/textures/block/unused.png",
+                (1, 2, 3, 255),
+            )
+            self.assertTrue(called.wait(10))
+            # Wait long enough for a second batch to be applied if the changes were split.
+            time.sleep(1.0)
+        incremental_reload.assert_called_once()
+        unused_path = manager.get_texture_path("minecraft", "block/unused")
+        self.assertEqual([({stone, dirt}, {stone_path, unused_path})], calls)
+
+    def test_polling(self) -> None:
+        self._check_batched(False)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+    def test_inotify(self) -> None:
+        self._check_batched(True)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+    def test_inotify_failure(self) -> None:
+        # If inotify cannot watch the packs the backend is closed and polling is used instead.
+        with tempfile.TemporaryDirectory() as pack_dir:
+            manager = types.SimpleNamespace(pack_paths=[pack_dir])
+            watcher = ResourcePackWatcher(manager)  # type: ignore
+            with (
+                patch.object(
+                    _InotifyBackend,
+                    "sync",
+                    side_effect=OSError(errno.ENOSPC, "No space left on device"),
+                ),
+                patch.object(
+                    _InotifyBackend,
+                    "close",
+                    autospec=True,
+                    side_effect=_InotifyBackend.close,
+                ) as close,
+                self.assertLogs("amulet.resource_pack.watcher", "WARNING") as logs,
+            ):
+                backend = watcher._create_backend()
+            self.assertIsInstance(backend, _PollingBackend)
+            close.assert_called_once()
+            self.assertIsNotNone(logs.records[0].exc_info)
+            backend.close()
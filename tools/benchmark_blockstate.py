@@ -0,0 +1,76 @@
+"""Compare the compiled blockstate variant matcher with matching the variant strings on every lookup."""
+
+import itertools
+import random
+import timeit
+from collections.abc import Mapping
+from typing import Any
+
+from amulet.nbt import StringTag
+from amulet.core.block import Block
+
+from amulet.resource_pack.java._blockstate import (
+    VariantBlockstate,
+    get_py_data,
+    _PropertiesPattern,
+)
+
+
+def match_regex(
+    variants: dict[str, Any], properties: Mapping[str, Block.PropertyValue]
+) -> Any:
+    """The previous implementation. Run the regex over every variant in file order."""
+    for variant, value in variants.items():
+        if all(
+            get_py_data(
+                properties.get(match.group("name"), StringTag(match.group("value")))
+            )
+            == match.group("value")
+            for match in _PropertiesPattern.finditer(f",{variant}")
+        ):
+            return value
+    return None
+
+
+def main() -> None:
+    # A blockstate with the same shape as redstone_wire.
+    sides = ("none", "side", "up")
+    powers = tuple(str(power) for power in range(16))
+    variants = {
+        f"east={east},north={north},power={power},south={south},west={west}": {
+            "model": f"block/redstone_{east}_{north}_{power}_{south}_{west}"
+        }
+        for east, north, power, south, west in itertools.product(
+            sides, sides, powers, sides, sides
+        )
+    }
+    names = ("east", "north", "power", "south", "west")
+    rng = random.Random(0)
+    blocks = [
+        {
+            name: StringTag(rng.choice(powers if name == "power" else sides))
+            for name in names
+        }
+        for _ in range(1000)
+    ]
+
+    compile_time = timeit.timeit(lambda: VariantBlockstate(variants), number=10) / 10
+    compiled = VariantBlockstate(variants)
+    for properties in blocks:
+        assert compiled.match(properties)[0] == match_regex(variants, properties)
+
+    regex_time = timeit.timeit(
+        lambda: [match_regex(variants, properties) for properties in blocks], number=1
+    )
+    compiled_time = timeit.timeit(
+        lambda: [compiled.match(properties) for properties in blocks], number=1
+    )
+
+    print(f"{len(variants)} variants, {len(blocks)} lookups")
+    print(f"compile:  {compile_time * 1000:.3f}ms")
+    print(f"regex:    {regex_time * 1000:.3f}ms")
+    print(f"compiled: {compiled_time * 1000:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()